@@ -0,0 +1,68 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+# Search scaling benchmark: runs the minimax search on every board variant (models.variant) from the same kind of
+# mid-game positions and reports nodes, time and the cost of one node per depth. The cost per node should grow
+# with the board area only, not with the number of lines or the search depth.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from models.game import Game
+from models.player import Player
+from models.variant import VARIANTS
+from bi.analysis import candidates_for
+from bi.minimax import search_root ,SearchLimits
+
+
+# Method to create a game of a variant where every player placed all but one piece at random
+def sample_game(variant, rng):
+    players = []
+    for name, color in (('player1', 'red'), ('player2', 'blue')):
+        player = Player(name, variant.pieces, variant.barriers)
+        player.color = color
+        players.append(player)
+    game = Game(players[0], players[1], variant)
+    game.current_player = players[0]
+    while game.current_player.pieces > 1:
+        row, col = rng.choice(game.get_possible_pieces_places())
+        game.place_piece(col, row)
+        # A sampled position must not be decided already
+        if game.check_winner():
+            return sample_game(variant, rng)
+    return game
+
+
+# Method to search one position to a depth, returns (nodes, seconds)
+def measure(game, depth):
+    limits = SearchLimits()
+    player = game.current_player
+    started = time.perf_counter()
+    search_root(game, depth, player, candidates_for(game, player), limits=limits)
+    return limits.nodes, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how the minimax search scales with the board size.")
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument('--depths', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--positions', type=int, default=5, help="positions searched per variant")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'variant':<8} {'depth':>5} {'nodes':>10} {'ms':>10} {'us/node':>8}")
+    for name in args.variants:
+        variant = VARIANTS[name]
+        rng = random.Random(args.seed)
+        games = [sample_game(variant, rng) for _ in range(args.positions)]
+        for depth in args.depths:
+            nodes = 0
+            seconds = 0.0
+            for game in games:
+                searched, elapsed = measure(game, depth)
+                nodes += searched
+                seconds += elapsed
+            print(f"{name:<8} {depth:>5} {nodes:>10} {seconds * 1000:>10.1f} {seconds * 1e6 / max(nodes, 1):>8.1f}")
@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+import time
+
+# Shared transposition table benchmark: decides the moves of self-play positions on a pool of worker processes,
+# once with a private transposition table per worker and once with one table in shared memory for all of them, and
+# reports time, searched nodes and the speedup over one worker per worker count.
+# Consecutive positions of a game share most of their subtrees, with private tables every worker searches them
+# again while a shared table hands the results of one worker to the others. The wall-clock speedup can only show
+# with at least as many cores as workers, the node counts show the work saved on any machine.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from models.game import Game
+from bi.minimax import bi_best_piece_place ,bi_best_piece_move ,SearchLimits
+from bi.selfplay import make_agent ,play_game
+from bi.workers import worker ,start_pool ,stop_pool
+
+
+# Method to collect the positions (Game.to_code) of self-play games, every position the side to move is in
+def sample_positions(games, seed):
+    codes = []
+    agent = make_agent(depth=1)
+    for index in range(games):
+        play_game(agent, agent, index % 2 == 0, seed + index, observer=lambda game: codes.append(game.to_code()))
+    return codes
+
+
+# Method to decide the move of one position in a worker process (bi.workers), returns the number of nodes searched
+def decide(job):
+    code, depth = job
+    game = Game.from_code(code)
+    player = game.current_player
+    limits = SearchLimits()
+    table = worker['tables'][0]
+    if player.has_pieces():
+        bi_best_piece_place(game, depth, player, limits=limits, table=table)
+    else:
+        bi_best_piece_move(game, depth, player, limits=limits, table=table)
+    return limits.nodes
+
+
+# Method to decide every position on `workers` processes, returns (seconds, nodes)
+def measure(codes, depth, workers, shared, table_size):
+    started = time.perf_counter()
+    pool, tables = start_pool({'processes': workers, 'table_size': table_size, 'shared': shared})
+    try:
+        jobs = [(code, depth) for code in codes]
+        nodes = sum(pool.imap_unordered(decide, jobs, chunksize=1) if pool is not None else map(decide, jobs))
+    finally:
+        stop_pool(pool, tables)
+    return time.perf_counter() - started, nodes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure private against shared transposition tables.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--games', type=int, default=4, help="self-play games the positions are taken from")
+    parser.add_argument('--table-size', type=int, default=1 << 18)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    codes = sample_positions(args.games, args.seed)
+    print(f"{len(codes)} positions, depth {args.depth}, {os.cpu_count()} cpus")
+    print(f"{'workers':>7} {'table':>8} {'seconds':>8} {'nodes':>10} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        for shared in (False, True):
+            seconds, nodes = measure(codes, args.depth, workers, shared, args.table_size)
+            if baseline is None:
+                baseline = seconds
+            print(f"{workers:>7} {'shared' if shared else 'private':>8} {seconds:>8.2f} {nodes:>10} "
+                  f"{baseline / seconds:>8.2f}")
@@ -0,0 +1,84 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Startup benchmark: time to import the engine headless and time to the first drawn frame of the game window.
+# Exits with status 1 when a budget is exceeded, when importing the engine pulls in tkinter or when it writes to
+# the table cache (the tables built on import are built in memory, only expensive ones are cached on disk).
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = (
+    "import time, sys\n"
+    "started = time.perf_counter()\n"
+    "import models.game, bi.minimax\n"
+    "print((time.perf_counter() - started) * 1000, 'tkinter' in sys.modules)\n"
+)
+
+
+# Method to run a Python snippet in a fresh interpreter from the repository root
+def run_python(arguments, env):
+    result = subprocess.run([sys.executable] + arguments, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+# Method to measure the engine import time, returns (median milliseconds, tkinter imported)
+def measure_import(runs, env):
+    timings = []
+    loads_tk = False
+    for _ in range(runs):
+        milliseconds, tk_loaded = run_python(['-c', IMPORT_SNIPPET], env).split()
+        timings.append(float(milliseconds))
+        loads_tk = loads_tk or tk_loaded == 'True'
+    return statistics.median(timings), loads_tk
+
+
+# Method to measure the time from launching main.py to its first drawn frame, None without a display
+def measure_first_frame(runs, env):
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        return None
+    timings = []
+    for _ in range(runs):
+        env = dict(env, MORRIS_START_TIME=repr(time.time()))
+        output = run_python(['main.py', '--startup-benchmark'], env)
+        timings.append(float(output.split()[-1]))
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure engine import time and time to first frame.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-import-ms', type=float, default=None, help="fail when the warm import is slower")
+    parser.add_argument('--max-frame-ms', type=float, default=None, help="fail when the first frame is slower")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, MORRIS_CACHE_DIR=cache_dir)
+        engine, loads_tk = measure_import(args.runs, env)
+        cached = os.listdir(cache_dir)
+        frame = measure_first_frame(args.runs, env)
+
+    print(f"engine import:       {engine:8.1f} ms")
+    if frame is None:
+        print("time to first frame: skipped (no display)")
+    else:
+        print(f"time to first frame: {frame:8.1f} ms")
+
+    if loads_tk:
+        print("FAIL: importing the engine imports tkinter")
+        failed = True
+    if cached:
+        print(f"FAIL: importing the engine writes to the table cache: {', '.join(cached)}")
+        failed = True
+    if args.max_import_ms is not None and engine > args.max_import_ms:
+        print(f"FAIL: engine import over {args.max_import_ms} ms")
+        failed = True
+    if args.max_frame_ms is not None and frame is not None and frame > args.max_frame_ms:
+        print(f"FAIL: first frame over {args.max_frame_ms} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
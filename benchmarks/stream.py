@@ -0,0 +1,82 @@
+import argparse
+import os
+import selectors
+import socket
+import sys
+import threading
+import time
+
+# Spectator feed benchmark: replays self-play games into a SnapshotFeed served by a FeedServer and reports what one
+# publish costs the session for a growing number of connected spectators. The feed encodes every frame once and a
+# single server thread writes it to all spectators, so the cost should stay flat.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from models.game import Game
+from models.stream import SnapshotFeed ,FeedServer
+from bi.selfplay import make_agent ,play_game
+
+
+# Method to collect the positions (Game.to_code) of self-play games, every position the session would publish
+def sample_games(games, seed):
+    positions = []
+    agent = make_agent(depth=1)
+    for index in range(games):
+        codes = []
+        play_game(agent, agent, index % 2 == 0, seed + index, observer=lambda game: codes.append(game.to_code()))
+        positions.append(codes)
+    return positions
+
+
+# Method to read everything the spectators are sent until `stop` is set
+def drain(connections, stop):
+    selector = selectors.DefaultSelector()
+    for connection in connections:
+        selector.register(connection, selectors.EVENT_READ)
+    while not stop.is_set():
+        for key, _ in selector.select(0.05):
+            key.fileobj.recv(1 << 16)
+
+
+# Method to publish every position with `spectators` connected, returns the mean microseconds of one publish
+def measure(games, spectators, pause):
+    feed = SnapshotFeed()
+    server = FeedServer(feed)
+    address = server.start()
+    connections = [socket.create_connection(address) for _ in range(spectators)]
+    stop = threading.Event()
+    reader = threading.Thread(target=drain, args=(connections, stop), daemon=True)
+    reader.start()
+    elapsed = 0.0
+    published = 0
+    for codes in games:
+        # Every position of a game is published on the same game object, as a session does
+        game = Game.from_code(codes[0])
+        for code in codes:
+            game.load_board(code)
+            started = time.perf_counter()
+            feed.publish(game)
+            elapsed += time.perf_counter() - started
+            published += 1
+            time.sleep(pause)
+    stop.set()
+    server.stop()
+    reader.join()
+    for connection in connections:
+        connection.close()
+    return elapsed * 1e6 / max(published, 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cost of streaming a session to spectators.")
+    parser.add_argument('--spectators', type=int, nargs='+', default=[0, 1, 10, 100])
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--pause', type=float, default=0.002, help="seconds between two published positions")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    games = sample_games(args.games, args.seed)
+    print(f"{'spectators':>10} {'us/publish':>10}")
+    for spectators in args.spectators:
+        print(f"{spectators:>10} {measure(games, spectators, args.pause):>10.1f}")
@@ -0,0 +1,177 @@
+import os
+import queue
+from bi.heuristics import WIN_SCORE
+from bi.minimax import search_root ,make_move ,undo_move ,table_key ,SearchLimits
+from bi.position import canonical ,transform_move ,cell_index ,cell_coords ,SYMMETRIES
+from bi.ttable import TranspositionTable
+from bi.workers import worker ,start_pool ,stop_pool
+from models.game import Game
+
+# Default settings of analyze_many
+#   depth      - search depth per position
+#   processes  - worker processes (1 analyzes in the calling process)
+#   weights    - evaluation weights, None for the configured ones
+#   nodes      - optional node budget per position
+#   time_limit - optional time budget per position in seconds
+#   table_size - entries of the transposition table shared by every position a worker analyzes,
+#                None for the table share of the AI memory budget (bi.memory)
+#   shared     - with several processes, all workers search with one table in shared memory
+#   pv_length  - maximum length of the principal variation
+ANALYSIS_DEFAULTS = {
+    'depth': 5,
+    'processes': os.cpu_count() or 1,
+    'weights': None,
+    'nodes': None,
+    'time_limit': None,
+    'table_size': None,
+    'shared': True,
+    'pv_length': 8,
+}
+
+# Positions analyzed at once per worker process: new positions are only read from the stream when a result comes back
+WINDOW_PER_PROCESS = 4
+
+# Method to convert a move in get_legal_moves format to a (start, end) pair of cells
+def move_to_cells(move):
+    if move[0] == 'place_piece':
+        return -1, cell_index(move[1], move[2])
+    return cell_index(move[1], move[2]), cell_index(move[3], move[4])
+
+
+# Method to convert a (start, end) pair of cells back to a move in get_legal_moves format
+def cells_to_move(cells):
+    start, end = cells
+    if start < 0:
+        return ('place_piece',) + cell_coords(end)
+    return ('move_piece',) + cell_coords(start) + cell_coords(end)
+
+
+# Method to list the piece actions the player can choose from in get_legal_moves format
+def candidates_for(game, player):
+    if player.has_pieces():
+        return [('place_piece', col, row) for row, col in game.get_possible_pieces_places()]
+    return [('move_piece', old_col, old_row, new_col, new_row)
+            for (old_col, old_row), (new_col, new_row) in game.get_possible_pieces_moves(player)]
+
+
+# Method to follow the best moves stored in the table from the position after the root move
+def principal_variation(game, player, first_move, table, max_length):
+    pv = [first_move]
+    played = [(first_move, player)]
+    make_move(game, first_move, player)
+    mover = game.get_opponent(player)
+    while len(pv) < max_length and not game.is_winning_move(*played[-1][0][-2:]):
+        entry = table.probe(table_key(game, mover, player))
+        if entry is None or entry[3] is None or not make_move(game, entry[3], mover):
+            break
+        pv.append(entry[3])
+        played.append((entry[3], mover))
+        mover = game.get_opponent(mover)
+    for move, mover in reversed(played):
+        undo_move(game, move, mover)
+    return pv
+
+
+# Method to analyze one canonical position code with the given table
+# Returns (code, best move, score, pv) with moves as (start, end) cells and the score for the side to move
+def analyze_code(code, settings, table):
+    game = Game.from_code(code)
+    player = game.current_player
+    if game.check_winner():
+        # A finished game: the side to move has lost
+        return code, None, -WIN_SCORE, []
+
+    candidates = candidates_for(game, player)
+    if not candidates:
+        return code, None, 0, []
+
+    limits = None
+    if settings['nodes'] is not None or settings['time_limit'] is not None:
+        limits = SearchLimits(settings['nodes'], settings['time_limit'])
+    move, score = search_root(game, settings['depth'], player, candidates, settings['weights'], limits, table)
+    pv = principal_variation(game, player, move, table, settings['pv_length'])
+    return code, move_to_cells(move), score, [move_to_cells(pv_move) for pv_move in pv]
+
+
+# Method to analyze one position in a worker process (bi.workers), with the table of every position of the worker
+def _analyze_in_worker(code):
+    return analyze_code(code, worker['settings'], worker['tables'][0])
+
+
+# Method to map the result of a canonical position back to a position with the given symmetry
+def _result_for(code, symmetry, result):
+    move, score, pv = result
+    # Every symmetry is its own inverse, so the same permutation maps the moves back
+    mapping = SYMMETRIES[symmetry]
+    return {
+        'position': code,
+        'move': transform_move(move, mapping) if move else None,
+        'score': score,
+        'pv': [transform_move(pv_move, mapping) for pv_move in pv],
+    }
+
+
+# Analyzes a stream of positions of the standard board (Game.to_code codes) and yields one result per position as
+# soon as it is ready, in completion order. The stream is read as the analysis goes, with a few positions per worker
+# in flight, so it can be unbounded. Symmetric duplicates are analyzed once: a duplicate of a position in flight gets
+# its result when it comes back, a later one at once (the result of every distinct position is remembered).
+# Parameters:
+#     positions (iterable): Position codes.
+#     settings (dict): Overrides of ANALYSIS_DEFAULTS.
+# Yields: dict: {'position', 'move', 'score', 'pv'} with moves as (start, end) cells of the original position
+#               (start is -1 for placements) and the score from the point of view of the side to move.
+
+def analyze_many(positions, settings=None):
+    settings = dict(ANALYSIS_DEFAULTS, **(settings or {}))
+
+    # Canonical code -> the original positions (code, symmetry) waiting for its result
+    waiting = {}
+    # Canonical code -> its result (move, score, pv), for the duplicates read after it came back
+    done = {}
+
+    # Method to hand out a result to every position waiting for it
+    def deliver(result):
+        if isinstance(result, BaseException):
+            raise result
+        canonical_code, move, score, pv = result
+        done[canonical_code] = (move, score, pv)
+        for code, symmetry in waiting.pop(canonical_code):
+            yield _result_for(code, symmetry, done[canonical_code])
+
+    pool = None
+    if settings['processes'] > 1:
+        pool, shared = start_pool(settings)
+        # Results (or errors) of the workers in completion order
+        finished = queue.Queue()
+        window = settings['processes'] * WINDOW_PER_PROCESS
+        in_flight = 0
+    else:
+        table = TranspositionTable(settings['table_size'])
+
+    try:
+        for code in positions:
+            canonical_code, symmetry = canonical(code)
+            if canonical_code in done:
+                yield _result_for(code, symmetry, done[canonical_code])
+                continue
+            if canonical_code in waiting:
+                waiting[canonical_code].append((code, symmetry))
+                continue
+            waiting[canonical_code] = [(code, symmetry)]
+            if pool is None:
+                yield from deliver(analyze_code(canonical_code, settings, table))
+                continue
+            pool.apply_async(_analyze_in_worker, (canonical_code,), callback=finished.put,
+                             error_callback=finished.put)
+            in_flight += 1
+            # Hand out the results that are ready, a full window waits for the next one before reading on
+            while in_flight and (in_flight >= window or not finished.empty()):
+                in_flight -= 1
+                yield from deliver(finished.get())
+        if pool is not None:
+            while in_flight:
+                in_flight -= 1
+                yield from deliver(finished.get())
+    finally:
+        if pool is not None:
+            stop_pool(pool, shared)
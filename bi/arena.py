@@ -0,0 +1,250 @@
+import argparse
+import math
+import os
+import sys
+import time
+from bi.heuristics import load_weights
+from bi.learned import load_model
+from bi.selfplay import make_agent ,play_game
+from bi.workers import start_pool ,stop_pool
+from models.trace import tracer ,INFO
+
+# Engine arena: plays headless games between two engine configurations (selfplay agents: depth, weights, minimax or
+# MCTS, endgame table) on a worker pool and measures their Elo difference.
+# Games come in pairs played from the same seed where the engines swap who moves first, and every other pair they
+# also swap seats (colours), so neither the first move nor the colours favour one engine.
+# A match can stop early with a sequential probability ratio test (SPRT): as soon as the results are strong enough
+# evidence that the difference is at least elo1 (accept) or at most elo0 (reject), no more games are played.
+
+# Default settings of run_match
+#   games      - maximum number of games, rounded up to whole pairs
+#   processes  - worker processes (1 plays in the calling process)
+#   sprt       - (elo0, elo1) hypotheses of the SPRT, None to always play every game
+#   alpha      - probability of accepting when the difference is only elo0
+#   beta       - probability of rejecting when the difference is elo1
+#   seed       - seed of the first pair, pair k is played from seed + k
+#   table_size - entries of the transposition table of each agent, kept for all the games of the match,
+#                None for the table share of the AI memory budget (bi.memory)
+#   shared     - with several processes, all workers search with the same two tables in shared memory
+ARENA_DEFAULTS = {
+    'games': 400,
+    'processes': os.cpu_count() or 1,
+    'sprt': None,
+    'alpha': 0.05,
+    'beta': 0.05,
+    'seed': 0,
+    'table_size': None,
+    'shared': True,
+}
+
+# Quantile of the normal distribution for the 95% confidence interval of the Elo difference
+CONFIDENCE_Z = 1.96
+
+# SPRT decisions
+ACCEPT = 'accept'
+REJECT = 'reject'
+
+
+# Method to convert an expected score (0 to 1) to an Elo difference, infinite for a clean sweep
+def elo_from_score(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+# Method to convert an Elo difference to the expected score of the stronger side
+def score_from_elo(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+# Method to get the mean and the variance of the score of one game, draws score one half
+def _score_stats(wins, draws, losses):
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    return score, variance
+
+
+# Method to estimate the Elo difference and its confidence interval from the results of the candidate
+# Returns: tuple: (elo, low, high), the interval comes from the normal approximation of the mean score
+def elo_interval(wins, draws, losses, z=CONFIDENCE_Z):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, -math.inf, math.inf
+    score, variance = _score_stats(wins, draws, losses)
+    margin = z * math.sqrt(variance / games)
+    return elo_from_score(score), elo_from_score(score - margin), elo_from_score(score + margin)
+
+
+# Method to get the log-likelihood ratio of the SPRT of elo1 against elo0
+# Uses the normal approximation of the score (as chess engine testing frameworks do). One virtual draw is added
+# to the results, otherwise the variance of a clean sweep is 0 and the test could never stop on it.
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0
+    score, variance = _score_stats(wins, draws + 1, losses)
+    score0 = score_from_elo(elo0)
+    score1 = score_from_elo(elo1)
+    return (games + 1) * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+# Method to get the (lower, upper) LLR bounds of the SPRT: below the lower bound elo0 is accepted (the candidate is
+# rejected), above the upper one elo1 is
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+# Method to describe the k-th game of a match: which seat the candidate takes and who moves first
+# Games 4k to 4k+3 cycle through the candidate as player1 moving first, as player2 moving second,
+# as player2 moving first and as player1 moving second. Games 2k and 2k+1 share their seed.
+def game_job(candidate, baseline, index, seed=0):
+    candidate_first = index % 4 in (0, 2)
+    swapped = index % 4 in (1, 2)
+    return candidate, baseline, swapped, candidate_first, seed + index // 2
+
+
+# Method to play one game of a match, used as the worker function of process pools
+# Returns the result from the point of view of the candidate: 1 win, 0 draw, -1 loss
+def play_job(job):
+    candidate, baseline, swapped, candidate_first, seed = job
+    if swapped:
+        return -play_game(baseline, candidate, not candidate_first, seed)
+    return play_game(candidate, baseline, candidate_first, seed)
+
+
+# Method to summarize the results of a match
+def match_stats(wins, draws, losses, settings):
+    elo, low, high = elo_interval(wins, draws, losses)
+    stats = {
+        'games': wins + draws + losses,
+        'wins': wins,
+        'draws': draws,
+        'losses': losses,
+        'elo': elo,
+        'elo_low': low,
+        'elo_high': high,
+        'llr': None,
+        'decision': None,
+    }
+    if settings['sprt'] is not None:
+        elo0, elo1 = settings['sprt']
+        lower, upper = sprt_bounds(settings['alpha'], settings['beta'])
+        stats['llr'] = sprt_llr(wins, draws, losses, elo0, elo1)
+        if stats['llr'] >= upper:
+            stats['decision'] = ACCEPT
+        elif stats['llr'] <= lower:
+            stats['decision'] = REJECT
+    return stats
+
+
+# Plays a match between two engine configurations and returns its statistics.
+# Parameters:
+#     candidate (dict): Agent (bi.selfplay.make_agent) whose strength is measured.
+#     baseline (dict): Agent the candidate is measured against.
+#     settings (dict): Overrides of ARENA_DEFAULTS.
+#     report (callable): Optional function called with the statistics after every game.
+# Returns: dict: games, wins, draws and losses of the candidate, its Elo difference with the 95% interval
+#                (elo, elo_low, elo_high), the SPRT log-likelihood ratio (llr) and decision (ACCEPT, REJECT or None).
+
+def run_match(candidate, baseline, settings=None, report=None):
+    settings = dict(ARENA_DEFAULTS, **(settings or {}))
+    games = settings['games'] + settings['games'] % 2
+    # Each agent has a table of its own, the scores of one evaluation mean nothing to the other
+    candidate = dict(candidate, table=0)
+    baseline = dict(baseline, table=1)
+    jobs = (game_job(candidate, baseline, index, settings['seed']) for index in range(games))
+
+    pool, shared = start_pool(settings, 2)
+    results = pool.imap_unordered(play_job, jobs) if pool is not None else map(play_job, jobs)
+
+    started = time.perf_counter()
+    counts = {1: 0, 0: 0, -1: 0}
+    stats = match_stats(0, 0, 0, settings)
+    try:
+        for result in results:
+            counts[result] += 1
+            stats = match_stats(counts[1], counts[0], counts[-1], settings)
+            if report is not None:
+                report(stats)
+            # The games still running are dropped with the pool
+            if stats['decision'] is not None:
+                break
+    finally:
+        stop_pool(pool, shared)
+
+    stats['seconds'] = time.perf_counter() - started
+    if tracer.enabled:
+        tracer.event(INFO, 'arena.match', games=stats['games'], wins=stats['wins'], draws=stats['draws'],
+                     losses=stats['losses'], elo=round(stats['elo'], 1), decision=stats['decision'])
+    return stats
+
+
+# Method to build an agent from a specification like "depth=3,engine=mcts,weights=weights.json,endgame=1"
+# model=<file> evaluates with a learned value model (bi.learned) instead of the heuristics, model=default with the
+# configured model file or the built-in one
+# threats=<nodes> sets the node budget of the threat extension of the search, threats=0 turns it off
+# Raises ValueError for unknown settings
+def parse_agent(specification):
+    settings = {}
+    for item in filter(None, specification.split(',')):
+        name, _, value = item.partition('=')
+        if name in ('depth', 'threats'):
+            settings[name] = int(value)
+        elif name == 'engine':
+            settings['engine'] = value
+        elif name == 'weights':
+            settings['weights'] = load_weights(value)
+        elif name == 'model':
+            settings['model'] = load_model() if value == 'default' else load_model(value)
+        elif name in ('barriers', 'endgame'):
+            settings[name] = value.lower() in ('1', 'true', 'yes', 'on')
+        else:
+            raise ValueError(f"unknown agent setting '{name}', use depth, engine, weights, model, barriers, "
+                             f"endgame or threats")
+    return make_agent(**settings)
+
+
+# Method to format an Elo difference, e.g. "+35.2" or "+inf"
+def format_elo(elo):
+    return f"{elo:+.1f}" if math.isfinite(elo) else ('+inf' if elo > 0 else '-inf')
+
+
+# Method to format the statistics of a match on one line
+def format_stats(stats):
+    line = (f"{stats['games']} games: +{stats['wins']} ={stats['draws']} -{stats['losses']}, "
+            f"elo {format_elo(stats['elo'])} [{format_elo(stats['elo_low'])}, {format_elo(stats['elo_high'])}]")
+    if stats['llr'] is not None:
+        line += f", llr {stats['llr']:+.2f}"
+    if stats['decision'] is not None:
+        line += f", {stats['decision']}"
+    return line
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the Elo difference between two engine configurations.")
+    parser.add_argument('candidate', help="candidate agent, e.g. depth=3,engine=minimax,weights=weights.json")
+    parser.add_argument('baseline', help="baseline agent in the same format")
+    parser.add_argument('--games', type=int, default=ARENA_DEFAULTS['games'], help="maximum number of games")
+    parser.add_argument('--processes', type=int, default=ARENA_DEFAULTS['processes'])
+    parser.add_argument('--sprt', type=float, nargs=2, default=None, metavar=('ELO0', 'ELO1'),
+                        help="stop as soon as the SPRT of ELO1 against ELO0 is decided")
+    parser.add_argument('--alpha', type=float, default=ARENA_DEFAULTS['alpha'])
+    parser.add_argument('--beta', type=float, default=ARENA_DEFAULTS['beta'])
+    parser.add_argument('--seed', type=int, default=ARENA_DEFAULTS['seed'])
+    parser.add_argument('--every', type=int, default=50, help="print the running statistics every N games")
+    args = parser.parse_args()
+
+    settings = {'games': args.games, 'processes': args.processes, 'sprt': args.sprt,
+                'alpha': args.alpha, 'beta': args.beta, 'seed': args.seed}
+
+    # Method to print the running statistics
+    def progress(stats):
+        if stats['games'] % args.every == 0:
+            print(format_stats(stats), file=sys.stderr)
+
+    stats = run_match(parse_agent(args.candidate), parse_agent(args.baseline), settings, progress)
+    print(format_stats(stats))
+    print(f"{stats['seconds']:.1f} s, {stats['games'] / max(stats['seconds'], 1e-9):.1f} games/s", file=sys.stderr)
@@ -0,0 +1,47 @@
+import marshal
+import os
+
+# On-disk cache for the tables that are expensive to build (the solved endgame table takes seconds to solve).
+# Tables are plain Python containers of ints and bytes, stored with marshal. Small tables such as the line masks
+# and adjacency of the board build in microseconds and are not worth a file: they are built in memory on import.
+# Every file name carries the table version and the format version, so changing how a table is built
+# only needs a bump of its version number and stale files are simply ignored.
+
+# Format version of the cache files themselves
+CACHE_FORMAT = 1
+
+# Directory of the cache files, MORRIS_CACHE_DIR overrides the default per-user cache directory
+CACHE_DIR = os.environ.get('MORRIS_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'three-men-morris'))
+
+
+# Method to get the path of a cached table
+def table_path(name, version):
+    return os.path.join(CACHE_DIR, f"{name}.v{version}.f{CACHE_FORMAT}.marshal")
+
+
+# Method to load a table from the cache, building and storing it when it is missing or unreadable
+# `build` is called without arguments and must return marshal-able data
+def load_table(name, version, build):
+    path = table_path(name, version)
+    try:
+        with open(path, 'rb') as table_file:
+            return marshal.load(table_file)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    table = build()
+    save_table(name, version, table)
+    return table
+
+
+# Method to store a table in the cache, a read-only or missing home directory only costs the rebuild next time
+def save_table(name, version, table):
+    path = table_path(name, version)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as table_file:
+            marshal.dump(table, table_file)
+        os.replace(temporary_path, path)
+    except OSError:
+        pass
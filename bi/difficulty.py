@@ -0,0 +1,129 @@
+import random
+import time
+from bi.memory import MCTS_NODE_BYTES
+from bi.minimax import bi_best_piece_place ,bi_best_piece_move ,SearchLimits
+from bi.endgame import probe_counters ,preload ,is_loaded
+from bi.metrics import metrics
+from models.trace import tracer ,INFO
+
+# Slack added to the time limit for the worst-case latency: the clock is read every 64 search nodes
+# and the root win/block scan runs before the search starts
+LATENCY_SLACK = 0.02
+
+
+class Profile:
+    # Initialize a difficulty profile
+    #   depth      - maximum minimax depth
+    #   nodes      - node budget per decision (playouts for MCTS), None for unlimited
+    #   time_limit - time budget per decision in seconds
+    #   memory_mb  - memory budget of the search structures (MCTS tree, tables) in megabytes
+    #   error_rate - probability of deliberately playing a random move instead of the best one
+    #   engine     - search backend, 'minimax' or 'mcts'
+    #   endgame    - play barrier-free movement positions from the solved table (bi.endgame) instead of searching them,
+    #                once the table is loaded (see prepare). Only endings where no barrier is on the board or in either
+    #                hand are solved; the AI spends its barriers only to block, so most games end with barriers in
+    #                hand and are searched to the end.
+    #   threats    - node budget of the threat extension of the search, None for bi.minimax.THREAT_NODES, 0 for none
+    def __init__(self, name, depth, nodes, time_limit, memory_mb, error_rate=0.0, engine='minimax', endgame=False,
+                 threats=None):
+        self.name = name
+        self.depth = depth
+        self.nodes = nodes
+        self.time_limit = time_limit
+        self.memory_mb = memory_mb
+        self.error_rate = error_rate
+        self.engine = engine
+        self.endgame = endgame
+        self.threats = threats
+
+    # Worst-case time of one decision in seconds: the time limit always applies and no decision waits for the solved
+    # table, which is loaded in the background (see prepare)
+    @property
+    def max_latency(self):
+        return self.time_limit + LATENCY_SLACK
+
+    # Method to get ready for the decisions of the profile: an endgame profile starts loading the solved table in
+    # the background, solving it on a cold cache takes seconds. Decisions search until it is ready.
+    def prepare(self):
+        if self.endgame:
+            preload()
+
+    # Maximum number of MCTS tree nodes that fit the memory budget
+    @property
+    def max_tree_nodes(self):
+        return self.memory_mb * 1024 * 1024 // MCTS_NODE_BYTES
+
+    # Method to create the search budget of one decision
+    def limits(self):
+        return SearchLimits(self.nodes, self.time_limit, self.max_tree_nodes)
+
+
+# Named difficulty profiles, cheapest first. Low profiles cost a few milliseconds so many sessions share a core.
+# 'perfect' is the deepest search with the solved table: its play is only perfect in barrier-free endings, every other
+# position is searched within its budget like the other profiles.
+PROFILES = {
+    'easy': Profile('easy', depth=1, nodes=200, time_limit=0.02, memory_mb=1, error_rate=0.35, threats=0),
+    'medium': Profile('medium', depth=3, nodes=4000, time_limit=0.1, memory_mb=4, error_rate=0.1),
+    'hard': Profile('hard', depth=5, nodes=60000, time_limit=1.0, memory_mb=32, endgame=True),
+    'perfect': Profile('perfect', depth=9, nodes=None, time_limit=3.0, memory_mb=128, endgame=True),
+}
+
+DEFAULT_PROFILE = 'hard'
+
+
+# Method to get a profile by name, raises ValueError for unknown names
+def get_profile(name):
+    if name not in PROFILES:
+        raise ValueError(f"unknown difficulty '{name}', choose one of: {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+# Method to decide if this decision should be a deliberate mistake
+def _blunder(profile):
+    return profile.error_rate > 0 and random.random() < profile.error_rate
+
+
+# Determines the piece placement of a player under a difficulty profile.
+# Returns: tuple: The move (row, col) for placing a piece.
+def best_piece_place(game, player, profile):
+    if metrics.enabled:
+        started = time.perf_counter()
+    limits = None
+    if _blunder(profile):
+        move = random.choice(game.get_possible_pieces_places())
+    else:
+        limits = profile.limits()
+        move = bi_best_piece_place(game, profile.depth, player, profile.engine, limits=limits,
+                                   threats=profile.threats)
+    if metrics.enabled:
+        metrics.record('placement', time.perf_counter() - started, profile.name, limits)
+    if tracer.enabled:
+        tracer.event(INFO, 'difficulty.decision', profile=profile.name, kind='place', move=move)
+    return move
+
+
+# Determines the piece move of a player under a difficulty profile.
+# Returns: tuple: The move ((old_col, old_row), (new_col, new_row)) or None if there is no legal move.
+def best_piece_move(game, player, profile):
+    if metrics.enabled:
+        started = time.perf_counter()
+        hits, probes = probe_counters()
+    limits = None
+    if _blunder(profile):
+        possible_moves = game.get_possible_pieces_moves(player)
+        move = random.choice(possible_moves) if possible_moves else None
+    else:
+        limits = profile.limits()
+        endgame = profile.endgame and is_loaded()
+        if profile.endgame and not endgame:
+            profile.prepare()
+        move = bi_best_piece_move(game, profile.depth, player, profile.engine, limits=limits, endgame=endgame,
+                                  threats=profile.threats)
+    if metrics.enabled:
+        # Block cache of the solved table (bi.tablebase), probed when the profile plays the endgame from it
+        after_hits, after_probes = probe_counters()
+        metrics.record('movement', time.perf_counter() - started, profile.name, limits,
+                       {'tablebase': (after_hits - hits, after_probes - probes)})
+    if tracer.enabled:
+        tracer.event(INFO, 'difficulty.decision', profile=profile.name, kind='move', move=move)
+    return move
@@ -0,0 +1,248 @@
+import threading
+from collections import deque
+from itertools import combinations
+from bi.cache import load_table
+from bi.heuristics import WIN_SCORE
+from bi.position import NEIGHBORS ,BLOCKED ,FULL ,CELLS ,cells_of ,has_line
+from bi.tablebase import Tablebase ,compress ,encode_entry ,WIN ,LOSS ,DRAW
+
+# Movement phase solver: once both hands are empty and no barrier is on the board the game is a pure sliding game
+# of 3 against 3 pieces, small enough to solve completely. Every such position (pieces of both sides and the side
+# to move) is solved by retrograde analysis from the finished games, so a move is answered with a handful of
+# table lookups instead of a search.
+# Positions that are never resolved can be played forever by both sides: they are the cycles of the state graph and
+# are draws by repetition under best play. Barriers on the board multiply the states by their cells and lifetimes,
+# those positions are left to the search and reach the table as soon as the barriers expire.
+# The solver does not play barriers either, so positions where a side still holds one are left to the search as
+# well: a barrier is dropped on top of a move, without giving the turn away, and can break any forced line.
+# The solved states are kept as a compressed tablebase (bi.tablebase) with their distances to the end (DTM), so
+# every worker process holds the whole table in well under a megabyte.
+
+# Version of the solved table, bump it whenever the rules or the table layout change
+SOLUTION_VERSION = 2
+
+# Cells pieces can stand on and the rank of every set of three of them
+OPEN_CELLS = [cell for cell in range(CELLS) if not BLOCKED >> cell & 1]
+RANKS = {sum(1 << cell for cell in cells): rank for rank, cells in enumerate(combinations(OPEN_CELLS, 3))}
+
+# Solved table once loaded, a Tablebase indexed by state_index
+_solution = None
+# Thread loading the solved table in the background, see preload
+_loader = None
+
+
+# Method to get the key of a movement state in the solved table
+def state_key(mask0, mask1, side):
+    return mask0 | mask1 << CELLS | side << 2 * CELLS
+
+
+# Method to get the index of a movement state in the tablebase: the ranks of both piece sets and the side to move
+# Overlapping piece sets get an index too, it costs a few unused (draw) entries that compress to nothing and keeps
+# the index to two dict lookups
+def state_index(mask0, mask1, side):
+    return (RANKS[mask0] * len(RANKS) + RANKS[mask1]) * 2 + side
+
+
+# Method to check if the solver covers a position: both hands empty, no barrier on the board and none in hand
+def covers(position):
+    return not position[1] and position[2] == (0, 0) and position[3] == (0, 0)
+
+
+# Method to list the masks the side owning `mover` can reach with one move, empty when it is stuck
+def _moves(mover, other):
+    empty = FULL & ~(mover | other | BLOCKED)
+    targets = []
+    for start in cells_of(mover):
+        for end in cells_of(NEIGHBORS[start] & empty):
+            targets.append(mover & ~(1 << start) | 1 << end)
+    return targets
+
+
+# Method to list the states the position before `key` could have been in (the other side moved or passed)
+def _predecessors(mask0, mask1, side):
+    mover = 1 - side
+    masks = [mask0, mask1]
+    moved, other = masks[mover], masks[side]
+    empty = FULL & ~(moved | other | BLOCKED)
+    previous = []
+    for end in cells_of(moved):
+        for start in cells_of(NEIGHBORS[end] & empty):
+            before = moved & ~(1 << end) | 1 << start
+            if has_line(before):
+                continue
+            previous.append((before, other) if mover == 0 else (other, before))
+    # A stuck side passes, which leaves the pieces where they are
+    if not has_line(moved) and not _moves(moved, other):
+        previous.append((mask0, mask1))
+    return [(before0, before1, mover) for before0, before1 in previous]
+
+
+# Method to solve every movement state by retrograde analysis
+# Returns: dict: state_key -> distance * 2 + 1 for a win, distance * 2 for a loss (distance in plies), the states
+#                that are not in it are draws.
+def solve():
+    open_cells = OPEN_CELLS
+    result = {}
+    queue = deque()
+    for first in combinations(open_cells, 3):
+        mask0 = sum(1 << cell for cell in first)
+        rest = [cell for cell in open_cells if cell not in first]
+        for second in combinations(rest, 3):
+            mask1 = sum(1 << cell for cell in second)
+            for side in (0, 1):
+                # The side to move has lost when the other side completed a line with its last move
+                if has_line((mask0, mask1)[1 - side]):
+                    key = state_key(mask0, mask1, side)
+                    result[key] = 0
+                    queue.append((mask0, mask1, side))
+
+    # Successors of a state that are not known to be wins for the opponent yet
+    remaining = {}
+    while queue:
+        mask0, mask1, side = queue.popleft()
+        code = result[state_key(mask0, mask1, side)]
+        distance = (code >> 1) + 1
+        for before in _predecessors(mask0, mask1, side):
+            key = state_key(*before)
+            if key in result:
+                continue
+            if not code & 1:
+                # A move into a lost position wins
+                result[key] = distance * 2 + 1
+                queue.append(before)
+            else:
+                # A position is lost once every move leads to a won position for the opponent, the states come
+                # out of the queue by distance so the last one is the longest defence
+                count = remaining.get(key)
+                if count is None:
+                    before0, before1, mover = before
+                    masks = (before0, before1)
+                    count = len(_moves(masks[mover], masks[1 - mover])) or 1
+                count -= 1
+                remaining[key] = count
+                if count == 0:
+                    result[key] = distance * 2
+                    queue.append(before)
+    return result
+
+
+# Method to build the compressed tablebase of the solved states
+# Returns: dict: The table for bi.tablebase.Tablebase.
+def build_tablebase(solution=None):
+    solution = solve() if solution is None else solution
+    entries = bytearray(len(RANKS) * len(RANKS) * 2)
+    size = CELLS
+    for key, code in solution.items():
+        mask0 = key & FULL
+        mask1 = key >> size & FULL
+        result = WIN if code & 1 else LOSS
+        entries[state_index(mask0, mask1, key >> 2 * size)] = encode_entry(result, code >> 1)
+    return compress(entries)
+
+
+# Method to load the solved table, solving it on first use and caching it on disk
+def load_solution():
+    global _solution
+    if _solution is None:
+        _solution = Tablebase(load_table('movement_4x4', SOLUTION_VERSION, build_tablebase))
+    return _solution
+
+
+# Method to load the solved table in a background thread and return at once, for callers whose decisions must not
+# wait for a solve: they check is_loaded and search until the table is ready
+def preload():
+    global _loader
+    if _solution is None and _loader is None:
+        _loader = threading.Thread(target=load_solution, name='endgame-solver', daemon=True)
+        _loader.start()
+
+
+# Method to check if the solved table is loaded, so probing it costs no solve
+def is_loaded():
+    return _solution is not None
+
+
+# Method to get the probe counters of the solved table, (block cache hits, probes), zeros until it is loaded
+def probe_counters():
+    if _solution is None:
+        return 0, 0
+    return _solution.hits, _solution.probes
+
+
+# Method to look up the result of a covered position
+# Returns: tuple: (WIN, LOSS or DRAW, distance in plies) from the point of view of the side to move
+def probe(position):
+    return load_solution().probe(state_index(position[0][0], position[0][1], position[4]))
+
+
+# Method to convert a probe result to a search score: wins score WIN_SCORE minus their distance like minimax
+def to_score(result, distance):
+    if result == WIN:
+        return WIN_SCORE - distance
+    if result == LOSS:
+        return -(WIN_SCORE - distance)
+    return 0
+
+
+# Method to count the replies of the side to move that lose, used to pick the most testing of the drawing moves
+def _losing_replies(position):
+    solution = load_solution()
+    side = position[4]
+    masks = position[0]
+    count = 0
+    for target in _moves(masks[side], masks[1 - side]):
+        after = (target, masks[1]) if side == 0 else (masks[0], target)
+        if solution.probe(state_index(after[0], after[1], 1 - side))[0] == WIN:
+            count += 1
+    return count
+
+
+# Determines the best move of a covered position from the solved table.
+# Wins are taken by the shortest way, losses delayed as long as possible and among the drawing moves the one that
+# leaves the opponent the most losing replies is played.
+# Returns: tuple: The move (start, end) in cells, None when the side to move is stuck, and its score.
+
+def best_move(position):
+    best = None
+    best_rank = None
+    for move in position.legal_moves():
+        child = position.play(move)
+        result, distance = probe(child)
+        if result == LOSS:
+            rank = (2, -distance)
+        elif result == WIN:
+            rank = (0, distance)
+        else:
+            rank = (1, _losing_replies(child))
+        if best_rank is None or rank > best_rank:
+            best, best_rank = move, rank
+    if best is None:
+        return None, to_score(*probe(position))
+    if best_rank[0] == 2:
+        return best, WIN_SCORE - (1 - best_rank[1])
+    if best_rank[0] == 0:
+        return best, -(WIN_SCORE - 1 - best_rank[1])
+    return best, 0
+
+
+if __name__ == "__main__":
+    import random
+    import time
+    started = time.perf_counter()
+    table = solve()
+    wins = sum(code & 1 for code in table.values())
+    print(f"solved {len(table)} decided movement states ({wins} wins, {len(table) - wins} losses) "
+          f"in {time.perf_counter() - started:.1f}s, longest {max(table.values()) >> 1} plies")
+
+    # Probe the compressed table the way a game does, from random positions
+    tablebase = Tablebase(build_tablebase(table))
+    rng = random.Random(0)
+    for _ in range(20000):
+        cells = rng.sample(OPEN_CELLS, 6)
+        tablebase.probe(state_index(sum(1 << cell for cell in cells[:3]), sum(1 << cell for cell in cells[3:]),
+                                    rng.randrange(2)))
+    stats = tablebase.stats()
+    print(f"tablebase: {stats['entries']} entries in {stats['blocks']} blocks, {stats['compressed_bytes']} bytes "
+          f"compressed, {stats['nbytes']} bytes in memory")
+    print(f"{stats['probes']} random probes: {stats['hit_rate']:.1%} cache hits, "
+          f"{stats['decompressions']} decompressions, {stats['latency_us']:.2f} us per probe")
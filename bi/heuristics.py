@@ -1,18 +1,59 @@
+import json
+import os
+
+# Default weights of the evaluation factors, used when no weights file is present
+DEFAULT_WEIGHTS = {
+    'connected': 2,
+    'potential_wins': 3,
+    'empty_cells': 1,
+    'center_control': 2,
+    'block_opponent_wins': 4,
+    'forming_lines': 2,
+}
+
+# Weights file written by the tuner (bi/tuning.py), MORRIS_WEIGHTS can point to another file
+WEIGHTS_PATH = os.environ.get('MORRIS_WEIGHTS', os.path.join(os.path.dirname(__file__), 'weights.json'))
+
+
+# Loads evaluation weights from a JSON file, missing factors keep their default weight.
+def load_weights(path=WEIGHTS_PATH):
+    weights = dict(DEFAULT_WEIGHTS)
+    if os.path.exists(path):
+        with open(path) as weights_file:
+            loaded = json.load(weights_file)
+        weights.update({name: value for name, value in loaded.items() if name in DEFAULT_WEIGHTS})
+    return weights
+
+
+# Saves evaluation weights to a JSON file so that `evaluate` picks them up on the next start.
+def save_weights(weights, path=WEIGHTS_PATH):
+    with open(path, 'w') as weights_file:
+        json.dump({name: weights[name] for name in DEFAULT_WEIGHTS}, weights_file, indent=4)
+
+
+# Weights used by `evaluate` when none are passed explicitly
+WEIGHTS = load_weights()
+
+# Score of a won game. The search subtracts the distance to the win so that faster wins score higher.
+WIN_SCORE = 1000000
+
+
 # Counts the number of connected pieces for the given player on the board.
 # Connected pieces are those that form a horizontal or vertical line of the same color.
 def count_connected(game, player):
     board = game.board
+    size = board.size
     color = player.color
     connected = 0
     
     # Iterate over each cell on the board
-    for row in range(4):
-        for col in range(4):
+    for row in range(size):
+        for col in range(size):
             # Check if the current cell contains the player's piece
             if board.array[row][col] == color:
                 # Check horizontal connections
-                for i in range(1, 4):
-                    if col + i < 4 and board.array[row][col + i] == color:
+                for i in range(1, size):
+                    if col + i < size and board.array[row][col + i] == color:
                         connected += 1
                     else:
                         break
@@ -21,15 +62,15 @@ def count_connected(game, player):
                 connected += 1  # Count the current piece
 
                 # Check diagonal connections
-                for i in range(1, 4):
+                for i in range(1, size):
                     # Check down-right diagonal
-                    if row + i < 4 and col + i < 4 and board.array[row + i][col + i] == color:
+                    if row + i < size and col + i < size and board.array[row + i][col + i] == color:
                         connected += 1
                     else:
                         break
                     
                     # Check up-right diagonal
-                    if row - i >= 0 and col + i < 4 and board.array[row - i][col + i] == color:
+                    if row - i >= 0 and col + i < size and board.array[row - i][col + i] == color:
                         connected += 1
                     else:
                         break
@@ -40,27 +81,28 @@ def count_connected(game, player):
 # Potential wins are calculated based on empty spaces next to connected pieces.
 def potential_wins(game):
     board = game.board
+    size = board.size
     color = game.player1.color
     opponent_color = game.player2.color
     
     def count_potential_wins(color):
         count = 0
         # Iterate over each cell on the board
-        for row in range(4):
-            for col in range(4):
+        for row in range(size):
+            for col in range(size):
                 if board.array[row][col] == color:
                     # Check potential horizontal wins
-                    if col < 3 and (board.array[row][col + 1] is None or board.array[row][col + 1] == color):
+                    if col < size - 1 and (board.array[row][col + 1] is None or board.array[row][col + 1] == color):
                         count += 1
 
                     # Check potential vertical wins
-                    if row < 3 and board.array[row + 1][col] is None:
+                    if row < size - 1 and board.array[row + 1][col] is None:
                         count += 1
 
                     # Check potential diagonal wins
-                    if row < 3 and col < 3 and board.array[row + 1][col + 1] is None:
+                    if row < size - 1 and col < size - 1 and board.array[row + 1][col + 1] is None:
                         count += 1
-                    if row > 0 and col < 3 and board.array[row - 1][col + 1] is None:
+                    if row > 0 and col < size - 1 and board.array[row - 1][col + 1] is None:
                         count += 1
         return count
     
@@ -79,10 +121,11 @@ def potential_wins(game):
 # More empty cells indicate more opportunities for placing pieces.
 def empty_cells(game):
     board = game.board
+    size = board.size
     empty = 0
     # Iterate over each cell on the board
-    for row in range(4):
-        for col in range(4):
+    for row in range(size):
+        for col in range(size):
             # Check if the cell is empty
             if board.array[row][col] is None:
                 empty += 1
@@ -92,10 +135,9 @@ def empty_cells(game):
 # Evaluates control over the central positions of the board.
 # Controlling the center positions can be advantageous for strategy.
 def center_control(game, player):
-    center_positions = [(1, 1), (1, 2), (2, 1), (2, 2)]
     control = 0
-    # Check if the player's pieces are in the central positions
-    for row, col in center_positions:
+    # Check if the player's pieces are in the central positions (the 2x2 center of the standard board)
+    for row, col in game.variant.center:
         if game.board.array[row][col] == player.color:
             control += 1
     return control
@@ -112,29 +154,30 @@ def block_opponent_wins(game):
 # Forming lines can be a step towards winning or creating strategic positions.
 def forming_lines(game, player):
     board = game.board
+    size = board.size
     color = player.color
     lines = 0
     
     # Iterate over each cell on the board
-    for row in range(4):
-        for col in range(4):
+    for row in range(size):
+        for col in range(size):
             # Check if the current cell contains the player's piece
             if board.array[row][col] == color:
                 
                 # Check for horizontal line formation
-                if col + 1 < 4 and board.array[row][col + 1] == color:
+                if col + 1 < size and board.array[row][col + 1] == color:
                     lines += 1
                 
                 # Check for vertical line formation
-                if row + 1 < 4 and board.array[row + 1][col] == color:
+                if row + 1 < size and board.array[row + 1][col] == color:
                     lines += 1
                 
                 # Check for down-right diagonal line formation
-                if row + 1 < 4 and col + 1 < 4 and board.array[row + 1][col + 1] == color:
+                if row + 1 < size and col + 1 < size and board.array[row + 1][col + 1] == color:
                     lines += 1
                 
                 # Check for up-right diagonal line formation
-                if row - 1 >= 0 and col + 1 < 4 and board.array[row - 1][col + 1] == color:
+                if row - 1 >= 0 and col + 1 < size and board.array[row - 1][col + 1] == color:
                     lines += 1
 
     return lines
@@ -142,27 +185,24 @@ def forming_lines(game, player):
 
 # Evaluates the board state and returns a heuristic score based on various factors.
 # Higher scores are better for the `bi_player`, and lower (negative) scores indicate better positions for the opponent.
-def evaluate(game, bi_player):
+def evaluate(game, bi_player, weights=None):
     # Check for a win or loss and assign extreme scores
-    if game.check_winner() == bi_player.name:
-        return float('inf')
-    elif game.check_winner() == game.player2.name:
-        return -float('inf')
-
-    # Assign weights to different evaluation factors
-    weight_connected = 2
-    weight_potential_wins = 3
-    weight_empty_cells = 1
-    weight_center_control = 2
-    weight_block_opponent_wins = 4
-    weight_forming_lines = 2
+    winner = game.check_winner()
+    if winner == bi_player.name:
+        return WIN_SCORE
+    elif winner is not None:
+        return -WIN_SCORE
+
+    # Use the configured weights unless a specific set is given (e.g. by the tuner)
+    if weights is None:
+        weights = WEIGHTS
     
     # Calculate the score by combining different factors
-    score = (weight_connected * count_connected(game, bi_player) +
-             weight_potential_wins * potential_wins(game) +
-             weight_empty_cells * empty_cells(game) +
-             weight_center_control * center_control(game, bi_player) +
-             weight_block_opponent_wins * block_opponent_wins(game) +
-             weight_forming_lines * forming_lines(game, bi_player))
+    score = (weights['connected'] * count_connected(game, bi_player) +
+             weights['potential_wins'] * potential_wins(game) +
+             weights['empty_cells'] * empty_cells(game) +
+             weights['center_control'] * center_control(game, bi_player) +
+             weights['block_opponent_wins'] * block_opponent_wins(game) +
+             weights['forming_lines'] * forming_lines(game, bi_player))
     
     return score
@@ -0,0 +1,410 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from operator import mul
+from bi.heuristics import WIN_SCORE
+
+try:
+    import numpy
+except ImportError:
+    # numpy only speeds up the inference of large batches, the pure Python path computes the same values
+    numpy = None
+
+# Learned evaluation: a small value model over line occupancy features, trained from the results of headless
+# self-play games or from the solved movement table (bi.endgame). A model is either linear or a multi-layer
+# perceptron with one tanh hidden layer, and predicts tanh(z) ~ expected result of bi_player (-1 to 1).
+# The search uses SCALE * z as the score, so scores stay in the range of the heuristics and far below the wins.
+# A model is passed to the search with its `model` argument and replaces the heuristics; at depth 1 minimax scores
+# all the children of a node with one batch call.
+
+# Model file written by `python -m bi.learned`, MORRIS_VALUE_MODEL can point to another file
+MODEL_PATH = os.environ.get('MORRIS_VALUE_MODEL', os.path.join(os.path.dirname(__file__), 'value_model.json'))
+
+# Search score of one unit of model output
+SCALE = 100
+
+# Batches from this size on are computed with numpy when it is installed, smaller ones are faster in pure Python
+NUMPY_BATCH = 32
+
+# Linear model trained from 2000 self-play games at depth 2 on the standard board, used when no model file exists
+DEFAULT_MODEL = {
+    'line_length': 3,
+    'weights': [1.2514, 4.9936, -1.2219, -4.9913, 0.2951, -0.2015, -3.2758, 3.3796, 1.8218, -1.8771, 5.7214, -5.7648,
+                0.8912],
+    'bias': -0.188,
+    'hidden': None,
+    'hidden_bias': None,
+}
+
+
+# Method to get the names of the features of a line length, in the order of the feature vectors
+#   own_k / opp_k      - lines holding k pieces of bi_player / of the opponent and nothing else
+#   threats(_opp)      - lines one piece short of complete whose empty cell the side can fill with its next move
+#   center(_opp)       - pieces on the center cells
+#   hand(_opp)         - pieces left to place
+#   walls(_opp)        - barriers left to place
+#   to_move            - 1 when bi_player is to move, -1 otherwise
+def feature_names(line_length):
+    return ([f'own_{count}' for count in range(1, line_length)] + [f'opp_{count}' for count in range(1, line_length)]
+            + ['threats', 'threats_opp', 'center', 'center_opp', 'hand', 'hand_opp', 'walls', 'walls_opp', 'to_move'])
+
+
+_layouts = {}
+
+
+# Method to get the lines, the center cells and the neighbors of every cell of a variant as indexes into the
+# flattened board. Lines through a blocked cell can never be completed and are left out.
+def _layout(variant):
+    layout = _layouts.get(variant)
+    if layout is None:
+        size = variant.size
+        blocked = {(row, col) for col, row in variant.blocked}
+        lines = tuple(tuple(row * size + col for row, col in line) for line in variant.lines
+                      if not blocked.intersection(line))
+        center = tuple(row * size + col for row, col in variant.center)
+        neighbors = tuple(tuple((row + d_row) * size + col + d_col for d_row in (-1, 0, 1) for d_col in (-1, 0, 1)
+                                if (d_row or d_col) and 0 <= row + d_row < size and 0 <= col + d_col < size)
+                          for row in range(size) for col in range(size))
+        layout = _layouts[variant] = (lines, center, neighbors)
+    return layout
+
+
+class ValueModel:
+    # Initialize a value model
+    #   line_length - line length of the variants the model was trained for, the features depend on it
+    #   weights     - output weights, one per feature for a linear model or one per hidden unit
+    #   bias        - output bias
+    #   hidden      - weights of the hidden layer (one row of feature weights per unit), None for a linear model
+    #   hidden_bias - biases of the hidden units
+    def __init__(self, line_length, weights, bias=0.0, hidden=None, hidden_bias=None):
+        self.line_length = line_length
+        self.weights = list(weights)
+        self.bias = bias
+        self.hidden = [list(row) for row in hidden] if hidden else None
+        self.hidden_bias = list(hidden_bias) if hidden else None
+        self.names = feature_names(line_length)
+        # Sums of the codes of a line (see features): own pieces count 1, opponent pieces `base`, a barrier blocks
+        self.base = line_length + 1
+        self.barrier = self.base * self.base
+        self._arrays = None
+
+    # Method to compute the feature vector of a position, or a decided score when a line is complete
+    # Returns: tuple: (features, None) or (None, WIN_SCORE / -WIN_SCORE)
+    def features(self, game, bi_player, bi_to_move):
+        if game.variant.line_length != self.line_length:
+            raise ValueError(f"model trained for lines of {self.line_length}, the variant needs {game.variant.line_length}")
+        lines, center, neighbors = _layout(game.variant)
+        base = self.base
+        opponent = game.get_opponent(bi_player)
+        codes = {bi_player.color: 1, opponent.color: base, None: 0}
+        barrier = self.barrier
+        cells = [codes.get(value, barrier) for row in game.board.array for value in row]
+
+        length = self.line_length
+        counts = [0] * barrier
+        # Lines one piece short of complete: a threat when the side has a piece in hand or a piece next to the gap
+        short = (length - 1, (length - 1) * base)
+        threats = [0, 0]
+        for line in lines:
+            total = 0
+            for cell in line:
+                total += cells[cell]
+            if total < barrier:
+                counts[total] += 1
+                if total in short:
+                    side = 0 if total == short[0] else 1
+                    player = bi_player if side == 0 else opponent
+                    code = 1 if side == 0 else base
+                    gap = next(cell for cell in line if cells[cell] == 0)
+                    if player.pieces or any(cells[cell] == code and cell not in line for cell in neighbors[gap]):
+                        threats[side] += 1
+        if counts[length]:
+            return None, WIN_SCORE
+        if counts[length * base]:
+            return None, -WIN_SCORE
+
+        own_center = 0
+        other_center = 0
+        for cell in center:
+            code = cells[cell]
+            if code == 1:
+                own_center += 1
+            elif code == base:
+                other_center += 1
+        return (counts[1:length] + counts[base:length * base:base] + threats
+                + [own_center, other_center, bi_player.pieces, opponent.pieces, bi_player.barriers,
+                   opponent.barriers, 1 if bi_to_move else -1]), None
+
+    # Method to get the raw output z of the model for a batch of feature vectors
+    def outputs(self, rows):
+        if numpy is not None and len(rows) >= NUMPY_BATCH:
+            return self._numpy_outputs(rows)
+        weights = self.weights
+        bias = self.bias
+        if self.hidden is None:
+            return [bias + sum(map(mul, weights, row)) for row in rows]
+        hidden = self.hidden
+        hidden_bias = self.hidden_bias
+        outputs = []
+        for row in rows:
+            units = [math.tanh(unit_bias + sum(map(mul, unit, row))) for unit, unit_bias in zip(hidden, hidden_bias)]
+            outputs.append(bias + sum(map(mul, weights, units)))
+        return outputs
+
+    # Method to compute the outputs of a batch with numpy matrix products
+    def _numpy_outputs(self, rows):
+        if self._arrays is None:
+            self._arrays = (numpy.array(self.weights), numpy.array(self.hidden) if self.hidden else None,
+                            numpy.array(self.hidden_bias) if self.hidden else None)
+        weights, hidden, hidden_bias = self._arrays
+        inputs = numpy.array(rows, dtype=float)
+        if hidden is not None:
+            inputs = numpy.tanh(inputs @ hidden.T + hidden_bias)
+        return (inputs @ weights + self.bias).tolist()
+
+    # Method to get the search scores of feature vectors
+    def scores(self, rows):
+        return [SCALE * output for output in self.outputs(rows)]
+
+    # Method to evaluate one position for bi_player, higher is better for bi_player
+    def evaluate(self, game, bi_player, bi_to_move):
+        row, decided = self.features(game, bi_player, bi_to_move)
+        if row is None:
+            return decided
+        return self.scores([row])[0]
+
+    # Method to describe the model as a dictionary for the model file
+    def to_dict(self):
+        return {'line_length': self.line_length, 'features': self.names, 'weights': self.weights, 'bias': self.bias,
+                'hidden': self.hidden, 'hidden_bias': self.hidden_bias}
+
+    # The numpy arrays are rebuilt on demand, worker processes receive the plain lists only
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_arrays'] = None
+        return state
+
+
+# Method to build a model from its dictionary form
+def from_dict(data):
+    return ValueModel(data['line_length'], data['weights'], data['bias'], data.get('hidden'), data.get('hidden_bias'))
+
+
+# Method to load the model file, the built-in DEFAULT_MODEL is used when it does not exist
+def load_model(path=MODEL_PATH):
+    if path and os.path.exists(path):
+        with open(path) as model_file:
+            return from_dict(json.load(model_file))
+    return from_dict(DEFAULT_MODEL)
+
+
+# Method to write a model file
+def save_model(model, path=MODEL_PATH):
+    with open(path, 'w') as model_file:
+        json.dump(model.to_dict(), model_file, indent=4)
+
+
+# Method to collect the training samples of one headless game, used as the worker function of process pools
+# Every position after a turn gives one sample from each player's point of view, labelled with the final result
+def selfplay_samples(job):
+    # The self-play engine is imported here as only training needs it
+    from bi.selfplay import play_game
+    agent1, agent2, agent1_first, seed, line_length = job
+    model = ValueModel(line_length, [0.0] * len(feature_names(line_length)))
+    positions = []
+
+    # Method to remember the features of the position after every turn
+    def observe(game):
+        for side, player in enumerate((game.player1, game.player2)):
+            row, decided = model.features(game, player, game.current_player is player)
+            if row is not None:
+                positions.append((side, row))
+
+    result = play_game(agent1, agent2, agent1_first, seed, observer=observe)
+    return [(row, result if side == 0 else -result) for side, row in positions]
+
+
+# Method to sample labelled positions from the solved movement table of the standard board
+def endgame_samples(count, seed=0):
+    # The solver is imported here as only this training source needs it
+    from bi.endgame import probe ,WIN ,LOSS
+    from bi.position import Position ,to_game ,has_line ,BLOCKED ,CELLS
+    rng = random.Random(seed)
+    model = ValueModel(3, [0.0] * len(feature_names(3)))
+    open_cells = [cell for cell in range(CELLS) if not BLOCKED >> cell & 1]
+    samples = []
+    while len(samples) < count:
+        cells = rng.sample(open_cells, 6)
+        masks = (sum(1 << cell for cell in cells[:3]), sum(1 << cell for cell in cells[3:]))
+        if has_line(masks[0]) or has_line(masks[1]):
+            continue
+        side = rng.randrange(2)
+        position = Position(masks, hands=(0, 0), walls=(0, 0), side=side)
+        result, _ = probe(position)
+        label = 1 if result == WIN else -1 if result == LOSS else 0
+        game = to_game(position)
+        mover = (game.player1, game.player2)[side]
+        for player in (game.player1, game.player2):
+            row, _ = model.features(game, player, player is mover)
+            samples.append((row, label if player is mover else -label))
+    return samples
+
+
+# Fits a value model to labelled samples by stochastic gradient descent on the squared error of tanh(z).
+# Features are standardized while training and the scaling is folded into the weights of the returned model.
+# Parameters:
+#     samples (list): (features, label) pairs, labels from -1 (lost) to 1 (won).
+#     line_length (int): Line length the features were computed for.
+#     hidden (int): Hidden units, 0 for a linear model.
+#     epochs (int): Passes over the samples.
+#     rate (float): Learning rate.
+#     l2 (float): Weight decay.
+#     seed (int): Seed of the initial weights and the sample order.
+# Returns: ValueModel: The trained model.
+
+def fit(samples, line_length, hidden=0, epochs=20, rate=0.01, l2=1e-4, seed=0):
+    rng = random.Random(seed)
+    count = len(feature_names(line_length))
+    means = [sum(row[index] for row, _ in samples) / len(samples) for index in range(count)]
+    scales = [math.sqrt(sum((row[index] - means[index]) ** 2 for row, _ in samples) / len(samples)) or 1.0
+              for index in range(count)]
+    data = [([(value - mean) / scale for value, mean, scale in zip(row, means, scales)], label)
+            for row, label in samples]
+
+    if hidden:
+        matrix = [[rng.gauss(0, 1 / math.sqrt(count)) for _ in range(count)] for _ in range(hidden)]
+        unit_biases = [0.0] * hidden
+        weights = [rng.gauss(0, 1 / math.sqrt(hidden)) for _ in range(hidden)]
+    else:
+        weights = [0.0] * count
+    bias = 0.0
+
+    for epoch in range(epochs):
+        rng.shuffle(data)
+        for row, label in data:
+            if hidden:
+                units = [math.tanh(unit_bias + sum(map(mul, unit, row))) for unit, unit_bias in zip(matrix, unit_biases)]
+                inputs = units
+            else:
+                inputs = row
+            value = math.tanh(bias + sum(map(mul, weights, inputs)))
+            gradient = (value - label) * (1 - value * value)
+            if hidden:
+                for unit_index, unit_value in enumerate(units):
+                    unit_gradient = gradient * weights[unit_index] * (1 - unit_value * unit_value)
+                    unit = matrix[unit_index]
+                    for index, value_in in enumerate(row):
+                        unit[index] -= rate * (unit_gradient * value_in + l2 * unit[index])
+                    unit_biases[unit_index] -= rate * unit_gradient
+            for index, value_in in enumerate(inputs):
+                weights[index] -= rate * (gradient * value_in + l2 * weights[index])
+            bias -= rate * gradient
+
+    # Fold the standardization (x - mean) / scale into the first layer
+    if hidden:
+        for unit_index, unit in enumerate(matrix):
+            unit_biases[unit_index] -= sum(weight * mean / scale for weight, mean, scale in zip(unit, means, scales))
+            matrix[unit_index] = [weight / scale for weight, scale in zip(unit, scales)]
+        return ValueModel(line_length, weights, bias, matrix, unit_biases)
+    bias -= sum(weight * mean / scale for weight, mean, scale in zip(weights, means, scales))
+    return ValueModel(line_length, [weight / scale for weight, scale in zip(weights, scales)], bias)
+
+
+# Method to get the mean squared error of tanh(z) over labelled samples
+def loss(model, samples):
+    outputs = model.outputs([row for row, _ in samples])
+    return sum((math.tanh(output) - label) ** 2 for output, (_, label) in zip(outputs, samples)) / len(samples)
+
+
+# Method to play the self-play games that provide the training samples
+# Both sides search with one transposition table, shared by all the games of the pool (bi.workers)
+def collect_selfplay(games, depth, processes=1, seed=0, line_length=3):
+    # The self-play engine and the pools are imported here as only training needs them
+    from bi.selfplay import make_agent
+    from bi.workers import start_pool ,stop_pool
+    agent = make_agent(depth=depth, table=0)
+    jobs = [(agent, agent, game % 2 == 0, seed + game, line_length) for game in range(games)]
+    pool, shared = start_pool({'processes': processes, 'shared': True})
+    try:
+        if pool is not None:
+            batches = pool.map(selfplay_samples, jobs, chunksize=max(1, games // (processes * 4)))
+        else:
+            batches = list(map(selfplay_samples, jobs))
+    finally:
+        stop_pool(pool, shared)
+    return [sample for batch in batches for sample in batch]
+
+
+# Method to measure the evaluations per second of the heuristics and of a model, one by one and in batches
+def benchmark(model, positions=200, repeat=20, seed=0):
+    from bi.heuristics import evaluate
+    from bi.selfplay import make_agent ,play_game
+    games = []
+
+    # Method to keep copies of the positions of a game
+    def observe(game):
+        if not game.check_winner() and len(games) < positions:
+            games.append(game.copy())
+
+    while len(games) < positions:
+        play_game(make_agent(depth=1), make_agent(depth=1), seed=seed + len(games), observer=observe)
+
+    results = {}
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for game in games:
+            evaluate(game, game.player2)
+    results['heuristics'] = positions * repeat / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for game in games:
+            model.evaluate(game, game.player2, game.current_player is game.player2)
+    results['model'] = positions * repeat / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        rows = [model.features(game, game.player2, game.current_player is game.player2)[0] for game in games]
+        model.scores([row for row in rows if row is not None])
+    results['model batch'] = positions * repeat / (time.perf_counter() - started)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the learned value model from self-play or the solved table.")
+    parser.add_argument('--source', choices=('selfplay', 'endgame'), default='selfplay')
+    parser.add_argument('--games', type=int, default=2000, help="self-play games (selfplay source)")
+    parser.add_argument('--positions', type=int, default=20000, help="labelled samples (endgame source)")
+    parser.add_argument('--depth', type=int, default=2, help="search depth of the self-play agents")
+    parser.add_argument('--hidden', type=int, default=0, help="hidden units, 0 for a linear model")
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--rate', type=float, default=0.01)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--output', default=MODEL_PATH, help="model file loaded by load_model")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bench', action='store_true', help="only measure the evaluation speed of the model file")
+    args = parser.parse_args()
+
+    if args.bench:
+        for name, rate in benchmark(load_model(args.output)).items():
+            print(f"{name:<12} {rate:>10.0f} evaluations/s")
+        sys.exit(0)
+
+    started = time.perf_counter()
+    if args.source == 'selfplay':
+        samples = collect_selfplay(args.games, args.depth, args.processes, args.seed)
+    else:
+        samples = endgame_samples(args.positions, args.seed)
+    print(f"{len(samples)} samples in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    random.Random(args.seed).shuffle(samples)
+    held_out = samples[:len(samples) // 10]
+    started = time.perf_counter()
+    model = fit(samples[len(samples) // 10:], 3, args.hidden, args.epochs, args.rate, seed=args.seed)
+    print(f"trained in {time.perf_counter() - started:.1f}s, held-out loss {loss(model, held_out):.4f}", file=sys.stderr)
+    save_model(model, args.output)
+    print(json.dumps(model.to_dict()))
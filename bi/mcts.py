@@ -0,0 +1,231 @@
+import math
+import os
+import random
+import time
+from bi.memory import entries_for ,track ,MCTS_NODE_BYTES
+from bi.position import from_game, random_playout, is_win, cell_coords
+from models.trace import tracer ,INFO
+
+# UCT exploration constant
+EXPLORATION = 1.4
+
+# Default search budget, overridable through the environment
+# MORRIS_MCTS_ITERATIONS - playouts per decision
+# MORRIS_MCTS_TIME       - time limit per decision in seconds (unset means no time limit)
+# MORRIS_MCTS_PROCESSES  - number of processes for root-parallel search
+DEFAULT_ITERATIONS = int(os.environ.get('MORRIS_MCTS_ITERATIONS', 3000))
+DEFAULT_TIME_LIMIT = float(os.environ['MORRIS_MCTS_TIME']) if os.environ.get('MORRIS_MCTS_TIME') else None
+DEFAULT_PROCESSES = int(os.environ.get('MORRIS_MCTS_PROCESSES', 1))
+
+# Default tree size limit, as many nodes as fit the tree share of the AI memory budget
+DEFAULT_TREE_NODES = entries_for('tree', MCTS_NODE_BYTES)
+
+
+class Node:
+    __slots__ = ('position', 'parent', 'move', 'children', 'untried', 'visits', 'wins', 'winner')
+
+    # Initialize a tree node for a position reached by playing `move` from `parent`
+    # `wins` is counted for the side that played `move`, the side not to move in `position`
+    def __init__(self, position, parent=None, move=None):
+        self.position = position
+        self.parent = parent
+        self.move = move
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0
+        self.winner = position.winner()
+        if self.winner is not None:
+            self.untried = []
+        else:
+            # A side without any legal action passes its turn
+            self.untried = position.legal_moves() or [None]
+
+    # Method to pick the child with the best UCT score
+    def select_child(self, exploration):
+        log_visits = math.log(self.visits)
+        best_child = None
+        best_score = -1.0
+        for child in self.children:
+            score = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if score > best_score:
+                best_score = score
+                best_child = child
+        return best_child
+
+
+class MCTS:
+    # Initialize the engine, the tree is kept between searches so consecutive moves reuse it
+    def __init__(self, exploration=EXPLORATION, seed=None):
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.root = None
+        self.reused = 0
+        # Approximate number of nodes in the tree (every iteration adds at most one)
+        self.tree_nodes = 0
+        self.max_tree_nodes = None
+        track('tree', self)
+
+    # Estimated memory of the tree in bytes
+    @property
+    def nbytes(self):
+        return self.tree_nodes * MCTS_NODE_BYTES if self.root is not None else 0
+
+    # Method to find the node for `position` in the previous tree (the root, our reply or the opponent's answer)
+    def reuse_tree(self, position):
+        if self.root is not None:
+            if self.root.position == position:
+                return self.root
+            for child in self.root.children:
+                if child.position == position:
+                    return child
+                for grandchild in child.children:
+                    if grandchild.position == position:
+                        return grandchild
+        return None
+
+    # Method to run the search from `position` until the iteration or time budget is spent
+    # Once the tree holds `max_tree_nodes` nodes (DEFAULT_TREE_NODES when None) it stops growing and playouts
+    # start from its leaves
+    def search(self, position, iterations=None, time_limit=None, max_tree_nodes=None):
+        root = self.reuse_tree(position)
+        if root is None:
+            root = Node(position)
+            self.reused = 0
+        else:
+            # Detach the reused subtree so the rest of the old tree can be freed
+            root.parent = None
+            self.reused = root.visits
+        self.root = root
+        self.tree_nodes = root.visits + 1
+        self.max_tree_nodes = DEFAULT_TREE_NODES if max_tree_nodes is None else max_tree_nodes
+
+        if iterations is None and time_limit is None:
+            iterations = DEFAULT_ITERATIONS
+        deadline = time.perf_counter() + time_limit if time_limit is not None else None
+
+        done = 0
+        while iterations is None or done < iterations:
+            # Check the clock every few playouts to keep the overhead low
+            if deadline is not None and done % 16 == 0 and time.perf_counter() >= deadline:
+                break
+            self.iterate(root)
+            done += 1
+        return root
+
+    # Method to run one selection, expansion, playout and backpropagation step
+    def iterate(self, root):
+        node = root
+        # Selection
+        while not node.untried and node.children:
+            node = node.select_child(self.exploration)
+        # Expansion
+        if node.untried and self.tree_nodes < self.max_tree_nodes:
+            self.tree_nodes += 1
+            move = node.untried.pop(self.rng.randrange(len(node.untried)))
+            child = Node(node.position.play(move), node, move)
+            node.children.append(child)
+            node = child
+        # Playout
+        if node.winner is not None:
+            result = node.winner
+        else:
+            result = random_playout(node.position, self.rng)
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            if result is None:
+                node.wins += 0.5
+            elif result != node.position.side:
+                node.wins += 1.0
+            node = node.parent
+
+    # Method to get the visit and win counts of every root move
+    def root_stats(self):
+        return {child.move: (child.visits, child.wins) for child in self.root.children}
+
+
+# Shared engine so that the tree survives between consecutive decisions
+_engine = MCTS()
+
+
+# Method to run an independent search in a worker process for root-parallel search
+def _root_search(args):
+    position, iterations, time_limit, max_tree_nodes, seed = args
+    engine = MCTS(seed=seed)
+    engine.search(position, iterations, time_limit, max_tree_nodes)
+    return engine.root_stats()
+
+
+# Method to find a move that wins on the spot, which needs no search at all
+def _decisive_move(position):
+    side = position.side
+    for move in position.legal_moves():
+        start, end = move
+        mask = position.pieces[side]
+        if start >= 0:
+            mask &= ~(1 << start)
+        if is_win(mask | (1 << end), end):
+            return move
+    return None
+
+
+# Method to choose the best piece action for the side to move in `position`
+# Returns a (start, end) pair of cell indexes or None if the side has no legal action
+def mcts_search(position, iterations=None, time_limit=None, processes=None, max_tree_nodes=None):
+    if tracer.enabled:
+        started = time.perf_counter()
+
+    move = _decisive_move(position)
+    if move is not None:
+        return move
+
+    if iterations is None and time_limit is None:
+        iterations = DEFAULT_ITERATIONS
+        time_limit = DEFAULT_TIME_LIMIT
+    processes = processes or DEFAULT_PROCESSES
+
+    if processes > 1:
+        # Root parallelism: independent trees with different seeds, visit counts are summed
+        # multiprocessing is imported here as most games never use it and it is slow to import
+        from multiprocessing import Pool
+        jobs = [(position, iterations, time_limit, max_tree_nodes, random.randrange(1 << 30)) for _ in range(processes)]
+        with Pool(processes) as pool:
+            results = pool.map(_root_search, jobs)
+        stats = {}
+        for result in results:
+            for root_move, (visits, wins) in result.items():
+                total_visits, total_wins = stats.get(root_move, (0, 0.0))
+                stats[root_move] = (total_visits + visits, total_wins + wins)
+    else:
+        _engine.search(position, iterations, time_limit, max_tree_nodes)
+        stats = _engine.root_stats()
+
+    if not stats:
+        return None
+    move = max(stats, key=lambda root_move: stats[root_move][0])
+
+    if tracer.enabled:
+        visits, wins = stats[move]
+        tracer.event(INFO, 'mcts.search', move=move, visits=visits, value=round(wins / visits, 3),
+                     reused=_engine.reused if processes == 1 else 0, processes=processes,
+                     ms=round((time.perf_counter() - started) * 1000, 3))
+    return move
+
+
+# Determines the best placement for a piece for the given player using MCTS.
+# Returns: tuple: The best move (row, col) for placing a piece, like bi_best_piece_place.
+def mcts_best_piece_place(game, player, iterations=None, time_limit=None, processes=None, max_tree_nodes=None):
+    move = mcts_search(from_game(game, player), iterations, time_limit, processes, max_tree_nodes)
+    if move is None or move[0] >= 0:
+        return None
+    col, row = cell_coords(move[1])
+    return row, col
+
+
+# Determines the best move for a piece for the given player using MCTS.
+# Returns: tuple: The best move ((old_col, old_row), (new_col, new_row)), like bi_best_piece_move.
+def mcts_best_piece_move(game, player, iterations=None, time_limit=None, processes=None, max_tree_nodes=None):
+    move = mcts_search(from_game(game, player), iterations, time_limit, processes, max_tree_nodes)
+    if move is None or move[0] < 0:
+        return None
+    return cell_coords(move[0]), cell_coords(move[1])
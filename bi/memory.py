@@ -0,0 +1,88 @@
+import os
+import weakref
+
+# Memory budget of the AI subsystem of one process. Every bounded structure (transposition tables, result caches,
+# MCTS trees) takes its default size from its share of the budget, so the memory of a worker is known before it
+# starts and many workers can be packed onto one machine.
+
+# Budget per process in megabytes, MORRIS_AI_MEMORY_MB overrides it
+MEMORY_MB = float(os.environ.get('MORRIS_AI_MEMORY_MB', 64))
+
+# Share of the budget of every component
+#   table - transposition tables of minimax (fixed-size, allocated up front)
+#   tree  - MCTS search trees
+#   cache - result caches of the batch tools (analysis, review)
+SHARES = {
+    'table': 0.5,
+    'tree': 0.25,
+    'cache': 0.25,
+}
+
+# Approximate memory of one MCTS tree node (node object, position tuple and move lists) in bytes
+MCTS_NODE_BYTES = 600
+
+# Approximate memory of one result cache entry (dict slot, key and value objects) in bytes
+CACHE_ENTRY_BYTES = 200
+
+# Live structures by component, weak references so reporting never keeps a structure alive
+_tracked = {component: weakref.WeakSet() for component in SHARES}
+
+
+# Method to get the bytes of a component's share of a budget (MEMORY_MB by default)
+def component_bytes(component, memory_mb=None):
+    return int((MEMORY_MB if memory_mb is None else memory_mb) * SHARES[component] * 1024 * 1024)
+
+
+# Method to get how many entries of `entry_bytes` fit a component's share, at least one
+def entries_for(component, entry_bytes, memory_mb=None):
+    return max(1, component_bytes(component, memory_mb) // entry_bytes)
+
+
+# Method to register a structure for the memory report, the structure needs an `nbytes` attribute
+def track(component, structure):
+    _tracked[component].add(structure)
+    return structure
+
+
+# Method to get the memory in use per component, in bytes
+def memory_report():
+    return {component: sum(structure.nbytes for structure in structures) for component, structures in _tracked.items()}
+
+
+# Method to format a memory report next to the budget of every component
+def format_memory_report(report=None, memory_mb=None):
+    report = memory_report() if report is None else report
+    lines = []
+    for component, used in report.items():
+        lines.append(f"{component:<6} {used / 1048576:8.2f} MB of {component_bytes(component, memory_mb) / 1048576:8.2f} MB")
+    return '\n'.join(lines)
+
+
+class ResultCache:
+    # Initialize an empty cache holding at most `max_entries` results, by default as many as fit the cache share
+    def __init__(self, max_entries=None):
+        self.entries = {}
+        self.max_entries = entries_for('cache', CACHE_ENTRY_BYTES) if max_entries is None else max_entries
+        track('cache', self)
+
+    # Method to look up a result, returns None when it is not cached
+    def get(self, key):
+        return self.entries.get(key)
+
+    # Method to remember a result, new keys are dropped once the cache is full
+    def put(self, key, value):
+        if len(self.entries) < self.max_entries or key in self.entries:
+            self.entries[key] = value
+
+    # Estimated memory of the cache in bytes
+    @property
+    def nbytes(self):
+        return len(self.entries) * CACHE_ENTRY_BYTES
+
+    def __len__(self):
+        return len(self.entries)
+
+
+if __name__ == "__main__":
+    print(f"AI memory budget per process: {MEMORY_MB:g} MB (MORRIS_AI_MEMORY_MB)")
+    print(format_memory_report({component: 0 for component in SHARES}))
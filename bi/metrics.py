@@ -0,0 +1,315 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from models.trace import tracer ,INFO
+
+# Decision metrics for latency SLOs: every AI decision of a session adds to histograms of its latency, the depth its
+# search reached, the nodes it searched and the hit ratio of the caches it probed, per phase and difficulty profile.
+# The metrics are exported in the Prometheus text format, rewritten to a file (for the textfile collector of
+# node_exporter) and/or served over HTTP at /metrics. Recording one decision costs a few microseconds.
+#   placement - placing a piece, movement - moving a piece, barrier - the barrier placed before either
+PHASES = ('placement', 'movement', 'barrier')
+
+# Histogram buckets (upper bounds), every histogram also has the +Inf bucket
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DEPTH_BUCKETS = (1, 2, 3, 4, 5, 6, 7, 8, 9, 12, 16)
+NODE_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+RATIO_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 1.0)
+
+# Default seconds between two rewrites of the metrics file
+DEFAULT_INTERVAL = 10.0
+
+# Name and help of the histograms, in the order they are exported
+HISTOGRAMS = (
+    ('morris_decision_seconds', "Latency of an AI decision in seconds."),
+    ('morris_search_depth', "Depth of the last completed iterative deepening iteration."),
+    ('morris_search_nodes', "Nodes searched for a decision."),
+    ('morris_cache_hit_ratio', "Hit ratio of a cache during a decision."),
+)
+
+# Help of the counters
+COUNTERS = {
+    'morris_cache_hits_total': "Cache hits of AI decisions.",
+    'morris_cache_probes_total': "Cache probes of AI decisions.",
+}
+
+
+class Histogram:
+    # Initialize an empty histogram with the given bucket upper bounds
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Observations per bucket, the last one is +Inf; they are only made cumulative when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    # Method to add one observation
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Method to get the value below which `quantile` of the observations fall, the upper bound of its bucket
+    # Returns None without observations and inf when it falls in the +Inf bucket
+    def quantile(self, quantile):
+        if not self.count:
+            return None
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= quantile * self.count:
+                return bound
+        return float('inf')
+
+
+# Method to format a label set, e.g. {phase="movement",profile="hard"}
+def _labels(labels):
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+# Method to format a sample value, integers without a decimal point
+def _value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+class Metrics:
+    # Initialize the metrics, disabled unless an output file is given or enable() is called
+    #   output   - file the Prometheus text is rewritten to, None to only keep the metrics in memory
+    #   interval - minimum seconds between two rewrites of the file, the file is written at most that stale
+    def __init__(self, output=None, interval=DEFAULT_INTERVAL):
+        self.output = None
+        self.interval = interval
+        self.enabled = False
+        # Histograms by (name, labels), labels being a tuple of (name, value) pairs
+        self.histograms = {}
+        # Counters by (name, labels)
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.written = 0.0
+        self.server = None
+        self.configure(output, interval)
+
+    # Method to change the output file or rewrite interval, any output enables the metrics
+    def configure(self, output=None, interval=None):
+        if output is not None:
+            self.output = output
+        if interval is not None:
+            self.interval = interval
+        self.enabled = self.enabled or self.output is not None
+
+    # Method to collect the metrics without exporting them (tests, benchmarks, a caller rendering them itself)
+    def enable(self):
+        self.enabled = True
+
+    # Method to add one observation to a histogram
+    def observe(self, name, labels, value, buckets):
+        histogram = self.histograms.get((name, labels))
+        if histogram is None:
+            histogram = self.histograms[(name, labels)] = Histogram(buckets)
+        histogram.observe(value)
+
+    # Method to add to a counter
+    def count(self, name, labels, value=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    # Method to record one AI decision
+    # Parameters:
+    #     phase (str): One of PHASES.
+    #     seconds (float): Latency of the decision.
+    #     profile (str): Difficulty profile the decision was made with.
+    #     limits (SearchLimits): Budget of the minimax search of the decision, None when it did not search (a
+    #                            deliberate mistake, a move from the solved table, MCTS).
+    #     caches (dict): Cache name -> (hits, probes) during the decision, caches without probes are left out.
+    # Callers check `metrics.enabled` first so that disabled metrics cost one attribute lookup.
+    def record(self, phase, seconds, profile, limits=None, caches=None):
+        labels = (('phase', phase), ('profile', profile))
+        with self.lock:
+            self.observe('morris_decision_seconds', labels, seconds, LATENCY_BUCKETS)
+            if limits is not None and limits.nodes:
+                self.observe('morris_search_depth', labels, limits.completed_depth, DEPTH_BUCKETS)
+                self.observe('morris_search_nodes', labels, limits.nodes, NODE_BUCKETS)
+            for cache, (hits, probes) in (caches or {}).items():
+                if probes:
+                    cache_labels = labels + (('cache', cache),)
+                    self.observe('morris_cache_hit_ratio', cache_labels, hits / probes, RATIO_BUCKETS)
+                    self.count('morris_cache_hits_total', cache_labels, hits)
+                    self.count('morris_cache_probes_total', cache_labels, probes)
+        if self.output is not None and time.monotonic() - self.written >= self.interval:
+            self.write()
+
+    # Method to get the histogram of a metric, e.g. histogram('morris_decision_seconds', phase='movement',
+    # profile='hard'), None when nothing was recorded for these labels
+    def histogram(self, name, **labels):
+        return self.histograms.get((name, tuple(labels.items())))
+
+    # Method to forget everything recorded so far
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    # Method to render the metrics in the Prometheus text exposition format
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, help_text in HISTOGRAMS:
+                series = sorted((labels, histogram) for (metric, labels), histogram in self.histograms.items()
+                                if metric == name)
+                if not series:
+                    continue
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in series:
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', _value(bound)),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+            for name in sorted({metric for metric, _ in self.counters}):
+                lines.append(f"# HELP {name} {COUNTERS.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    # Method to write the metrics to the output file
+    # The text is written next to the file and renamed over it, so a collector never reads a partial file
+    def write(self, path=None):
+        path = path or self.output
+        if path is None:
+            return
+        self.written = time.monotonic()
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, 'w') as exported:
+            exported.write(self.render())
+        os.replace(partial, path)
+
+    # Method to serve the metrics at http://host:port/metrics from a background thread, enables the metrics
+    # Returns: tuple: The (host, port) the server listens on, port 0 picks a free port.
+    def serve(self, host='127.0.0.1', port=0):
+        # The HTTP server is imported here as only sessions scraped over the network need it
+        from http.server import ThreadingHTTPServer ,BaseHTTPRequestHandler
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            # Scrapes are not logged on stderr
+            def log_message(self, format, *args):
+                pass
+
+        self.enable()
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='morris-metrics', daemon=True).start()
+        if tracer.enabled:
+            tracer.event(INFO, 'metrics.serve', address=self.server.server_address[:2])
+        return self.server.server_address[:2]
+
+    # Method to stop serving and write the output file a last time
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.write()
+
+
+# Method to build the shared metrics from the environment
+# MORRIS_METRICS_FILE sets the file the metrics are exported to and MORRIS_METRICS_INTERVAL the seconds between two
+# rewrites of it
+def _metrics_from_env():
+    interval = float(os.environ.get('MORRIS_METRICS_INTERVAL', DEFAULT_INTERVAL))
+    return Metrics(os.environ.get('MORRIS_METRICS_FILE'), interval)
+
+
+# Shared metrics recorded by the difficulty profiles and the game window
+metrics = _metrics_from_env()
+
+
+if __name__ == "__main__":
+    # The engine is imported here so that importing the metrics stays cheap
+    import random
+    from models.player import Player
+    from models.game import Game
+    from bi.difficulty import PROFILES ,best_piece_place ,best_piece_move
+    from bi.minimax import bi_best_barrier_placement
+    # The profiles record into the shared metrics of the imported module, not into the ones of this script
+    from bi.metrics import metrics ,Metrics
+
+    parser = argparse.ArgumentParser(description="Play games under a difficulty profile and export the decision "
+                                                 "metrics in the Prometheus text format.")
+    parser.add_argument('--difficulty', choices=list(PROFILES), default='medium')
+    parser.add_argument('--games', type=int, default=4)
+    parser.add_argument('--max-turns', type=int, default=60)
+    parser.add_argument('--output', default=None, help="file the metrics are written to, stdout by default")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    profile = PROFILES[args.difficulty]
+    metrics.enable()
+    for index in range(args.games):
+        random.seed(args.seed + index)
+        player1 = Player(name="player1")
+        player1.color = 'red'
+        player2 = Player(name="player2")
+        player2.color = 'blue'
+        game = Game(player1, player2)
+        game.current_player = player1 if index % 2 == 0 else player2
+        for _ in range(args.max_turns):
+            player = game.current_player
+            # Both sides play the profile the way GameInterface plays Morris BI. The actions go through
+            # Game.apply_action, which ends the turn like the game does: barriers age and the draw rules count it.
+            while player.has_barriers():
+                started = time.perf_counter()
+                barrier_move = bi_best_barrier_placement(game, player)
+                metrics.record('barrier', time.perf_counter() - started, profile.name)
+                if not barrier_move:
+                    break
+                game.apply_action(('place_barrier', barrier_move[1], barrier_move[0]))
+            if player.has_pieces():
+                row, col = best_piece_place(game, player, profile)
+                game.apply_action(('place_piece', col, row))
+            else:
+                move = best_piece_move(game, player, profile)
+                game.apply_action(('move_piece', *move[0], *move[1]) if move else ('pass',))
+            if game.check_winner() or game.draw:
+                break
+
+    if args.output:
+        metrics.write(args.output)
+    else:
+        sys.stdout.write(metrics.render())
+    for phase in PHASES:
+        latency = metrics.histogram('morris_decision_seconds', phase=phase, profile=profile.name)
+        if latency is not None:
+            print(f"{phase}: {latency.count} decisions, mean {latency.sum * 1000 / latency.count:.2f} ms, "
+                  f"p50 <= {latency.quantile(0.5) * 1000:g} ms, p99 <= {latency.quantile(0.99) * 1000:g} ms",
+                  file=sys.stderr)
+
+    # Cost of recording one searched decision, on metrics of their own
+    scratch = Metrics()
+    scratch.enable()
+    limits = profile.limits()
+    limits.nodes, limits.completed_depth = 1000, profile.depth
+    started = time.perf_counter()
+    for _ in range(10000):
+        scratch.record('movement', 0.01, profile.name, limits, {'tablebase': (9, 10)})
+    print(f"recording a decision: {(time.perf_counter() - started) * 100:.2f} us", file=sys.stderr)
@@ -1,6 +1,332 @@
 from math import inf
-from bi.heuristics import evaluate
+from bi.heuristics import evaluate ,WIN_SCORE
+from bi.mcts import mcts_best_piece_place ,mcts_best_piece_move
+from bi.endgame import covers ,best_move as endgame_move
+from bi.position import from_game ,side_of ,cell_coords
+from bi.ttable import EXACT ,LOWER ,UPPER
+from models.trace import tracer ,DEBUG ,INFO
+from models.game import DIRECTIONS
+from models.variant import STANDARD
+import os
 import random
+import time
+
+# Search backend used by the bi_best_piece_place/bi_best_piece_move entry points: 'minimax' or 'mcts'
+ENGINE = os.environ.get('MORRIS_ENGINE', 'minimax')
+
+# Deepest ply a search can reach. Wins are scored WIN_SCORE minus their distance from the root,
+# so any score beyond WIN_SCORE - MAX_PLY is a forced result of the searched moves rather than a heuristic estimate.
+MAX_PLY = 64
+
+# Node budget of the threat extension of every leaf: past the depth the search goes on with forcing moves only
+# (completing a line, blocking one, a barrier block) until the position is quiet or the budget is spent.
+# 0 turns the extension off, leaves are then evaluated even when a line is about to be completed.
+THREAT_NODES = int(os.environ.get('MORRIS_THREAT_NODES', 64))
+
+
+# Raised inside the search when the node or time budget of a decision is spent
+class SearchAborted(Exception):
+    pass
+
+
+class SearchLimits:
+    # Initialize the budget of one decision, None means unlimited
+    # nodes - maximum number of minimax nodes (playouts for MCTS), time_limit - maximum search time in seconds,
+    # tree_nodes - maximum size of an MCTS tree
+    def __init__(self, nodes=None, time_limit=None, tree_nodes=None):
+        self.max_nodes = nodes
+        self.time_limit = time_limit
+        self.max_tree_nodes = tree_nodes
+        self.nodes = 0
+        self.deadline = None
+        # Depth of the last fully completed iterative deepening iteration
+        self.completed_depth = 0
+
+    # Method to start the clock, called when the decision starts
+    def start(self):
+        self.nodes = 0
+        self.completed_depth = 0
+        self.deadline = time.perf_counter() + self.time_limit if self.time_limit is not None else None
+
+    # Method to count a node and abort the search once the budget is spent
+    # The clock is only read every 64 nodes, which bounds the overrun to a few milliseconds
+    def visit(self):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SearchAborted()
+        if self.deadline is not None and self.nodes & 63 == 0 and time.perf_counter() >= self.deadline:
+            raise SearchAborted()
+
+
+class SearchPath(set):
+    # Position hashes of the game so far and of the line being searched. `draws` counts the moves scored as draws by
+    # repetition: a node whose count changed while it was searched has a score that depends on the history of this
+    # game and is not stored in the transposition table, which other games (a shared table) read as well.
+    __slots__ = ('draws',)
+
+    def __init__(self, hashes=()):
+        super().__init__(hashes)
+        self.draws = 0
+
+
+# Method to check if a score is a forced win or loss of the searched moves rather than a heuristic estimate
+def is_decided(score):
+    return abs(score) >= WIN_SCORE - MAX_PLY
+
+
+# Method to check if a score of `player` is a proven win or loss of the game as it stands
+# The search leaves barriers out, so the losing side may break a forced result with a barrier drop: it is only
+# proven when that side has no barrier left in hand, or when the root move completes a line itself.
+def is_proven(score, game, player):
+    if not is_decided(score):
+        return False
+    if score >= WIN_SCORE - 1:
+        return True
+    loser = game.get_opponent(player) if score > 0 else player
+    return not loser.has_barriers()
+
+
+# Method to play a piece action (in get_legal_moves format) for the given player
+# Returns True if the action was legal and has been applied
+def make_move(game, move, player):
+    if move[0] == 'place_piece':
+        _, col, row = move
+        if game.board.add_piece(col, row, player.color):
+            player.remove_piece()
+            return True
+        return False
+    _, col, row, new_col, new_row = move
+    return game.board.move_piece(col, row, new_col, new_row)
+
+
+# Method to undo a piece action applied by make_move
+def undo_move(game, move, player):
+    if move[0] == 'place_piece':
+        _, col, row = move
+        game.board.remove_piece(col, row)
+        player.add_piece()
+    else:
+        _, col, row, new_col, new_row = move
+        game.board.move_piece(new_col, new_row, col, row)
+
+
+# Method to get the cell (col, row) a piece action puts a piece on
+def destination(move):
+    return move[-2], move[-1]
+
+
+# Method to evaluate a position for bi_player with the heuristics or, when a `model` is given, the learned model
+def evaluate_position(game, bi_player, weights, model, bi_to_move):
+    if model is not None:
+        return model.evaluate(game, bi_player, bi_to_move)
+    return evaluate(game, bi_player, weights)
+
+
+# Method to list the cells (col, row) where a player completes a line with its next piece action: the open cell of
+# a line whose other cells are all the player's. A placing player can always fill it, a moving player needs a piece
+# next to it that is not part of the line.
+def winning_cells(game, player):
+    array = game.board.array
+    accessibility = game.board.accessibility
+    size = game.board.size
+    color = player.color
+    placing = player.has_pieces()
+    cells = set()
+    for line in game.variant.lines:
+        open_cell = None
+        for row, col in line:
+            value = array[row][col]
+            if value == color:
+                continue
+            if value is not None or open_cell is not None or not accessibility[row][col]:
+                break
+            open_cell = (row, col)
+        else:
+            if open_cell is None:
+                continue
+            row, col = open_cell
+            if placing:
+                cells.add((col, row))
+                continue
+            for d_row, d_col in DIRECTIONS:
+                next_row, next_col = row + d_row, col + d_col
+                if 0 <= next_row < size and 0 <= next_col < size and array[next_row][next_col] == color \
+                        and (next_row, next_col) not in line:
+                    cells.add((col, row))
+                    break
+    return cells
+
+
+# Method to search the forcing moves of a leaf past the depth horizon (threat extension)
+# The side to move wins at once when it has a winning cell. Otherwise it has to answer every winning cell of the
+# other side, by putting a piece on it or, with a barrier in hand, by closing it with a barrier first (the barrier
+# does not end the turn, so a barrier that answers every threat leaves a quiet position). A threat it can not
+# answer wins for the other side with its next move.
+# `budget` is a one item list with the extension nodes this leaf may still visit; once they are spent, threatened
+# positions are evaluated as they stand.
+# Returns: The score of the node, None when the node is quiet and is evaluated by the caller.
+def threat_search(game, alpha, beta, maximizing_player, bi_player, weights, model, ply, limits, budget):
+    mover = bi_player if maximizing_player else game.get_opponent(bi_player)
+    other = game.get_opponent(mover)
+    sign = 1 if maximizing_player else -1
+    if winning_cells(game, mover):
+        return sign * (WIN_SCORE - (ply + 1))
+    threats = winning_cells(game, other)
+    if not threats:
+        return None
+    if budget[0] <= 0 or ply + 2 >= MAX_PLY:
+        return evaluate_position(game, bi_player, weights, model, maximizing_player)
+    budget[0] -= 1
+
+    best = -sign * (WIN_SCORE - (ply + 2))
+    answers = [(None, threats)]
+    if mover.has_barriers():
+        answers.extend((cell, threats - {cell}) for cell in threats)
+    for barrier, open_cells in answers:
+        # A piece closes one cell, any other one is left to the other side
+        if len(open_cells) > 1:
+            continue
+        if barrier is not None:
+            game.board.place_barrier(*barrier)
+            mover.remove_barrier()
+        try:
+            if open_cells:
+                scores = []
+                # The actions are listed first, iter_piece_actions needs the board unchanged while it runs
+                for move in [move for move in game.iter_piece_actions(mover) if destination(move) in open_cells]:
+                    if limits is not None:
+                        limits.visit()
+                    make_move(game, move, mover)
+                    try:
+                        score = threat_search(game, alpha, beta, not maximizing_player, bi_player, weights, model,
+                                              ply + 1, limits, budget)
+                        if score is None:
+                            score = evaluate_position(game, bi_player, weights, model, not maximizing_player)
+                    finally:
+                        undo_move(game, move, mover)
+                    scores.append(score)
+                    if maximizing_player:
+                        alpha = max(alpha, score)
+                    else:
+                        beta = min(beta, score)
+                    if alpha >= beta:
+                        break
+            else:
+                scores = [evaluate_position(game, bi_player, weights, model, maximizing_player)]
+        finally:
+            if barrier is not None:
+                game.board.remove_barrier(*barrier)
+                mover.add_barrier()
+        for score in scores:
+            if sign * score > sign * best:
+                best = score
+        if maximizing_player:
+            alpha = max(alpha, best)
+        else:
+            beta = min(beta, best)
+        if alpha >= beta:
+            break
+    return best
+
+
+# Method to score every child of a depth 1 node with one batch call of a learned value model
+# Wins and repetitions are scored like minimax does, threatened children go through the threat extension and the
+# quiet ones are evaluated together
+# Returns: tuple: The best score for the side to move and the corresponding move, (None, None) when it is stuck.
+def score_children(game, maximizing_player, bi_player, model, ply, limits, path, threats):
+    win_score = WIN_SCORE - (ply + 1)
+    mover = bi_player if maximizing_player else game.get_opponent(bi_player)
+    other = game.get_opponent(mover)
+    sign = 1 if maximizing_player else -1
+    moves = []
+    scores = []
+    rows = []
+    evaluated = []
+    for move in game.iter_piece_actions(mover):
+        if not make_move(game, move, mover):
+            continue
+        try:
+            if limits is not None:
+                limits.visit()
+            if game.is_winning_move(*destination(move)):
+                score = sign * win_score
+            elif path is not None and game.position_hash(other) in path:
+                path.draws += 1
+                score = 0
+            else:
+                score = None
+                if threats:
+                    score = threat_search(game, -inf, inf, not maximizing_player, bi_player, None, model, ply + 1,
+                                          limits, [threats])
+                if score is None:
+                    row, score = model.features(game, bi_player, not maximizing_player)
+                    if row is not None:
+                        evaluated.append(len(moves))
+                        rows.append(row)
+        finally:
+            undo_move(game, move, mover)
+        moves.append(move)
+        scores.append(score)
+    # The features are taken while each move is on the board, the model runs once for all of them
+    for index, score in zip(evaluated, model.scores(rows)):
+        scores[index] = score
+
+    best_move = None
+    best_score = None
+    for move, score in zip(moves, scores):
+        if best_move is None or sign * score > sign * best_score:
+            best_move, best_score = move, score
+    return best_score, best_move
+
+
+# Bits of the position hash (Game.position_hash) kept in a table key, the key must fit the signed 64-bit slots
+KEY_MASK = (1 << 61) - 1
+
+
+# Method to get the transposition table key of a position searched for bi_player with `mover` to move
+# The key is the incremental position hash, so it costs nothing to build at every node. Scores are from
+# bi_player's point of view, so bi_player's side is part of the key.
+def table_key(game, mover, bi_player):
+    return (game.position_hash(mover) & KEY_MASK) << 1 | side_of(game, bi_player)
+
+
+# Method to convert a score to the form stored in the table: wins count from the stored node, not the root
+def score_to_table(score, ply):
+    if score >= WIN_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -(WIN_SCORE - MAX_PLY):
+        return score - ply
+    return score
+
+
+# Method to convert a stored score back to a score counted from the root
+def score_from_table(score, ply):
+    if score >= WIN_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -(WIN_SCORE - MAX_PLY):
+        return score + ply
+    return score
+
+
+# Method to store a node result with the right bound flag for the search window it was searched with
+def store_result(table, key, depth, score, alpha, beta, move, ply):
+    if score <= alpha:
+        flag = UPPER
+    elif score >= beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    table.store(key, depth, flag, score_to_table(score, ply), move)
+
+
+# Method to generate the piece actions of a player with the move remembered by the table first, it is the most
+# likely to cause a cutoff. Actions are generated one by one so no move list is built at every node.
+def ordered_moves(game, player, first):
+    if first is not None:
+        yield first
+    for move in game.iter_piece_actions(player):
+        if move != first:
+            yield move
 
 
 # Minimax algorithm with alpha-beta pruning for decision making in the game.
@@ -11,45 +337,106 @@ import random
 #beta (float): The best value that the minimizing player can guarantee.
 #maximizing_player (bool): True if the current move is for the maximizing player, False otherwise.
 #bi_player (Player): The player for whom we are calculating the best move.
+#weights (dict): Optional evaluation weights, defaults to the configured heuristics weights.
+#model (ValueModel): Optional learned value model (bi.learned) evaluating the positions instead of the heuristics, the
+#                    children of depth 1 nodes are then scored in batches.
+#ply (int): Distance from the root, a win found at ply p scores WIN_SCORE - p so faster wins score higher.
+#limits (SearchLimits): Optional node and time budget, SearchAborted is raised when it is spent.
+#table (TranspositionTable): Optional table of already searched positions, shared between searches.
+#path (SearchPath): Optional position hashes of the game so far and of the line leading to this node, a move back
+#                  to one of them is scored as a draw by repetition.
+#threats (int): Node budget of the threat extension of every leaf, defaults to THREAT_NODES, 0 turns it off.
 # Returns: tuple: The best evaluation score and the corresponding move.
     
-def minimax(game, depth, alpha, beta, maximizing_player, bi_player):
+def minimax(game, depth, alpha, beta, maximizing_player, bi_player, weights=None, ply=0, limits=None, table=None,
+            path=None, threats=None, model=None):
+    if tracer.enabled:
+        tracer.event(DEBUG, 'minimax.node', depth=depth, alpha=alpha, beta=beta, maximizing=maximizing_player)
+    if limits is not None:
+        limits.visit()
+
     # Base case: if depth is 0 or the game is in an end state, return the evaluation of the board
-    if depth == 0 or game.board.active:
-        return evaluate(game, bi_player), None
+    # Wins are detected on the move that makes them, so no node below the root is ever a finished game
+    if depth == 0 or not game.board.active:
+        # A leaf with a line about to be completed is searched on with the forcing moves
+        budget = THREAT_NODES if threats is None else threats
+        if budget and game.board.active:
+            score = threat_search(game, alpha, beta, maximizing_player, bi_player, weights, model, ply, limits,
+                                  [budget])
+            if score is not None:
+                return score, None
+        return evaluate_position(game, bi_player, weights, model, maximizing_player), None
+
+    # Score of a win with the next move, the best result any side can reach from this node
+    win_score = WIN_SCORE - (ply + 1)
+
+    # Transposition table lookup: reuse the result of an earlier search of the same position
+    key = None
+    table_move = None
+    if table is not None:
+        mover = bi_player if maximizing_player else game.get_opponent(bi_player)
+        key = table_key(game, mover, bi_player)
+        entry = table.probe(key)
+        if entry is not None:
+            entry_depth, flag, score, table_move = entry
+            if entry_depth >= depth:
+                score = score_from_table(score, ply)
+                if flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha):
+                    return score, table_move
+        alpha_start, beta_start = alpha, beta
+
+    # The position of this node is on the line of its children. A node left by SearchAborted stays in the path,
+    # which is dropped with the aborted search.
+    if path is not None:
+        opponent = game.get_opponent(bi_player)
+        position = game.position_hash(bi_player if maximizing_player else opponent)
+        draws = path.draws
+
+    # At the last ply a learned value model scores all the children in one batch
+    if depth == 1 and model is not None:
+        if path is not None:
+            path.add(position)
+        best_score, best_move = score_children(game, maximizing_player, bi_player, model, ply, limits, path,
+                                               THREAT_NODES if threats is None else threats)
+        if path is not None:
+            path.discard(position)
+        if best_move is None:
+            return evaluate_position(game, bi_player, weights, model, maximizing_player), None
+        if key is not None and (path is None or path.draws == draws):
+            store_result(table, key, depth, best_score, alpha_start, beta_start, best_move, ply)
+        return best_score, best_move
 
     # Maximizing player's turn
     if maximizing_player:
+        # Mate distance pruning: a faster win was already found closer to the root
+        if alpha >= win_score:
+            return alpha, None
+
         max_eval = float('-inf')  # Initialize to negative infinity
         best_move = None  # Best move initialization
+        if path is not None:
+            path.add(position)
         # Iterate over all possible legal moves for the maximizing player
-        for move in game.get_legal_moves(bi_player):
-            if move[0] == 'place_piece':
-                _, col, row = move
-                # Try the move
-                if game.place_piece(col, row):
-                    # Recursively call minimax for the next depth level
-                    eval = minimax(game, depth - 1, alpha, beta, False, bi_player)[0]
-                    # Undo the move
-                    game.board.remove_piece(col, row)
-                    bi_player.add_piece()
-            elif move[0] == 'place_barrier':
-                _, col, row = move
-                # Try the move
-                if game.place_barrier(col, row):
-                    # Recursively call minimax for the next depth level
-                    eval = minimax(game, depth - 1, alpha, beta, False, bi_player)[0]
-                    # Undo the move
-                    game.board.remove_barrier(col, row)
-                    bi_player.add_barrier()
-            elif move[0] == 'move_piece':
-                _, col, row, new_col, new_row = move
-                # Try the move
-                if game.move_piece(col, row, new_col, new_row):
-                    # Recursively call minimax for the next depth level
-                    eval = minimax(game, depth - 1, alpha, beta, False, bi_player)[0]
-                    # Undo the move
-                    game.board.move_piece(new_col, new_row, col, row)
+        # Barriers are left out: placing one does not end the turn and bi_best_barrier_placement decides them
+        for move in ordered_moves(game, bi_player, table_move):
+            # Try the move
+            if not make_move(game, move, bi_player):
+                continue
+            # A completed line ends the game, otherwise recursively call minimax for the next depth level
+            # The move is undone even when the search is aborted below it
+            try:
+                if game.is_winning_move(*destination(move)):
+                    eval = win_score
+                elif path is not None and game.position_hash(opponent) in path:
+                    # Back to an earlier position: the side that wants to can repeat it until the game is drawn
+                    path.draws += 1
+                    eval = 0
+                else:
+                    eval = minimax(game, depth - 1, alpha, beta, False, bi_player, weights, ply + 1, limits, table,
+                                   path, threats, model)[0]
+            finally:
+                # Undo the move
+                undo_move(game, move, bi_player)
 
             # Update the best move found so far if the current evaluation is better
             if eval > max_eval:
@@ -58,43 +445,49 @@ def minimax(game, depth, alpha, beta, maximizing_player, bi_player):
             # Update alpha to the maximum value found so far
             alpha = max(alpha, eval)
             # Alpha-beta pruning: if beta is less than or equal to alpha, stop the search
-            if beta <= alpha:
+            # A win on the next move can not be improved on either
+            if beta <= alpha or eval == win_score:
                 break
+        if path is not None:
+            path.discard(position)
+
+        # A player without legal moves passes, score the position as it stands
+        if best_move is None:
+            return evaluate_position(game, bi_player, weights, model, maximizing_player), None
+        if key is not None and (path is None or path.draws == draws):
+            store_result(table, key, depth, max_eval, alpha_start, beta_start, best_move, ply)
         return max_eval, best_move
 
     # Minimizing player's turn
     else:
+        # Mate distance pruning: the opponent can not lose slower than a loss already found closer to the root
+        if beta <= -win_score:
+            return beta, None
+
         min_eval = float('inf')  # Initialize to positive infinity
         opponent = game.get_opponent(bi_player)  # Get the opponent player
         best_move = None  # Best move initialization
+        if path is not None:
+            path.add(position)
         # Iterate over all possible legal moves for the minimizing player (opponent)
-        for move in game.get_legal_moves(opponent):
-            if move[0] == 'place_piece':
-                _, col, row = move
-                # Try the move
-                if game.place_piece(col, row):
-                    # Recursively call minimax for the next depth level
-                    eval = minimax(game, depth - 1, alpha, beta, True, bi_player)[0]
-                    # Undo the move
-                    game.board.remove_piece(col, row)
-                    opponent.add_piece()
-            elif move[0] == 'place_barrier':
-                _, col, row = move
-                # Try the move
-                if game.place_barrier(col, row):
-                    # Recursively call minimax for the next depth level
-                    eval = minimax(game, depth - 1, alpha, beta, True, bi_player)[0]
-                    # Undo the move
-                    game.board.remove_barrier(col, row)
-                    opponent.add_barrier()
-            elif move[0] == 'move_piece':
-                _, col, row, new_col, new_row = move
-                # Try the move
-                if game.move_piece(col, row, new_col, new_row):
-                    # Recursively call minimax for the next depth level
-                    eval = minimax(game, depth - 1, alpha, beta, True, bi_player)[0]
-                    # Undo the move
-                    game.board.move_piece(new_col, new_row, col, row)
+        for move in ordered_moves(game, opponent, table_move):
+            # Try the move
+            if not make_move(game, move, opponent):
+                continue
+            # A completed line ends the game, otherwise recursively call minimax for the next depth level
+            # The move is undone even when the search is aborted below it
+            try:
+                if game.is_winning_move(*destination(move)):
+                    eval = -win_score
+                elif path is not None and game.position_hash(bi_player) in path:
+                    path.draws += 1
+                    eval = 0
+                else:
+                    eval = minimax(game, depth - 1, alpha, beta, True, bi_player, weights, ply + 1, limits, table,
+                                   path, threats, model)[0]
+            finally:
+                # Undo the move
+                undo_move(game, move, opponent)
 
             # Update the best move found so far if the current evaluation is better
             if eval < min_eval:
@@ -103,11 +496,101 @@ def minimax(game, depth, alpha, beta, maximizing_player, bi_player):
             # Update beta to the minimum value found so far
             beta = min(beta, eval)
             # Alpha-beta pruning: if beta is less than or equal to alpha, stop the search
-            if beta <= alpha:
+            # A win on the next move can not be improved on either
+            if beta <= alpha or eval == -win_score:
                 break
+        if path is not None:
+            path.discard(position)
+
+        # A player without legal moves passes, score the position as it stands
+        if best_move is None:
+            return evaluate_position(game, bi_player, weights, model, maximizing_player), None
+        if key is not None and (path is None or path.draws == draws):
+            store_result(table, key, depth, min_eval, alpha_start, beta_start, best_move, ply)
         return min_eval, best_move
 
 
+# Searches the root moves with iterative deepening and returns the best move and its score.
+# Each iteration searches the previous best move first and the search stops as soon as the result is
+# proven (a forced win or loss the losing side can not break with a barrier, see is_proven), so decided positions
+# cost only a shallow search.
+# Parameters:
+#     game (Game): The current game state.
+#     depth (int): The maximum depth of the search tree.
+#     player (Player): The player to move.
+#     candidates (list): Root moves in get_legal_moves format.
+#     weights (dict): Optional evaluation weights.
+#     limits (SearchLimits): Optional node and time budget. When it runs out the best move of the last
+#                            completed iteration is returned (or the best one found so far in the first).
+#     table (TranspositionTable): Optional transposition table shared with other searches.
+#     path (set): Optional position hashes (Game.position_hash) the game went through, the search scores a move back
+#                 to any of them, or to a position earlier on its own line, as a draw. A repetition is a draw as soon
+#                 as it occurs once: the side it suits can repeat it again until the draw rule ends the game.
+#                 Nodes scored with such a draw are not stored in the table (see SearchPath).
+#     threats (int): Node budget of the threat extension of every leaf, defaults to THREAT_NODES, 0 turns it off.
+#     model (ValueModel): Optional learned value model evaluating the positions instead of the heuristics weights.
+# Returns: tuple: The best move and its score.
+
+def search_root(game, depth, player, candidates, weights=None, limits=None, table=None, path=None, threats=None,
+                model=None):
+    candidates = list(candidates)
+    best_move = None
+    best_score = -inf
+
+    if limits is not None:
+        limits.start()
+
+    if path is not None:
+        path = SearchPath(path)
+        path.add(game.position_hash(player))
+        opponent = game.get_opponent(player)
+
+    for current_depth in range(1, depth + 1):
+        # Search the best move of the previous iteration first to get the most cutoffs
+        if best_move is not None:
+            candidates.remove(best_move)
+            candidates.insert(0, best_move)
+
+        alpha = -inf
+        iteration_move = None
+        iteration_score = -inf
+        try:
+            for move in candidates:
+                if not make_move(game, move, player):
+                    continue
+                try:
+                    if game.is_winning_move(*destination(move)):
+                        score = WIN_SCORE - 1
+                    elif path is not None and game.position_hash(opponent) in path:
+                        score = 0
+                    else:
+                        score, _ = minimax(game, current_depth - 1, alpha, inf, False, player, weights, 1, limits, table,
+                                           path, threats, model)
+                finally:
+                    undo_move(game, move, player)
+
+                # Update the best move if the current move has a higher score
+                if score > iteration_score:
+                    iteration_score = score
+                    iteration_move = move
+                alpha = max(alpha, score)
+                # Stop early once the move wins on the spot
+                if score == WIN_SCORE - 1:
+                    break
+        except SearchAborted:
+            # Keep the last completed iteration, the first one has nothing better than its partial result
+            if best_move is None:
+                best_move, best_score = iteration_move, iteration_score
+            break
+
+        best_move, best_score = iteration_move, iteration_score
+        if limits is not None:
+            limits.completed_depth = current_depth
+        if best_move is None or is_proven(best_score, game, player):
+            break
+
+    return best_move, best_score
+
 
 # Determines the best placement for a piece for the given player using a combination of immediate win checks
 # and Minimax evaluation.
@@ -115,15 +598,35 @@ def minimax(game, depth, alpha, beta, maximizing_player, bi_player):
 #     game (Game): The current game state.
 #     depth (int): The depth of the search tree for Minimax.
 #     player (Player): The player for whom we are calculating the best move.
+#     engine (str): Optional search backend, defaults to ENGINE. MCTS ignores the depth and uses its own budget.
+#     weights (dict): Optional evaluation weights for the minimax backend.
+#     limits (SearchLimits): Optional node and time budget (the node budget is the playout budget for MCTS).
+#     table (TranspositionTable): Optional transposition table, e.g. a SharedTranspositionTable that every worker
+#                                 process of a batch searches with.
+#     threats (int): Node budget of the threat extension of every leaf, defaults to THREAT_NODES. With the extension
+#                    the search sees the threats of the opponent itself, without it (0) a threat is blocked at once.
+#     model (ValueModel): Optional learned value model (bi.learned) the minimax backend evaluates with instead of the
+#                         heuristics weights.
 # Returns: tuple: The best move (row, col) for placing a piece.
 
-def bi_best_piece_place(game, depth, player):    
+def bi_best_piece_place(game, depth, player, engine=None, weights=None, limits=None, table=None, threats=None,
+                        model=None):
+    if (engine or ENGINE) == 'mcts':
+        if limits is not None:
+            return mcts_best_piece_place(game, player, limits.max_nodes, limits.time_limit, max_tree_nodes=limits.max_tree_nodes)
+        return mcts_best_piece_place(game, player)
+
+    if tracer.enabled:
+        started = time.perf_counter()
+
     # Get all possible moves for placing a piece and shuffle them to add randomness
     possible_moves = game.get_possible_pieces_places()
     random.shuffle(possible_moves)
 
     best_move = None  # Initialize best move
+    best_score = None  # Initialize best score
     blocking_move = None  # Initialize blocking move
+    opponent = game.get_opponent(player)
 
     # Iterate over all possible moves
     for move in possible_moves:
@@ -132,42 +635,38 @@ def bi_best_piece_place(game, depth, player):
         game.board.add_piece(col, row, player.color)
 
         # Check if this move results in a win for the player
-        if game.check_winner() == player.name:
-            game.board.array[row][col] = None  # Undo the move
+        if game.is_winning_move(col, row):
+            game.board.remove_piece(col, row)  # Undo the move
             return move  # Return the winning move
+        game.board.remove_piece(col, row)
 
-        # Check if this move results in a win for the opponent
-        opponent = game.player2
-        if game.check_winner() == opponent.name:
+        # Check if the opponent would win by placing a piece here
+        game.board.add_piece(col, row, opponent.color)
+        if game.is_winning_move(col, row):
             blocking_move = move  # Remember the move that blocks the opponent
 
-        # Undo the move
-        game.board.array[row][col] = None
+        # Undo the opponent's piece
+        game.board.remove_piece(col, row)
 
-    # If a blocking move was found, prioritize it
-    if blocking_move:
+    # If a blocking move was found, prioritize it, unless the threat extension lets the search choose among the blocks
+    if threats is None:
+        threats = THREAT_NODES
+    if blocking_move and not threats:
         best_move = blocking_move
     else:
-        best_score = -inf  # Initialize the best score to negative infinity
-
         # Evaluate all possible moves using Minimax
-        for move in possible_moves:
-            row, col = move
-            # Temporarily place the piece on the board
-            game.board.add_piece(col, row, player.color)
-
-            # Use Minimax to evaluate the move
-            score, _ = minimax(game, depth - 1, -float('inf'), float('inf'), False, player)
-            # Undo the move
-            game.board.array[row][col] = None
-
-            # Update the best move if the current move has a higher score
-            if score > best_score:
-                best_score = score
-                best_move = move
+        candidates = [('place_piece', col, row) for row, col in possible_moves]
+        move, best_score = search_root(game, depth, player, candidates, weights, limits, table, threats=threats,
+                                       model=model)
+        if move:
+            best_move = (move[2], move[1])
 
     # Return the best move if found, otherwise return the first possible move
-    return best_move if best_move else possible_moves[0]
+    best_move = best_move if best_move else possible_moves[0]
+    if tracer.enabled:
+        tracer.event(INFO, 'bi.best_piece_place', player=player.name, depth=depth, move=best_move, score=best_score,
+                     blocking=blocking_move is not None, ms=round((time.perf_counter() - started) * 1000, 3))
+    return best_move
 
 
 
@@ -176,34 +675,48 @@ def bi_best_piece_place(game, depth, player):
 #     game (Game): The current game state.
 #     depth (int): The depth of the search tree for Minimax.
 #     player (Player): The player for whom we are calculating the best move.
+#     engine (str): Optional search backend, defaults to ENGINE. MCTS ignores the depth and uses its own budget.
+#     weights (dict): Optional evaluation weights for the minimax backend.
+#     limits (SearchLimits): Optional node and time budget (the node budget is the playout budget for MCTS).
+#     endgame (bool): Answer movement positions of the standard board without any barrier, on the board or in hand,
+#                     from the solved table (bi.endgame).
+#     table (TranspositionTable): Optional transposition table, see bi_best_piece_place.
+#     threats (int): Node budget of the threat extension of every leaf, defaults to THREAT_NODES.
+#     model (ValueModel): Optional learned value model, see bi_best_piece_place.
 # Returns: tuple: The best move ((old_col, old_row), (new_col, new_row)) for moving a piece.
 
-def bi_best_piece_move(game, depth, player):
+def bi_best_piece_move(game, depth, player, engine=None, weights=None, limits=None, endgame=False, table=None,
+                       threats=None, model=None):
+    if endgame and game.variant == STANDARD:
+        position = from_game(game, player)
+        if covers(position):
+            move, score = endgame_move(position)
+            best_move = (cell_coords(move[0]), cell_coords(move[1])) if move else None
+            if tracer.enabled:
+                tracer.event(INFO, 'bi.best_piece_move', player=player.name, engine='endgame', move=best_move, score=score)
+            return best_move
+
+    if (engine or ENGINE) == 'mcts':
+        if limits is not None:
+            return mcts_best_piece_move(game, player, limits.max_nodes, limits.time_limit, max_tree_nodes=limits.max_tree_nodes)
+        return mcts_best_piece_move(game, player)
+
+    if tracer.enabled:
+        started = time.perf_counter()
+
     possible_moves = game.get_possible_pieces_moves(player)
     random.shuffle(possible_moves)
 
-    best_move = None
-    best_score = -float('inf')
-
-    move_scores = []  # To collect all move scores
-
-    for move in possible_moves:
-        (old_col, old_row), (new_col, new_row) = move
-        # Make the move
-        game.board.move_piece(old_col, old_row, new_col, new_row)
-        
-        # Call minimax for the opponent's perspective
-        score, _ = minimax(game, depth - 1, -float('inf'), float('inf'), False, player)
-        move_scores.append((move, score))  # Collecting move and its score
-        
-        # Undo the move
-        game.board.move_piece(new_col, new_row, old_col, old_row)
-
-        # Update the best move if the current move is better
-        if score > best_score:
-            best_score = score
-            best_move = move
+    candidates = [('move_piece', old_col, old_row, new_col, new_row)
+                  for (old_col, old_row), (new_col, new_row) in possible_moves]
+    # Pieces only shuffle around in the movement phase, moves back to a position of the game are scored as draws
+    move, best_score = search_root(game, depth, player, candidates, weights, limits, table, game.positions, threats,
+                                   model)
+    best_move = ((move[1], move[2]), (move[3], move[4])) if move else None
 
+    if tracer.enabled:
+        tracer.event(INFO, 'bi.best_piece_move', player=player.name, depth=depth, move=best_move, score=best_score,
+                     candidates=len(candidates), ms=round((time.perf_counter() - started) * 1000, 3))
     return best_move
 
 
@@ -212,10 +725,11 @@ def bi_best_piece_move(game, depth, player):
 # Determines the best placement for a barrier to block a winning move for the opponent.
 # Parameters:
 #     game (Game): The current game state.
+#     player (Player): The player placing the barrier, defaults to player2 (Morris BI).
 # Returns: tuple or None: The best move (row, col) for placing a barrier to block the opponent, or None if no blocking move is found.
 
-def bi_best_barrier_placement(game):
-    opponent = game.player1
+def bi_best_barrier_placement(game, player=None):
+    opponent = game.get_opponent(player if player is not None else game.player2)
 
     # Create a copy of the game to simulate barrier placements without affecting the actual game state
     game_copy = game.copy()
@@ -236,10 +750,11 @@ def bi_best_barrier_placement(game):
             break
 
         # Reset the barrier placement in the copied game state
-        game_copy.board.array[row][col] = None
-        game_copy.board.accessibility[row][col] = True
+        game_copy.board.remove_piece(col, row)
 
     if winning_move:
+        if tracer.enabled:
+            tracer.event(INFO, 'bi.best_barrier_placement', move=winning_move)
         return winning_move
 
     # If no blocking move is found, return None or any other default value
@@ -0,0 +1,402 @@
+import argparse
+import json
+import random
+import sys
+import time
+from itertools import combinations
+from bi.heuristics import evaluate ,WEIGHTS ,WIN_SCORE
+from bi.minimax import bi_best_piece_place ,bi_best_piece_move ,search_root ,make_move ,undo_move ,destination
+from bi.records import new_game ,replay
+from bi.position import Position ,from_game ,to_game ,cell_index ,cells_of ,has_line ,BLOCKED ,CELLS ,SIZE
+from bi.ttable import TranspositionTable
+from models.game import Game
+
+# Differential tester between the reference rules (models.Game, bi.heuristics, bi.minimax) and the fast
+# implementations built on bi.position, and between the engine and plain references written here (a bit mask
+# evaluation, a minimax without pruning or table). Every check returns a (reference, candidate) pair and a position
+# diverges when the two are different. Divergences are reported as a minimized list of reference actions
+# (or a position for exhaustive runs) that can be replayed with --replay.
+
+# Maximum number of plies in a sampled game
+MAX_PLIES = 60
+
+# Probability that a sampled player spends one of its barriers before its piece action
+BARRIER_RATE = 0.15
+
+# Search depth used by the chosen move checks
+CHOICE_DEPTH = 1
+
+# Search depth of the search check, deep enough for transpositions to reach the table
+SEARCH_DEPTH = 3
+
+# Cells off the border of the board, see Variant.center
+CENTER = sum(1 << cell_index(col, row) for row in range(1, SIZE - 1) for col in range(1, SIZE - 1))
+
+
+# Method to apply one recorded action the way GameInterface drives a turn, see Game.apply_action
+def apply_action(game, action):
+    return game.apply_action(action)
+
+
+# Method to pick the next random actions (an optional barrier and a piece action) for the current player
+def random_actions(game, rng):
+    player = game.current_player
+    actions = []
+    if player.has_barriers() and rng.random() < BARRIER_RATE:
+        barriers = game.get_possible_barrier_placements()
+        if barriers:
+            row, col = rng.choice(barriers)
+            actions.append(('place_barrier', col, row))
+            return actions
+    moves = game.get_legal_moves(player, include_barriers=False)
+    actions.append(rng.choice(moves) if moves else ('pass',))
+    return actions
+
+
+# Method to convert a reference legal move to the (start, end) cells used by bi.position
+def _to_cells(move):
+    if move[0] == 'place_piece':
+        return -1, cell_index(move[1], move[2])
+    return cell_index(move[1], move[2]), cell_index(move[3], move[4])
+
+
+# Check: piece move generation
+def check_moves(game):
+    reference = sorted(_to_cells(move) for move in game.get_legal_moves(game.current_player, include_barriers=False))
+    candidate = sorted(from_game(game).legal_moves())
+    return reference, candidate
+
+
+# Check: winner detection
+def check_winner(game):
+    winner = game.check_winner()
+    reference = None if winner is None else (0 if winner == game.player1.name else 1)
+    return reference, from_game(game).winner()
+
+
+# Check: a game rebuilt from its integer code (Game.to_code) holds the same position
+def check_code(game):
+    return from_game(game), from_game(Game.from_code(game.to_code()))
+
+
+# Method to check if a cell (col, row) is on the board and in a mask
+def _has(mask, col, row):
+    return 0 <= col < SIZE and 0 <= row < SIZE and mask >> cell_index(col, row) & 1
+
+
+# Method to score a position for `side` with the factors of bi.heuristics.evaluate, written again on the bit masks of
+# bi.position as an independent reference for the evaluation check. The factors keep their quirks: a run of
+# connected pieces stops at the first gap, potential wins are always player1's against player2's.
+def mask_evaluation(position, side, weights=None):
+    winner = position.winner()
+    if winner is not None:
+        return WIN_SCORE if winner == side else -WIN_SCORE
+    if weights is None:
+        weights = WEIGHTS
+    pieces = position.pieces
+    own = pieces[side]
+    # Cells without a piece or a barrier, the blocked corners included
+    empty = ((1 << CELLS) - 1) & ~(pieces[0] | pieces[1] | sum(1 << cell for cell, _ in position.barriers))
+
+    connected = 0
+    lines = 0
+    for cell in cells_of(own):
+        col, row = cell % SIZE, cell // SIZE
+        for i in range(1, SIZE):
+            if not _has(own, col + i, row):
+                break
+            connected += 1
+        connected += 1
+        for i in range(1, SIZE):
+            if not _has(own, col + i, row + i):
+                break
+            connected += 1
+            if not _has(own, col + i, row - i):
+                break
+            connected += 1
+        lines += sum(_has(own, col + d_col, row + d_row) for d_col, d_row in ((1, 0), (0, 1), (1, 1), (1, -1)))
+
+    potential = 0
+    for sign, mask in ((1, pieces[0]), (-1, pieces[1])):
+        for cell in cells_of(mask):
+            col, row = cell % SIZE, cell // SIZE
+            potential += sign * (_has(empty | mask, col + 1, row) + _has(empty, col, row + 1)
+                                 + _has(empty, col + 1, row + 1) + _has(empty, col + 1, row - 1))
+
+    return (weights['connected'] * connected +
+            weights['potential_wins'] * potential +
+            weights['empty_cells'] * bin(empty).count('1') +
+            weights['center_control'] * bin(own & CENTER).count('1') +
+            weights['block_opponent_wins'] * -potential +
+            weights['forming_lines'] * lines)
+
+
+# Check: evaluation of both players against the bit mask reference
+def check_evaluation(game):
+    position = from_game(game)
+    reference = (mask_evaluation(position, 0), mask_evaluation(position, 1))
+    return reference, (evaluate(game, game.player1), evaluate(game, game.player2))
+
+
+# Method to search a game with plain minimax: every piece action to the depth, no pruning, no table and no threat
+# extension. Wins and stuck players are scored the way bi.minimax scores them.
+def plain_minimax(game, depth, maximizing_player, bi_player, ply):
+    if depth == 0:
+        return evaluate(game, bi_player)
+    mover = bi_player if maximizing_player else game.get_opponent(bi_player)
+    win_score = (WIN_SCORE - (ply + 1)) * (1 if maximizing_player else -1)
+    scores = []
+    for move in game.get_legal_moves(mover, include_barriers=False):
+        make_move(game, move, mover)
+        try:
+            if game.is_winning_move(*destination(move)):
+                scores.append(win_score)
+            else:
+                scores.append(plain_minimax(game, depth - 1, not maximizing_player, bi_player, ply + 1))
+        finally:
+            undo_move(game, move, mover)
+    if not scores:
+        return evaluate(game, bi_player)
+    return max(scores) if maximizing_player else min(scores)
+
+
+# Check: the score of the engine search (alpha-beta, iterative deepening, transposition table) against plain minimax
+# The position is searched twice with one table, the root moves in reverse order the first time: the second search
+# reads the bounds the first one stored under other windows, the way consecutive searches of a game share their
+# table. The threat extension and the repetition draws are left out.
+def check_search(game):
+    player = game.current_player
+    candidates = game.get_legal_moves(player, include_barriers=False)
+    if game.check_winner() or not candidates:
+        return None, None
+    game = game.copy()
+    table = TranspositionTable(1 << 12)
+    scores = tuple(search_root(game, SEARCH_DEPTH, player, ordered, table=table, threats=0)[1]
+                   for ordered in (candidates[::-1], candidates))
+    reference = plain_minimax(game, SEARCH_DEPTH, True, player, 0)
+    return (reference, reference), scores
+
+
+# Method to pick the AI move for the current player of a game
+def _choose(game, seed):
+    random.seed(seed)
+    player = game.current_player
+    if player.has_pieces():
+        return ('place', bi_best_piece_place(game, CHOICE_DEPTH, player))
+    return ('move', bi_best_piece_move(game, CHOICE_DEPTH, player))
+
+
+# Check: when the compact engine sees a winning piece action, the AI must play a winning move
+def check_takes_win(game):
+    position = from_game(game)
+    if position.winner() is not None:
+        return False, False
+    side = position.side
+    reference = False
+    for start, end in position.legal_moves():
+        mask = position.pieces[side] & ~(1 << start if start >= 0 else 0)
+        if has_line(mask | 1 << end):
+            reference = True
+            break
+    if not reference:
+        return False, False
+
+    played = game.copy()
+    kind, move = _choose(played, 0)
+    if kind == 'place':
+        row, col = move
+        played.board.add_piece(col, row, played.current_player.color)
+    elif move:
+        (start_col, start_row), (end_col, end_row) = move
+        played.board.move_piece(start_col, start_row, end_col, end_row)
+    return True, played.check_winner() == played.current_player.name
+
+
+CHECKS = {
+    'moves': check_moves,
+    'winner': check_winner,
+    'code': check_code,
+    'evaluation': check_evaluation,
+    'search': check_search,
+    'takes_win': check_takes_win,
+}
+# Checks cheap enough for exhaustive runs over every position
+FAST_CHECKS = ('moves', 'winner', 'code', 'evaluation')
+
+
+# Method to run the checks on a game, returns the first failing (name, reference, candidate) or None
+def run_checks(game, checks):
+    for name in checks:
+        reference, candidate = CHECKS[name](game)
+        if reference != candidate:
+            return name, reference, candidate
+    return None
+
+
+# Method to test whether a list of actions still replays legally and still fails the given check
+def _still_fails(actions, first, check):
+    try:
+        game = replay(actions, first)
+    except ValueError:
+        return False
+    reference, candidate = CHECKS[check](game)
+    return reference != candidate
+
+
+# Method to shrink a failing action list by dropping actions while the divergence remains
+def minimize_actions(actions, first, check):
+    actions = list(actions)
+    changed = True
+    while changed:
+        changed = False
+        for index in range(len(actions)):
+            shorter = actions[:index] + actions[index + 1:]
+            if _still_fails(shorter, first, check):
+                actions = shorter
+                changed = True
+                break
+    return actions
+
+
+# Method to shrink a failing position by taking pieces off the board (back into the hand) while it still fails
+def minimize_position(position, check):
+    changed = True
+    while changed:
+        changed = False
+        for side in (0, 1):
+            for cell in cells_of(position.pieces[side]):
+                pieces = list(position.pieces)
+                pieces[side] &= ~(1 << cell)
+                hands = list(position.hands)
+                hands[side] += 1
+                smaller = Position(pieces, position.barriers, hands, position.walls, position.side)
+                reference, candidate = CHECKS[check](to_game(smaller))
+                if reference != candidate:
+                    position = smaller
+                    changed = True
+                    break
+            if changed:
+                break
+    return position
+
+
+# Method to build a divergence report, always including the compact position
+def _report(check, reference, candidate, game, actions=None, first=None):
+    return {
+        'check': check,
+        'reference': repr(reference),
+        'candidate': repr(candidate),
+        'first': first,
+        'actions': actions,
+        'position': list(from_game(game)),
+    }
+
+
+# Method to play random games and run the checks on every position reached
+# Returns (report or None, number of positions checked)
+def sample(games, seed=0, checks=tuple(CHECKS)):
+    rng = random.Random(seed)
+    checked = 0
+    for _ in range(games):
+        first = rng.randrange(2)
+        game = new_game(first)
+        actions = []
+        for _ in range(MAX_PLIES):
+            failure = run_checks(game, checks)
+            checked += 1
+            if failure:
+                check = failure[0]
+                actions = minimize_actions(actions, first, check)
+                game = replay(actions, first)
+                reference, candidate = CHECKS[check](game)
+                return _report(check, reference, candidate, game, [list(action) for action in actions], first), checked
+            if game.check_winner():
+                break
+            for action in random_actions(game, rng):
+                apply_action(game, action)
+                actions.append(action)
+    return None, checked
+
+
+# Method to enumerate every barrier-free position where neither side has more than 3 pieces
+# Positions where both sides have a line cannot be reached and are skipped
+def enumerate_positions():
+    free = [cell for cell in range(CELLS) if not BLOCKED >> cell & 1]
+    for count1 in range(4):
+        for cells1 in combinations(free, count1):
+            mask1 = sum(1 << cell for cell in cells1)
+            rest = [cell for cell in free if cell not in cells1]
+            for count2 in range(4):
+                for cells2 in combinations(rest, count2):
+                    mask2 = sum(1 << cell for cell in cells2)
+                    if has_line(mask1) and has_line(mask2):
+                        continue
+                    for side in (0, 1):
+                        yield Position((mask1, mask2), (), (3 - count1, 3 - count2), (2, 2), side)
+
+
+# Method to run the checks on every enumerated position
+def exhaustive(checks=FAST_CHECKS, limit=None):
+    checked = 0
+    for position in enumerate_positions():
+        game = to_game(position)
+        failure = run_checks(game, checks)
+        checked += 1
+        if failure:
+            check = failure[0]
+            smallest = minimize_position(position, check)
+            game = to_game(smallest)
+            reference, candidate = CHECKS[check](game)
+            return _report(check, reference, candidate, game), checked
+        if limit is not None and checked >= limit:
+            break
+    return None, checked
+
+
+# Method to re-run the check of a saved report, from its actions when there are some, otherwise from its position
+def replay_report(report):
+    if report.get('actions') is not None:
+        game = replay(report['actions'], report['first'])
+    else:
+        pieces, barriers, hands, walls, side = report['position']
+        game = to_game(Position(pieces, [tuple(barrier) for barrier in barriers], hands, walls, side))
+    reference, candidate = CHECKS[report['check']](game)
+    return game, reference, candidate
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Differential tester for the fast engines against the reference rules.")
+    parser.add_argument('--games', type=int, default=10000, help="number of random games to sample")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--checks', default=','.join(CHECKS), help="comma separated checks: " + ', '.join(CHECKS))
+    parser.add_argument('--exhaustive', action='store_true', help="check every barrier-free position instead of sampling")
+    parser.add_argument('--output', default=None, help="file to write the first divergence to")
+    parser.add_argument('--replay', default=None, help="report file to replay")
+    args = parser.parse_args()
+
+    if args.replay:
+        with open(args.replay) as report_file:
+            report = json.load(report_file)
+        game, reference, candidate = replay_report(report)
+        print(f"{report['check']}: reference {reference!r}, candidate {candidate!r}")
+        for row in range(4):
+            values = [game.board.array[row][col] for col in range(4)]
+            print(' '.join('.' if value is None else value[0] if isinstance(value, str) else '#' for value in values))
+        sys.exit(0 if reference == candidate else 1)
+
+    checks = [name for name in args.checks.split(',') if name]
+    started = time.perf_counter()
+    if args.exhaustive:
+        report, checked = exhaustive([name for name in checks if name in FAST_CHECKS])
+    else:
+        report, checked = sample(args.games, args.seed, checks)
+    elapsed = time.perf_counter() - started
+    print(f"checked {checked} positions in {elapsed:.1f}s ({checked / elapsed:.0f} positions/s)")
+
+    if report:
+        print(json.dumps(report))
+        if args.output:
+            with open(args.output, 'w') as report_file:
+                json.dump(report, report_file, indent=4)
+        sys.exit(1)
+    print("no divergence found")
@@ -0,0 +1,323 @@
+from models.barrier import Barrier
+from models.game import Game
+from models.player import Player
+from models.variant import STANDARD
+
+# Compact, immutable description of a game state used by the fast engines.
+# Cells are numbered row * size + col and sets of cells are stored as bitmasks. The Position engine only describes
+# the standard 4x4 board, the larger variants (models.variant) are played and searched on Game objects.
+SIZE = STANDARD.size
+LINE_LENGTH = STANDARD.line_length
+CELLS = SIZE * SIZE
+FULL = (1 << CELLS) - 1
+
+# Lifetime of a freshly placed barrier, matching models.barrier.Barrier
+BARRIER_LIFETIME = STANDARD.barrier_lifetime
+
+# Maximum number of plies played in a random playout before it is scored as a draw
+PLAYOUT_LIMIT = 80
+
+
+# Method to convert a (col, row) pair to a cell index
+def cell_index(col, row):
+    return row * SIZE + col
+
+
+# Method to convert a cell index back to a (col, row) pair
+def cell_coords(cell):
+    return cell % SIZE, cell // SIZE
+
+
+# Method to build the bitmasks of every winning line (rows, columns and both diagonals)
+def _build_lines():
+    lines = []
+    for line in STANDARD.lines:
+        mask = 0
+        for row, col in line:
+            mask |= 1 << cell_index(col, row)
+        lines.append(mask)
+    return lines
+
+
+# Method to build the bitmask of the neighbours (one square in any direction) of every cell
+def _build_neighbors():
+    neighbors = []
+    for cell in range(CELLS):
+        col, row = cell_coords(cell)
+        mask = 0
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                if (d_row or d_col) and 0 <= row + d_row < SIZE and 0 <= col + d_col < SIZE:
+                    mask |= 1 << cell_index(col + d_col, row + d_row)
+        neighbors.append(mask)
+    return neighbors
+
+
+LINES = _build_lines()
+# Lines passing through each cell, used to detect a win from the last move only
+LINES_THROUGH = [[line for line in LINES if line >> cell & 1] for cell in range(CELLS)]
+NEIGHBORS = _build_neighbors()
+# Cells that are never accessible (the two corners of Board.accessibility)
+BLOCKED = sum(1 << cell_index(col, row) for col, row in STANDARD.blocked)
+# Cell indexes of every bit of a mask, indexed by the mask of a single cell
+BIT_INDEX = {1 << cell: cell for cell in range(CELLS)}
+
+
+# Method to list the cell indexes set in a mask
+def cells_of(mask):
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(BIT_INDEX[low])
+        mask ^= low
+    return cells
+
+
+# Method to check if the piece that just arrived on `cell` completes a line
+def is_win(mask, cell):
+    for line in LINES_THROUGH[cell]:
+        if mask & line == line:
+            return True
+    return False
+
+
+# Method to check if a set of pieces contains a full line anywhere on the board
+def has_line(mask):
+    for line in LINES:
+        if mask & line == line:
+            return True
+    return False
+
+
+class Position(tuple):
+    # A position is the tuple (pieces, barriers, hands, walls, side) where
+    #   pieces   - (player1 mask, player2 mask)
+    #   barriers - sorted tuple of (cell, turns_left) for the barriers on the board
+    #   hands    - (player1 pieces in hand, player2 pieces in hand)
+    #   walls    - (player1 barriers in hand, player2 barriers in hand)
+    #   side     - 0 when player1 is to move, 1 when player2 is to move
+    # Being a tuple it is hashable and can be used directly as a dictionary key.
+    __slots__ = ()
+
+    def __new__(cls, pieces, barriers=(), hands=(3, 3), walls=(2, 2), side=0):
+        return tuple.__new__(cls, (tuple(pieces), tuple(sorted(barriers)), tuple(hands), tuple(walls), side))
+
+    # Method used by pickle so positions can be sent to worker processes
+    def __getnewargs__(self):
+        return tuple(self)
+
+    @property
+    def pieces(self):
+        return self[0]
+
+    @property
+    def barriers(self):
+        return self[1]
+
+    @property
+    def hands(self):
+        return self[2]
+
+    @property
+    def walls(self):
+        return self[3]
+
+    @property
+    def side(self):
+        return self[4]
+
+    # Method to get the mask of the cells a piece can never enter right now (blocked corners and barriers)
+    def blocked_mask(self):
+        mask = BLOCKED
+        for cell, _ in self[1]:
+            mask |= 1 << cell
+        return mask
+
+    # Method to get the mask of the empty, accessible cells
+    def empty_mask(self):
+        return FULL & ~(self[0][0] | self[0][1] | self.blocked_mask())
+
+    # Method to get the legal piece actions for the side to move
+    # A move is a (start, end) pair of cell indexes where start is -1 for placing a piece from the hand
+    def legal_moves(self):
+        side = self[4]
+        empty = self.empty_mask()
+        if self[2][side] > 0:
+            return [(-1, cell) for cell in cells_of(empty)]
+        moves = []
+        for start in cells_of(self[0][side]):
+            for end in cells_of(NEIGHBORS[start] & empty):
+                moves.append((start, end))
+        return moves
+
+    # Method to apply a piece action and return the next position
+    # Barriers age once per action exactly like GameInterface.update_game
+    # A move of None passes the turn, which is what happens when the side to move is stuck
+    def play(self, move):
+        side = self[4]
+        pieces = list(self[0])
+        hands = self[2]
+        if move is None:
+            pass
+        elif move[0] < 0:
+            _, end = move
+            pieces[side] |= 1 << end
+            hands = (hands[0] - 1, hands[1]) if side == 0 else (hands[0], hands[1] - 1)
+        else:
+            start, end = move
+            pieces[side] = pieces[side] & ~(1 << start) | (1 << end)
+        barriers = tuple((cell, life - 1) for cell, life in self[1] if life > 0)
+        return Position(pieces, barriers, hands, self[3], 1 - side)
+
+    # Method to get the winning side (0 or 1), or None if there is no line on the board
+    def winner(self):
+        if has_line(self[0][0]):
+            return 0
+        if has_line(self[0][1]):
+            return 1
+        return None
+
+
+# Method to get the side (0 for player1, 1 for player2) of a player of a game
+# Players are compared by name and color because Game.copy deep copies them
+def side_of(game, player):
+    return 1 if player.name == game.player2.name and player.color == game.player2.color else 0
+
+
+# Method to build a Position from a live Game
+# `side_player` overrides the side to move, which the bi_best_* entry points need because
+# they are asked to move for a given player regardless of game.current_player
+def from_game(game, side_player=None):
+    if game.variant is not STANDARD and game.variant != STANDARD:
+        raise ValueError(f"compact positions describe the standard board, not the {game.variant.name} variant")
+    pieces = [0, 0]
+    barriers = []
+    for row in range(SIZE):
+        for col in range(SIZE):
+            value = game.board.array[row][col]
+            if value is None:
+                continue
+            if isinstance(value, Barrier):
+                barriers.append((cell_index(col, row), value.turns_left))
+            elif value == game.player1.color:
+                pieces[0] |= 1 << cell_index(col, row)
+            elif value == game.player2.color:
+                pieces[1] |= 1 << cell_index(col, row)
+    mover = side_player if side_player is not None else game.current_player
+    side = side_of(game, mover) if mover is not None else 0
+    hands = (game.player1.pieces, game.player2.pieces)
+    walls = (game.player1.barriers, game.player2.barriers)
+    return Position(pieces, barriers, hands, walls, side)
+
+
+# Fields of the position codes of the standard board (Game.to_code): the cells come first, one field of
+# CELL_BITS bits per cell in cell index order, then the hands and the side to move
+CELL_BITS = STANDARD.cell_bits
+CELL_MASK = (1 << CELL_BITS) - 1
+BOARD_BITS = CELLS * CELL_BITS
+
+
+# Cell permutations of the board symmetries that keep the two blocked corners in place:
+# identity, the main diagonal mirror, the half turn and the anti-diagonal mirror. Each is its own inverse.
+SYMMETRIES = [
+    [cell_index(col, row) for row in range(SIZE) for col in range(SIZE)],
+    [cell_index(row, col) for row in range(SIZE) for col in range(SIZE)],
+    [cell_index(SIZE - 1 - col, SIZE - 1 - row) for row in range(SIZE) for col in range(SIZE)],
+    [cell_index(SIZE - 1 - row, SIZE - 1 - col) for row in range(SIZE) for col in range(SIZE)],
+]
+
+
+# Method to map a (start, end) move through a symmetry
+def transform_move(move, symmetry):
+    start, end = move
+    return (symmetry[start] if start >= 0 else start), symmetry[end]
+
+
+# Method to map a position code (Game.to_code) through a symmetry, only the cells move
+def transform_code(code, symmetry):
+    result = code >> BOARD_BITS << BOARD_BITS
+    for cell in range(CELLS):
+        value = code >> cell * CELL_BITS & CELL_MASK
+        if value:
+            result |= value << symmetry[cell] * CELL_BITS
+    return result
+
+
+# Method to get the canonical code of a position code (the smallest code of its symmetric variants)
+# Returns the code and the index of the symmetry that produces it
+def canonical(code):
+    best_code = code
+    best_index = 0
+    for index in range(1, len(SYMMETRIES)):
+        transformed = transform_code(code, SYMMETRIES[index])
+        if transformed < best_code:
+            best_code = transformed
+            best_index = index
+    return best_code, best_index
+
+
+# Method to build a headless Game from a Position, with fixed player names and colors
+def to_game(position, names=("player1", "player2"), colors=('red', 'blue')):
+    players = []
+    for side in (0, 1):
+        player = Player(name=names[side])
+        player.color = colors[side]
+        player.pieces = position[2][side]
+        player.barriers = position[3][side]
+        players.append(player)
+    game = Game(players[0], players[1])
+    for side in (0, 1):
+        for cell in cells_of(position[0][side]):
+            col, row = cell_coords(cell)
+            game.board.array[row][col] = colors[side]
+    for cell, turns_left in position[1]:
+        col, row = cell_coords(cell)
+        barrier = Barrier(col, row)
+        barrier.turns_left = turns_left
+        game.board.array[row][col] = barrier
+        game.board.accessibility[row][col] = False
+    game.board.rehash()
+    game.current_player = players[position[4]]
+    return game
+
+
+# Method to play random moves from a position until a side wins or the playout limit is reached
+# Returns the winning side or None for a draw. Works on plain integers to stay fast.
+def random_playout(position, rng, limit=PLAYOUT_LIMIT):
+    pieces = list(position[0])
+    hands = list(position[2])
+    barriers = list(position[1])
+    side = position[4]
+    if has_line(pieces[0]):
+        return 0
+    if has_line(pieces[1]):
+        return 1
+    for _ in range(limit):
+        blocked = BLOCKED
+        for cell, _ in barriers:
+            blocked |= 1 << cell
+        empty = FULL & ~(pieces[0] | pieces[1] | blocked)
+        if hands[side] > 0:
+            targets = cells_of(empty)
+            if targets:
+                end = targets[rng.randrange(len(targets))]
+                pieces[side] |= 1 << end
+                hands[side] -= 1
+            else:
+                end = -1
+        else:
+            moves = []
+            for start in cells_of(pieces[side]):
+                for target in cells_of(NEIGHBORS[start] & empty):
+                    moves.append((start, target))
+            if moves:
+                start, end = moves[rng.randrange(len(moves))]
+                pieces[side] = pieces[side] & ~(1 << start) | (1 << end)
+            else:
+                end = -1
+        if end >= 0 and is_win(pieces[side], end):
+            return side
+        if barriers:
+            barriers = [(cell, life - 1) for cell, life in barriers if life > 0]
+        side = 1 - side
+    return None
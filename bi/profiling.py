@@ -0,0 +1,269 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from models.trace import tracer ,INFO
+
+# Profiler for AI decisions: wraps a block of code (one AI turn, a self-play batch) and breaks its time down per
+# call stack. Stacks are written in the collapsed format of flamegraph tools, one "outer;inner;leaf microseconds"
+# line per stack, e.g. `flamegraph.pl morris.collapsed > morris.svg` or speedscope.
+#   sample        - a background thread samples the stack of the profiled thread every `interval` seconds,
+#                   cheap enough to leave on while playing but only sees Python functions
+#   deterministic - every Python and C call is timed through sys.setprofile, exact but several times slower
+MODES = ('sample', 'deterministic')
+
+# Default sampling interval in seconds
+DEFAULT_INTERVAL = 0.001
+
+# Default file the collapsed stacks are written to
+DEFAULT_OUTPUT = 'morris.collapsed'
+
+
+class _NoProfile:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_PROFILE = _NoProfile()
+
+
+# Names of the frames in the stacks by code object, every function is named once
+_FRAME_NAMES = {}
+
+
+# Method to get the name of a Python frame in the stacks, e.g. "bi.heuristics:evaluate"
+def _frame_name(frame):
+    code = frame.f_code
+    name = _FRAME_NAMES.get(code)
+    if name is None:
+        # co_qualname (Class.method) only exists on Python 3.11 and later, older ones only have the bare name
+        name = _FRAME_NAMES[code] = (f"{frame.f_globals.get('__name__', '?')}:"
+                                     f"{getattr(code, 'co_qualname', code.co_name)}")
+    return name
+
+
+# Method to get the name of a C function in the stacks, e.g. "builtins:len"
+def _c_name(function):
+    return f"{getattr(function, '__module__', None) or 'builtins'}:{getattr(function, '__qualname__', repr(function))}"
+
+
+# Method to get the names of the frames from the outermost one down to `frame`
+def _stack_names(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+class Profiler:
+    # Initialize the profiler, disabled unless a mode is given
+    #   mode     - 'sample', 'deterministic' or None to disable it
+    #   interval - sampling interval in seconds
+    #   output   - collapsed stack file rewritten after every profiled block, None to only keep the stacks in memory
+    def __init__(self, mode=None, interval=DEFAULT_INTERVAL, output=None):
+        self.mode = None
+        self.interval = interval
+        self.output = output
+        self.enabled = False
+        # True while a block is profiled, blocks nested in it are part of its stacks
+        self.active = False
+        # Microseconds spent in every stack (a tuple of frame names, outermost first) over all profiled blocks
+        self.stacks = {}
+        self.configure(mode, interval, output)
+
+    # Method to change the mode, sampling interval or output file of the profiler
+    def configure(self, mode=None, interval=None, output=None):
+        if mode is not None:
+            if mode not in MODES and mode != 'off':
+                raise ValueError(f"unknown profiling mode '{mode}', choose one of: {', '.join(MODES)}")
+            self.mode = None if mode == 'off' else mode
+        if interval is not None:
+            self.interval = interval
+        if output is not None:
+            self.output = output
+        self.enabled = self.mode is not None
+
+    # Method to profile a block of code, the stacks of the block are rooted at `label`
+    # Returns a context manager that does nothing while the profiler is disabled or already profiling
+    def profile(self, label):
+        if not self.enabled or self.active:
+            return _NO_PROFILE
+        if self.mode == 'sample':
+            return _Sampling(self, label)
+        return _Deterministic(self, label)
+
+    # Method to add time to a stack
+    def add(self, stack, microseconds):
+        self.stacks[stack] = self.stacks.get(stack, 0) + microseconds
+
+    # Method to forget the stacks collected so far
+    def reset(self):
+        self.stacks.clear()
+
+    # Method to get the self and total time of every function in microseconds
+    # Returns: list: (name, self time, total time) tuples, the most expensive functions (by self time) first
+    def functions(self):
+        own = {}
+        total = {}
+        for stack, microseconds in self.stacks.items():
+            own[stack[-1]] = own.get(stack[-1], 0) + microseconds
+            # A recursive function counts once per stack for the total
+            for name in set(stack):
+                total[name] = total.get(name, 0) + microseconds
+        return sorted(((name, own.get(name, 0), total[name]) for name in total), key=lambda row: -row[1])
+
+    # Method to format the most expensive functions as a table
+    def format_functions(self, top=20):
+        rows = self.functions()
+        overall = sum(self.stacks.values()) or 1
+        lines = [f"{'self ms':>10} {'self %':>7} {'total ms':>10}  function"]
+        for name, own, total in rows[:top]:
+            lines.append(f"{own / 1000:10.1f} {own * 100 / overall:6.1f}% {total / 1000:10.1f}  {name}")
+        return '\n'.join(lines)
+
+    # Method to write the collected stacks in collapsed format, to the output file by default
+    def write(self, path=None):
+        path = path or self.output
+        if path is None:
+            return
+        with open(path, 'w') as collapsed:
+            for stack, microseconds in sorted(self.stacks.items()):
+                if microseconds >= 1:
+                    collapsed.write(f"{';'.join(stack)} {int(microseconds)}\n")
+
+    # Method called when a profiled block ends
+    def finish(self, label, seconds):
+        self.active = False
+        if self.output is not None:
+            self.write()
+        if tracer.enabled:
+            tracer.event(INFO, 'profile.block', label=label, mode=self.mode, ms=round(seconds * 1000, 3))
+
+
+class _Sampling:
+    # Initialize the sampling of one block
+    def __init__(self, profiler, label):
+        self.profiler = profiler
+        self.label = label
+        self.thread = None
+        self.running = False
+
+    def __enter__(self):
+        self.profiler.active = True
+        # Frames of the block's caller and above are cut from the samples
+        self.base = len(_stack_names(sys._getframe(1)))
+        self.ident = threading.get_ident()
+        # The sampler needs the GIL, ask the interpreter to hand it over at least as often as we sample
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.switch_interval, self.profiler.interval))
+        self.running = True
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.sample, name='morris-profiler', daemon=True)
+        self.thread.start()
+        return self.profiler
+
+    # Method run by the sampling thread: every sample is weighted by the time since the previous one
+    def sample(self):
+        last = time.perf_counter()
+        root = (self.label,)
+        while self.running:
+            time.sleep(self.profiler.interval)
+            if not self.running:
+                break
+            frame = sys._current_frames().get(self.ident)
+            now = time.perf_counter()
+            if frame is not None:
+                self.profiler.add(root + tuple(_stack_names(frame)[self.base:]), (now - last) * 1e6)
+            last = now
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.running = False
+        self.thread.join()
+        sys.setswitchinterval(self.switch_interval)
+        self.profiler.finish(self.label, time.perf_counter() - self.started)
+        return False
+
+
+class _Deterministic:
+    # Initialize the deterministic profiling of one block
+    def __init__(self, profiler, label):
+        self.profiler = profiler
+        self.label = label
+        # Open calls as [stack, start time, time spent in callees]
+        self.calls = []
+        self.measured = 0.0
+
+    def __enter__(self):
+        self.profiler.active = True
+        self.started = time.perf_counter()
+        sys.setprofile(self.trace)
+        return self.profiler
+
+    # Method called by the interpreter on every call and return of the profiled thread
+    def trace(self, frame, event, argument):
+        now = time.perf_counter()
+        if event == 'call' or event == 'c_call':
+            parent = self.calls[-1][0] if self.calls else (self.label,)
+            name = _frame_name(frame) if event == 'call' else _c_name(argument)
+            self.calls.append([parent + (name,), now, 0.0])
+        elif self.calls:
+            # return, c_return or c_exception: the calls made before the block started are not on the stack
+            stack, start, callees = self.calls.pop()
+            elapsed = now - start
+            self.profiler.add(stack, (elapsed - callees) * 1e6)
+            if self.calls:
+                self.calls[-1][2] += elapsed
+            else:
+                self.measured += elapsed
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        sys.setprofile(None)
+        seconds = time.perf_counter() - self.started
+        # Time spent in the block itself rather than in a call (the call to __exit__ is still open)
+        self.calls.clear()
+        self.profiler.add((self.label,), max(0.0, seconds - self.measured) * 1e6)
+        self.profiler.finish(self.label, seconds)
+        return False
+
+
+# Method to build the shared profiler from the environment
+# MORRIS_PROFILE sets the mode (sample, deterministic, off), MORRIS_PROFILE_FILE the collapsed stack file
+# and MORRIS_PROFILE_INTERVAL the sampling interval in milliseconds
+def _profiler_from_env():
+    mode = os.environ.get('MORRIS_PROFILE', 'off').lower()
+    interval = float(os.environ.get('MORRIS_PROFILE_INTERVAL', DEFAULT_INTERVAL * 1000)) / 1000
+    return Profiler(mode if mode in MODES else None, interval, os.environ.get('MORRIS_PROFILE_FILE', DEFAULT_OUTPUT))
+
+
+# Shared profiler used by the game window and the batch tools
+profiler = _profiler_from_env()
+
+
+if __name__ == "__main__":
+    # The self-play engine is imported here so that importing the profiler stays cheap
+    from bi.selfplay import play_game ,make_agent
+
+    parser = argparse.ArgumentParser(description="Profile a batch of self-play games and write collapsed stacks.")
+    parser.add_argument('--mode', choices=MODES, default='sample')
+    parser.add_argument('--games', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL * 1000, help="sampling interval in ms")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="collapsed stack file")
+    parser.add_argument('--top', type=int, default=20, help="number of functions in the summary")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    profiler.configure(args.mode, args.interval / 1000, args.output)
+    agent = make_agent(depth=args.depth)
+    with profiler.profile('selfplay'):
+        for game in range(args.games):
+            play_game(agent, agent, game % 2 == 0, seed=args.seed + game)
+
+    print(profiler.format_functions(args.top))
+    print(f"collapsed stacks written to {args.output}", file=sys.stderr)
@@ -0,0 +1,34 @@
+import json
+from bi.position import Position ,to_game
+
+# Game archives: one JSON record per line as written by Game.to_record
+#   {'players': [name1, name2], 'first': 0 or 1, 'actions': [...], 'winner': name or None,
+#    'draw': None, 'repetition' or 'move limit', 'final': Game.to_code of the last position}
+
+
+# Method to create the reference game every replay starts from
+def new_game(first=0):
+    return to_game(Position((0, 0), side=first))
+
+
+# Method to rebuild a reference game from a list of actions, raises ValueError on an illegal action
+def replay(actions, first=0):
+    game = new_game(first)
+    for action in actions:
+        if not game.apply_action(tuple(action)):
+            raise ValueError(f"illegal action {action}")
+    return game
+
+
+# Method to append one game record to an archive file
+def save_record(record, path):
+    with open(path, 'a') as archive:
+        archive.write(json.dumps(record) + '\n')
+
+
+# Method to read the game records of an archive file one by one, blank lines are skipped
+def load_records(path):
+    with open(path) as archive:
+        for line in archive:
+            if line.strip():
+                yield json.loads(line)
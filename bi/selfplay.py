@@ -0,0 +1,108 @@
+import random
+from models.player import Player
+from models.game import Game
+from models.trace import tracer ,INFO
+from bi.minimax import bi_best_piece_place ,bi_best_piece_move ,bi_best_barrier_placement
+from bi.records import save_record
+from bi.workers import worker
+
+# Maximum number of turns in a headless game before it is scored as a draw, a safety net behind the draw rules of Game
+MAX_TURNS = 120
+
+# Default agent settings, an agent is a plain dictionary so it can be sent to worker processes
+#   endgame - play movement positions without any barrier (on the board or in hand) from the solved table (bi.endgame)
+#   threats - node budget of the threat extension of the search, None for bi.minimax.THREAT_NODES, 0 for none
+#   model   - learned value model (bi.learned) evaluating instead of the heuristics weights, None for the heuristics
+#   table   - index of the transposition table the agent searches with among the tables of the worker process
+#             (bi.workers), shared by every game the worker plays or by all workers of the pool, None for no table
+DEFAULT_AGENT = {'depth': 1, 'engine': 'minimax', 'weights': None, 'barriers': True, 'endgame': False, 'threats': None,
+                 'model': None, 'table': None}
+
+
+# Method to fill in the missing settings of an agent
+def make_agent(**settings):
+    agent = dict(DEFAULT_AGENT)
+    agent.update(settings)
+    return agent
+
+
+# Method to get the transposition table an agent searches with in this process, None without one
+def agent_table(agent):
+    index = agent['table']
+    if index is None or index >= len(worker['tables']):
+        return None
+    return worker['tables'][index]
+
+
+# Method to play one turn for the current player the same way GameInterface does for Morris BI:
+# an optional blocking barrier, then a piece placement or a piece move, then the barriers age
+def play_turn(game, agent):
+    player = game.current_player
+    table = agent_table(agent)
+
+    if agent['barriers'] and player.has_barriers():
+        barrier_move = bi_best_barrier_placement(game, player)
+        if barrier_move:
+            row, col = barrier_move
+            game.place_barrier(col, row)
+
+    if player.has_pieces():
+        move = bi_best_piece_place(game, agent['depth'], player, agent['engine'], agent['weights'], table=table,
+                                   threats=agent['threats'], model=agent['model'])
+        row, col = move
+        game.place_piece(col, row)
+    else:
+        move = bi_best_piece_move(game, agent['depth'], player, agent['engine'], agent['weights'],
+                                  endgame=agent['endgame'], table=table, threats=agent['threats'],
+                                  model=agent['model'])
+        if move:
+            (start_col, start_row), (end_col, end_row) = move
+            game.move_piece(start_col, start_row, end_col, end_row)
+        else:
+            # A player without any legal move passes the turn
+            game.pass_turn()
+
+    game.end_turn()
+    return move
+
+
+# Method to play a full headless game between two agents, `archive` is an optional file the game record is appended to
+# and `observer` an optional function called with the game after every turn
+# Returns 1 if agent1 wins, -1 if agent2 wins and 0 for a draw
+def play_game(agent1, agent2, agent1_first=True, seed=None, max_turns=MAX_TURNS, archive=None, observer=None):
+    if seed is not None:
+        random.seed(seed)
+
+    # Fixed names and colors keep headless games independent from the random Player colors
+    player1 = Player(name="player1")
+    player1.color = 'red'
+    player2 = Player(name="player2")
+    player2.color = 'blue'
+    game = Game(player1, player2)
+    game.current_player = player1 if agent1_first else player2
+    agents = {player1.name: agent1, player2.name: agent2}
+
+    result = 0
+    for turn in range(max_turns):
+        play_turn(game, agents[game.current_player.name])
+        if observer is not None:
+            observer(game)
+        winner = game.check_winner()
+        if winner:
+            result = 1 if winner == player1.name else -1
+            break
+        # A draw rule (repetition or move limit) ends games that would otherwise run to max_turns
+        if game.draw:
+            break
+
+    if archive is not None:
+        save_record(game.to_record(), archive)
+    if tracer.enabled:
+        tracer.event(INFO, 'selfplay.game', result=result, turns=turn + 1, agent1_first=agent1_first, draw=game.draw)
+    return result
+
+
+# Method to play one game described by a tuple, used as the worker function of process pools
+def play_game_job(job):
+    agent1, agent2, agent1_first, seed = job
+    return play_game(agent1, agent2, agent1_first, seed)
@@ -0,0 +1,123 @@
+import os
+import time
+import zlib
+from collections import OrderedDict
+
+# Compressed tablebase: the results of a solved state space stored in memory with a small footprint.
+# Every state has an index and one entry byte, the result (win, loss or draw for the side to move, WDL) in the two
+# low bits and, when the table keeps them, the distance to the end of the game in plies (DTM) in the six high ones.
+# Entries are cut in blocks of `block_entries` that are compressed on their own with zlib, an index of block offsets
+# finds the block of a state and only the blocks probed last are kept decompressed (a small LRU cache).
+# The table is a marshal-able dict, so it can be cached on disk with bi.cache like any other table.
+
+# Results from the point of view of the side to move
+WIN = 'win'
+LOSS = 'loss'
+DRAW = 'draw'
+
+# Entry codes of the results, a draw is 0 so runs of draws and unused indexes compress to almost nothing
+RESULT_CODES = {DRAW: 0, WIN: 1, LOSS: 2}
+RESULTS = (DRAW, WIN, LOSS)
+
+# Longest distance an entry byte can hold
+MAX_DISTANCE = 63
+
+# Entries per compressed block
+BLOCK_ENTRIES = 4096
+
+# Decompressed blocks kept per table, MORRIS_TABLEBASE_BLOCKS overrides it
+CACHE_BLOCKS = int(os.environ.get('MORRIS_TABLEBASE_BLOCKS', 8))
+
+
+# Method to encode one entry byte
+def encode_entry(result, distance=None, dtm=True):
+    code = RESULT_CODES[result]
+    if dtm and result != DRAW:
+        if distance > MAX_DISTANCE:
+            raise ValueError(f"distance {distance} does not fit an entry, at most {MAX_DISTANCE}")
+        code |= distance << 2
+    return code
+
+
+# Method to compress the entry bytes of a table
+# Parameters:
+#     entries (bytes): One entry byte per state index (encode_entry).
+#     dtm (bool): Whether the entries hold distances.
+#     block_entries (int): Entries per compressed block.
+# Returns: dict: The table, see Tablebase.
+def compress(entries, dtm=True, block_entries=BLOCK_ENTRIES):
+    offsets = [0]
+    blocks = []
+    for start in range(0, len(entries), block_entries):
+        block = zlib.compress(bytes(entries[start:start + block_entries]), 9)
+        blocks.append(block)
+        offsets.append(offsets[-1] + len(block))
+    return {
+        'entries': len(entries),
+        'block_entries': block_entries,
+        'dtm': dtm,
+        'offsets': offsets,
+        'data': b''.join(blocks),
+    }
+
+
+class Tablebase:
+    # Initialize a table from the dict made by compress, keeping at most `cache_blocks` blocks decompressed
+    def __init__(self, table, cache_blocks=None):
+        self.entries = table['entries']
+        self.block_entries = table['block_entries']
+        self.dtm = table['dtm']
+        self.offsets = table['offsets']
+        self.data = table['data']
+        self.cache_blocks = max(1, CACHE_BLOCKS if cache_blocks is None else cache_blocks)
+        self.blocks = OrderedDict()
+        self.probes = 0
+        self.hits = 0
+        self.decompressions = 0
+        self.seconds = 0.0
+
+    # Method to get the decompressed block `number`, from the cache when it is there
+    def block(self, number):
+        block = self.blocks.get(number)
+        if block is not None:
+            self.hits += 1
+            self.blocks.move_to_end(number)
+            return block
+        block = zlib.decompress(self.data[self.offsets[number]:self.offsets[number + 1]])
+        self.decompressions += 1
+        self.blocks[number] = block
+        if len(self.blocks) > self.cache_blocks:
+            self.blocks.popitem(last=False)
+        return block
+
+    # Method to look up the entry of a state
+    # Returns: tuple: (WIN, LOSS or DRAW, distance in plies), the distance is None for draws and without DTM.
+    def probe(self, index):
+        started = time.perf_counter()
+        self.probes += 1
+        number, offset = divmod(index, self.block_entries)
+        code = self.block(number)[offset]
+        result = RESULTS[code & 3]
+        distance = code >> 2 if self.dtm and result != DRAW else None
+        self.seconds += time.perf_counter() - started
+        return result, distance
+
+    # Memory of the table in bytes: the compressed blocks, their index and the decompressed blocks in the cache
+    @property
+    def nbytes(self):
+        return len(self.data) + 8 * len(self.offsets) + sum(len(block) for block in self.blocks.values())
+
+    # Method to get the probing statistics: probes, cache hits, block decompressions, the mean probe latency in
+    # microseconds and the memory of the table
+    def stats(self):
+        return {
+            'probes': self.probes,
+            'hits': self.hits,
+            'decompressions': self.decompressions,
+            'hit_rate': self.hits / self.probes if self.probes else 0.0,
+            'latency_us': self.seconds * 1e6 / self.probes if self.probes else 0.0,
+            'entries': self.entries,
+            'blocks': len(self.offsets) - 1,
+            'compressed_bytes': len(self.data),
+            'nbytes': self.nbytes,
+        }
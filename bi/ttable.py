@@ -0,0 +1,190 @@
+from array import array
+from bi.memory import entries_for ,track
+
+# Transposition table for minimax: results of positions that were already searched, keyed by bi.minimax.table_key.
+# An entry is (depth, flag, score, move) where flag tells whether the score is exact or only a bound.
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# The table is a fixed number of slots allocated up front in flat arrays, 8 bytes each for the key, the packed
+# depth/flag/move and the score. A position goes to the slot its hashed key selects; a different position in the
+# same slot is replaced, the same position only by a search at least as deep.
+ENTRY_BYTES = 24
+
+# Multiplier of the Fibonacci hash that spreads the keys over the slots
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+HASH_MASK = (1 << 64) - 1
+
+
+# Bits of one coordinate in a packed move: moves of every board variant (models.variant) up to 16 x 16 cells pack the
+# same way, so a table needs no board size
+COORD_BITS = 4
+COORD_MASK = (1 << COORD_BITS) - 1
+
+
+# Method to pack a move in get_legal_moves format into a small int, 0 is no move
+# From the lowest bits up: 1, 1 for a piece move (0 for a placement), then the coordinates of the move in order
+def pack_move(move):
+    if move is None:
+        return 0
+    coords = 0
+    for value in reversed(move[1:]):
+        coords = coords << COORD_BITS | value
+    return coords << 2 | (move[0] == 'move_piece') << 1 | 1
+
+
+# Method to unpack a move packed by pack_move
+def unpack_move(code):
+    if code == 0:
+        return None
+    coords = code >> 2
+    if code & 2:
+        return ('move_piece',) + tuple(coords >> COORD_BITS * index & COORD_MASK for index in range(4))
+    return ('place_piece', coords & COORD_MASK, coords >> COORD_BITS & COORD_MASK)
+
+
+class TranspositionTable:
+    # Initialize an empty table of `max_entries` slots (rounded down to a power of two),
+    # by default as many as fit the table share of the AI memory budget
+    def __init__(self, max_entries=None):
+        if max_entries is None:
+            max_entries = entries_for('table', ENTRY_BYTES)
+        self.bits = max(1, max_entries.bit_length() - 1)
+        self.max_entries = 1 << self.bits
+        # Keys are stored plus one so that 0 marks an empty slot
+        self.keys = array('q', [0]) * self.max_entries
+        self.data = array('q', [0]) * self.max_entries
+        self.scores = array('d', [0.0]) * self.max_entries
+        self.used = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+        track('table', self)
+
+    # Method to get the slot of a key
+    def slot(self, key):
+        return ((key * HASH_MULTIPLIER) & HASH_MASK) >> (64 - self.bits)
+
+    # Method to look up a position, returns its entry or None
+    def probe(self, key):
+        self.probes += 1
+        index = self.slot(key)
+        if self.keys[index] != key + 1:
+            return None
+        self.hits += 1
+        data = self.data[index]
+        score = self.scores[index]
+        return data >> 2 & 0xFF, data & 3, int(score) if score.is_integer() else score, unpack_move(data >> 10)
+
+    # Method to store a search result, deeper results replace shallower ones of the same position
+    def store(self, key, depth, flag, score, move):
+        index = self.slot(key)
+        stored = self.keys[index]
+        if stored == key + 1:
+            if self.data[index] >> 2 & 0xFF > depth:
+                return
+        elif stored == 0:
+            self.used += 1
+        else:
+            self.replacements += 1
+        self.keys[index] = key + 1
+        self.data[index] = pack_move(move) << 10 | depth << 2 | flag
+        self.scores[index] = score
+        self.stores += 1
+
+    # Method to empty the table, e.g. when the evaluation weights change
+    def clear(self):
+        self.keys = array('q', [0]) * self.max_entries
+        self.used = 0
+
+    # Memory of the table in bytes, fixed when the table is created
+    @property
+    def nbytes(self):
+        return self.max_entries * ENTRY_BYTES
+
+    def __len__(self):
+        return self.used
+
+
+class SharedTranspositionTable(TranspositionTable):
+    # Initialize a table in shared memory (multiprocessing.shared_memory) that several processes search with,
+    # or attach to the table `name` created by another process. Worker processes forked after the table was
+    # created share it directly; pickling a table (spawned workers) attaches to it by name.
+    # Entries are written without locks, lockless hashing style: the first word of an entry is the key XORed with
+    # the two other words (the packed data and the score), so an entry torn by two processes writing at once no
+    # longer matches its key and reads as a miss.
+    # The counters (used, probes, hits, stores, replacements) count the work of the calling process only.
+    def __init__(self, max_entries=None, name=None):
+        # shared_memory is imported here as only batch tools share tables between processes
+        from multiprocessing import shared_memory ,resource_tracker
+        if max_entries is None:
+            max_entries = entries_for('table', ENTRY_BYTES)
+        self.bits = max(1, max_entries.bit_length() - 1)
+        self.max_entries = 1 << self.bits
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=self.max_entries * ENTRY_BYTES)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+            # Only the creator removes the block, an attached process must not have it removed when it exits
+            resource_tracker.unregister(self.memory._name, 'shared_memory')
+        # Entry i is words 3i (check), 3i + 1 (depth, flag and move) and 3i + 2 (score, read as a float)
+        self.words = self.memory.buf.cast('q')
+        self.floats = self.memory.buf.cast('d')
+        self.used = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+        track('table', self)
+
+    # Method to look up a position, returns its entry or None
+    def probe(self, key):
+        self.probes += 1
+        base = self.slot(key) * 3
+        words = self.words
+        data = words[base + 1]
+        if words[base] ^ data ^ words[base + 2] != key + 1:
+            return None
+        self.hits += 1
+        score = self.floats[base + 2]
+        return data >> 2 & 0xFF, data & 3, int(score) if score.is_integer() else score, unpack_move(data >> 10)
+
+    # Method to store a search result, deeper results replace shallower ones of the same position
+    def store(self, key, depth, flag, score, move):
+        base = self.slot(key) * 3
+        words = self.words
+        check = words[base]
+        data = words[base + 1]
+        if check ^ data ^ words[base + 2] == key + 1:
+            if data >> 2 & 0xFF > depth:
+                return
+        elif check == 0:
+            self.used += 1
+        else:
+            self.replacements += 1
+        data = pack_move(move) << 10 | depth << 2 | flag
+        words[base + 1] = data
+        self.floats[base + 2] = score
+        words[base] = (key + 1) ^ data ^ words[base + 2]
+        self.stores += 1
+
+    # Method to empty the table for every process sharing it
+    def clear(self):
+        self.memory.buf[:self.nbytes] = bytes(self.nbytes)
+        self.used = 0
+
+    # Method to detach from the shared memory, the creator also frees it
+    def release(self):
+        self.words.release()
+        self.floats.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    # A pickled table attaches to the same shared memory
+    def __reduce__(self):
+        return SharedTranspositionTable, (self.max_entries, self.memory.name)
@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import random
+import time
+from multiprocessing import cpu_count
+from bi.heuristics import DEFAULT_WEIGHTS ,WEIGHTS_PATH ,load_weights ,save_weights
+from bi.selfplay import make_agent ,play_game_job
+from bi.workers import start_pool ,stop_pool ,clear_tables
+
+# Weight tuning with SPSA (simultaneous perturbation stochastic approximation).
+# Every iteration perturbs all weights at once in a random +/- direction, plays a batch of headless
+# games between the two perturbed weight vectors and moves the weights towards the stronger one.
+
+# SPSA gain schedule: a_k = A / (k + 1 + STABILITY) ** ALPHA and c_k = C / (k + 1) ** GAMMA
+STEP_SIZE = 1.0
+PERTURBATION = 0.5
+STABILITY = 10
+ALPHA = 0.602
+GAMMA = 0.101
+
+NAMES = list(DEFAULT_WEIGHTS)
+
+
+# Method to create a fresh tuning state starting from the given weights
+def new_state(weights):
+    return {
+        'iteration': 0,
+        'theta': [float(weights[name]) for name in NAMES],
+        'games': 0,
+        'elapsed': 0.0,
+        'history': [],
+    }
+
+
+# Method to load a checkpoint, or start a new run if there is none
+def load_checkpoint(path, weights):
+    if path and os.path.exists(path):
+        with open(path) as checkpoint_file:
+            return json.load(checkpoint_file)
+    return new_state(weights)
+
+
+# Method to write a checkpoint atomically so an interrupted run can always be resumed
+def save_checkpoint(path, state):
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as checkpoint_file:
+        json.dump(state, checkpoint_file, indent=4)
+    os.replace(temporary_path, path)
+
+
+# Method to convert a parameter vector to a weights dictionary
+def to_weights(theta):
+    return {name: round(value, 4) for name, value in zip(NAMES, theta)}
+
+
+# Method to build the game jobs of one iteration, alternating who moves first
+# Each vector searches with its own transposition table of the pool (bi.workers)
+def _jobs(plus, minus, depth, games, seed):
+    agent_plus = make_agent(depth=depth, weights=to_weights(plus), table=0)
+    agent_minus = make_agent(depth=depth, weights=to_weights(minus), table=1)
+    return [(agent_plus, agent_minus, game % 2 == 0, seed + game) for game in range(games)]
+
+
+# Method to run SPSA iterations, writing a checkpoint and the weights file after each one
+def tune(iterations, games, depth=1, processes=None, checkpoint=None, output=WEIGHTS_PATH, seed=None, report=print):
+    state = load_checkpoint(checkpoint, load_weights(output))
+    rng = random.Random(seed if seed is not None else state['iteration'])
+    processes = processes or cpu_count()
+
+    pool, shared = start_pool({'processes': processes, 'shared': True}, 2)
+    try:
+        while state['iteration'] < iterations:
+            k = state['iteration']
+            step = STEP_SIZE / (k + 1 + STABILITY) ** ALPHA
+            perturbation = PERTURBATION / (k + 1) ** GAMMA
+            theta = state['theta']
+            delta = [rng.choice((-1, 1)) for _ in theta]
+            plus = [value + perturbation * d for value, d in zip(theta, delta)]
+            minus = [value - perturbation * d for value, d in zip(theta, delta)]
+
+            started = time.perf_counter()
+            # The tables were searched with the weights of the previous iteration
+            clear_tables(shared)
+            jobs = _jobs(plus, minus, depth, games, rng.randrange(1 << 30))
+            # Score in [-1, 1] from the point of view of the plus vector
+            if pool is not None:
+                results = pool.imap_unordered(play_game_job, jobs, chunksize=max(1, games // (processes * 4)))
+            else:
+                results = map(play_game_job, jobs)
+            score = sum(results) / games
+            elapsed = time.perf_counter() - started
+
+            state['theta'] = [value + step * score / (2 * perturbation * d) for value, d in zip(theta, delta)]
+            state['iteration'] = k + 1
+            state['games'] += games
+            state['elapsed'] += elapsed
+            state['history'].append({'iteration': k + 1, 'score': score, 'weights': to_weights(state['theta'])})
+
+            if checkpoint:
+                save_checkpoint(checkpoint, state)
+            if output:
+                save_weights(to_weights(state['theta']), output)
+            if report:
+                report(f"iteration {k + 1}/{iterations}: score {score:+.3f}, {games / elapsed:.1f} games/s "
+                       f"({state['games'] / state['elapsed']:.1f} overall), weights {to_weights(state['theta'])}")
+    finally:
+        stop_pool(pool, shared)
+
+    return to_weights(state['theta'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the heuristic weights with SPSA self-play.")
+    parser.add_argument('--iterations', type=int, default=100, help="total number of SPSA iterations")
+    parser.add_argument('--games', type=int, default=64, help="games per iteration")
+    parser.add_argument('--depth', type=int, default=1, help="search depth of both agents")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--checkpoint', default='tuning_checkpoint.json', help="checkpoint file, reused to resume a run")
+    parser.add_argument('--output', default=WEIGHTS_PATH, help="weights file loaded by bi.heuristics.evaluate")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    tune(args.iterations, args.games, args.depth, args.processes, args.checkpoint, args.output, args.seed)
@@ -0,0 +1,54 @@
+from multiprocessing import Pool
+from bi.memory import ResultCache
+from bi.ttable import TranspositionTable ,SharedTranspositionTable
+
+# Process pools of the batch tools (analysis, review, arena, tuning, training). Every worker process is set up once
+# with the settings of the batch and the transposition tables it searches with, the job functions read them from
+# `worker`. With `shared` settings the tables live in shared memory and every worker searches the same ones,
+# otherwise each worker builds private tables of its own.
+
+# Settings, transposition tables and score cache of the current worker process, shared by every job it runs
+worker = {'settings': None, 'tables': [], 'cache': None}
+
+
+# Method to set up a worker process, the initializer of the pools of start_pool
+#   settings - batch settings, 'table_size' sizes the private tables and 'cache_size' (when present) the score cache
+#   tables   - one entry per table: a SharedTranspositionTable or None for a private table
+def init_worker(settings, tables):
+    worker['settings'] = settings
+    worker['tables'] = [table if table is not None else TranspositionTable(settings.get('table_size'))
+                        for table in tables]
+    worker['cache'] = ResultCache(settings['cache_size']) if 'cache_size' in settings else None
+
+
+# Method to start a pool of settings['processes'] workers searching with `count` transposition tables
+# With a single process there is no pool: the calling process is set up as the worker and runs the jobs itself.
+# Returns: tuple: The pool (None for a single process) and the shared tables (empty without settings['shared']),
+#                 both are stopped by stop_pool.
+def start_pool(settings, count=1):
+    if settings['processes'] <= 1:
+        init_worker(settings, [None] * count)
+        return None, []
+    shared = []
+    if settings.get('shared'):
+        shared = [SharedTranspositionTable(settings.get('table_size')) for _ in range(count)]
+    pool = Pool(settings['processes'], init_worker, (settings, shared or [None] * count))
+    return pool, shared
+
+
+# Method to empty the tables of a pool of start_pool between two batches whose results must not mix, the shared
+# tables of the pool or, without a pool, the tables of the calling process
+def clear_tables(shared):
+    for table in shared or worker['tables']:
+        table.clear()
+
+
+# Method to stop a pool of start_pool, dropping the jobs still running, and release its tables
+def stop_pool(pool, shared):
+    if pool is None:
+        worker['tables'] = []
+        worker['cache'] = None
+    else:
+        pool.terminate()
+    for table in shared:
+        table.release()
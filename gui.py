@@ -0,0 +1,467 @@
+import os
+import time
+import tkinter as tk 
+from tkinter import messagebox
+from models.player import Player
+from models.game import Game
+from models.view_model import BoardViewModel
+from models.variant import STANDARD
+from models.trace import tracer ,DEBUG
+from bi.minimax import bi_best_barrier_placement
+from bi.difficulty import best_piece_place ,best_piece_move ,get_profile ,DEFAULT_PROFILE
+from bi.records import save_record
+from bi.profiling import profiler
+from bi.metrics import metrics
+
+# Archive finished games are appended to for nightly review with `python -m bi.review`, unset to keep no archive
+ARCHIVE_PATH = os.environ.get('MORRIS_ARCHIVE')
+
+# Milliseconds between two looks at the frames that arrived in viewer mode
+FRAME_POLL_MS = 30
+
+class GameInterface:
+
+    # `feed` is an optional SnapshotFeed (models.stream) the session is published to for spectators.
+    # With `frames` (an iterable of feed frames, e.g. models.stream.subscribe or read_frames) the interface is a
+    # viewer: it shows the games of the frames instead of playing `game`, which only sets the board until the first
+    # key frame arrives.
+    def __init__(self, root, game, difficulty=DEFAULT_PROFILE, feed=None, frames=None):
+        # Initialize the difficulty profile (search depth and budgets) for AI decision-making
+        self.difficulty = get_profile(difficulty)
+        if frames is None:
+            # The solved endgame table loads in the background while the game starts
+            self.difficulty.prepare()
+
+        # Store the root Tkinter window and the current game instance
+        self.root = root
+        self.game = game
+        self.feed = feed
+        self.viewer = frames is not None
+
+        # Create and pack the frame for the game board
+        self.board_frame = tk.Frame(root)
+        self.board_frame.pack()
+
+        # Create and display informational labels (e.g., player names, scores)
+        self.create_info_labels()
+
+        # Initialize the grid of cells for the game board (4x4 on the standard board)
+        size = self.game.board.size
+        self.cells = [[None for _ in range(size)] for _ in range(size)]
+
+        # View model deciding which cells need to be redrawn after each move
+        self.view_model = BoardViewModel(self.game.board)
+
+        # A viewer only watches, it has no buttons to play with
+        if not self.viewer:
+            # Create and place the "New Game" button
+            self.create_new_game_button()
+
+            # Create and place the button for barrier placement mode
+            self.create_barrier_button()
+
+        # Create the game board cells in the UI
+        self.create_board()
+
+        # Initialize barrier placement mode flag
+        self.barrier_placement_mode = False
+
+        if self.viewer:
+            # The feed is imported here as only viewers need it
+            from models.stream import Spectator ,FramePump
+            # Frames are read on a background thread and drawn from the event loop
+            self.spectator = Spectator()
+            self.pump = FramePump(frames)
+            self.current_player_display.config(text="Waiting for the game...")
+            self.root.after(0, self.show_frames)
+            return
+
+        if self.feed is not None:
+            self.feed.publish(self.game)
+
+        # Check if the current player is the AI (player2) and make the first move if so
+        # The search is scheduled on the event loop so the window is drawn before it starts
+        if self.game.current_player.name == self.game.player2.name:
+            self.root.after(0, self.bi_place_piece)
+
+
+    def create_info_labels(self):
+        # Initialize info_frame here
+        self.info_frame = tk.Frame(self.root)
+        self.info_frame.pack(side=tk.BOTTOM)
+
+        # Create a frame for current player info
+        current_player_frame = tk.Frame(self.root)
+        current_player_frame.pack(side=tk.TOP, pady=10)
+
+        # Label for displaying current player with larger and bold text
+        self.current_player_display = tk.Label(current_player_frame, text=f"Current Player: {self.game.current_player.name}({self.game.current_player.color})", font=("Helvetica", 14, "bold"))
+        self.current_player_display.pack()
+
+        # Player labels
+        self.player1_label = tk.Label(self.info_frame, text=f"{self.game.player1.name}: {self.game.player1.color}")
+        self.player1_label.pack(side=tk.LEFT, padx=20)
+
+        self.player2_label = tk.Label(self.info_frame, text=f"{self.game.player2.name}: {self.game.player2.color}")
+        self.player2_label.pack(side=tk.LEFT, padx=20)
+
+        # Create a frame for barrier counter label
+        info_labels_frame = tk.Frame(self.info_frame)
+        info_labels_frame.pack(side=tk.TOP, pady=10)
+
+        # Label for displaying barrier counters
+        self.barrier_counter_label = tk.Label(info_labels_frame, text=f"Barriers - {self.game.player1.name}: {self.game.player1.barriers}  {self.game.player2.name}: {self.game.player2.barriers}")
+        self.barrier_counter_label.pack(side=tk.LEFT, padx=20)
+
+
+    def update_game(self):
+        # Update the labels displaying player information
+        self.player1_label.config(text=f"{self.game.player1.name}: {self.game.player1.color}")
+        self.player2_label.config(text=f"{self.game.player2.name}: {self.game.player2.color}")
+        
+        # Update the display showing the current player
+        self.current_player_display.config(text=f"Current Player: {self.game.current_player.name}({self.game.current_player.color})")
+        
+        # Update the barrier counter label to reflect the number of barriers each player has
+        self.barrier_counter_label.config(text=f"Barriers - {self.game.player1.name}: {self.game.player1.barriers}  {self.game.player2.name}: {self.game.player2.barriers}")
+
+        # Redraw only the cells the engine reported as changed, the game state itself is never touched here
+        for row, col, color in self.view_model.frame():
+            self.cells[row][col].configure(bg=color)
+
+        # Spectators get the changed cells as well, the feed skips a position it already sent
+        if self.feed is not None:
+            self.feed.publish(self.game)
+
+        if tracer.enabled:
+            tracer.event(DEBUG, 'gui.frame', redraws=self.view_model.last_frame_redraws,
+                         frames=self.view_model.frames, total_redraws=self.view_model.redraws)
+
+        # Refresh the UI to apply the updates
+        self.root.update()
+
+
+    def create_board(self):
+        # Iterate over each cell position on the board
+        for row in range(self.game.board.size):
+            for col in range(self.game.board.size):
+                # Check if the cell is accessible for piece placement or movement
+                if self.game.board.is_accessible(col, row):
+                    # Create a button widget for each accessible cell
+                    cell = tk.Button(
+                        self.board_frame,  # The parent widget/frame where the button will be placed
+                        text='',  # Initial text for the button (empty)
+                        width=10,  # Width of the button
+                        height=5,  # Height of the button
+                        command=lambda r=row, c=col: self.cell_clicked(r, c),  # Command to execute on button click, passing current row and column
+                        bg='light gray'  # Background color of the button (standard color)
+                    )
+                    # Place the button in the grid layout of the board_frame
+                    cell.grid(row=row, column=col)
+                    # Store a reference to the button in the cells array
+                    self.cells[row][col] = cell
+
+
+    def create_barrier_button(self):
+        # Create a button to enable the barrier placement mode
+        self.place_barrier_button = tk.Button(self.info_frame, text="Place Barrier", command=self.barrier_button_clicked, state=tk.NORMAL)
+        self.place_barrier_button.pack(side=tk.RIGHT, padx=20)
+
+
+    def create_new_game_button(self):
+        # Create a button to start a new game
+        self.new_game_button = tk.Button(self.info_frame, text="New Game", command=self.new_game)
+        self.new_game_button.pack(side=tk.RIGHT, padx=20)
+
+
+    def show_frames(self):
+        # Apply the frames that arrived since the last look, a key frame switches to the game it starts
+        frames = self.pump.poll()
+        for frame in frames:
+            if self.spectator.apply(frame):
+                self.show_game(self.spectator.game)
+        if frames and self.spectator.game is not None:
+            # The spectator rebuilds the board on every frame, only the cells that differ from the drawn ones change
+            self.view_model.attach(self.game.board)
+            self.update_game()
+            if self.spectator.winner is not None:
+                self.current_player_display.config(text=f"{self.spectator.winner} wins!")
+            elif self.game.draw is not None:
+                self.current_player_display.config(text=f"Draw by {self.game.draw}.")
+
+        # Keep looking until the feed or the replay has ended
+        if not self.pump.done or frames:
+            self.root.after(FRAME_POLL_MS, self.show_frames)
+        elif self.spectator.game is None:
+            self.current_player_display.config(text="No game to show.")
+
+
+    def show_game(self, game):
+        self.game = game
+        # A game on a board of another size gets new cells
+        if game.board.size != len(self.cells):
+            for cell in self.board_frame.winfo_children():
+                cell.destroy()
+            self.cells = [[None for _ in range(game.board.size)] for _ in range(game.board.size)]
+            self.view_model = BoardViewModel(game.board)
+            self.create_board()
+
+
+    def barrier_button_clicked(self):
+        # Check if the game is currently active
+        if not self.game.board.active:
+            # Inform the user that the game is over and barrier placement is not allowed
+            messagebox.showinfo("Game Over!", "The game is over.")
+            return
+
+        # Get the current player
+        player = self.game.current_player
+
+        # Check if the current player has barriers available for placement
+        if player.has_barriers():
+            # Prompt the user to confirm if they want to place a barrier
+            action = messagebox.askquestion("Place Barrier", "Do you want to place a barrier?", icon='question', type=messagebox.YESNO)
+            
+            # If the user confirms they want to place a barrier
+            if action == 'yes':
+                # Set the barrier placement mode to True, allowing the player to select a cell for barrier placement
+                self.barrier_placement_mode = True
+                # Inform the user that they can now click on a cell to place a barrier
+                messagebox.showinfo("Place Barrier", "Click on a cell to place a barrier.")
+        else:
+            # Inform the user that they have no barriers left to place
+            messagebox.showinfo("Out of Barriers", "You are out of barriers.")
+
+
+    def bi_place_piece(self):
+        # Profile the whole AI turn when profiling is switched on (MORRIS_PROFILE or --profile)
+        with profiler.profile('bi_place_piece'):
+            # First, handle the barrier placement for the AI before placing a new piece
+            self.bi_barrier_place()
+
+            # Check if the AI (player2) still has pieces to place
+            if self.game.player2.has_pieces():
+                # Determine the best placement for a new piece using the AI's strategy
+                move = best_piece_place(self.game, self.game.player2, self.difficulty)
+
+                # If a valid move is found
+                if move:
+                    row, col = move
+                    # Simulate a click on the selected cell to place the piece
+                    self.cell_clicked(row, col)
+
+
+    def bi_piece_move(self):
+        # Profile the whole AI turn when profiling is switched on (MORRIS_PROFILE or --profile)
+        with profiler.profile('bi_piece_move'):
+            # First, attempt to place barriers using the AI's barrier placement strategy
+            self.bi_barrier_place()
+
+            # Determine the best piece move for the AI
+            move = best_piece_move(self.game, self.game.player2, self.difficulty)
+
+            # If a valid move is found
+            if move:
+                (start_col, start_row), (end_col, end_row) = move
+
+                # Ensure the start and end positions are within the board boundaries
+                size = self.game.board.size
+                if (0 <= start_row < size and 0 <= start_col < size) and (0 <= end_row < size and 0 <= end_col < size):
+                    # Check if the AI has a piece at the start position
+                    if self.game.board.get_value(start_row, start_col) == self.game.player2.color:
+                        # Check if the end position is empty
+                        if self.game.board.get_value(end_row, end_col) is None:
+                            # Ensure the move is valid (one square in any direction)
+                            if abs(start_row - end_row) <= 1 and abs(start_col - end_col) <= 1:
+                                # Simulate a click on the start position to select the piece
+                                select = self.cell_clicked(start_row, start_col)
+                                if select:
+                                    # Simulate a click on the end position to move the piece
+                                    self.cell_clicked(end_row, end_col)
+
+
+    def bi_barrier_place(self):
+        # Get the AI player (player 2)
+        bi_player = self.game.player2
+        
+        # While the AI has barriers left to place
+        while bi_player.has_barriers():
+            # Determine the best position for the AI to place a barrier
+            if metrics.enabled:
+                started = time.perf_counter()
+            barrier_move = bi_best_barrier_placement(self.game)
+            if metrics.enabled:
+                metrics.record('barrier', time.perf_counter() - started, self.difficulty.name)
+            
+            # If a valid barrier placement position is found
+            if barrier_move:
+                row, col = barrier_move
+                # Place the barrier on the game board
+                self.game.place_barrier(col, row)
+                # Update the UI to show the barrier placement and the new barrier count
+                self.update_game()
+            else:
+                # No valid barrier placement found, exit the loop
+                break
+
+
+    def cell_clicked(self, row, col):
+        # A viewer does not play
+        if self.viewer:
+            return False
+
+        # Get the current player from the game
+        player = self.game.current_player
+
+        # Check if the game is over
+        if not self.game.board.active:
+            messagebox.showinfo("Game Over!", "The game is over.")
+            return False
+
+        # Check if barrier placement mode is active
+        if self.barrier_placement_mode:
+            # Try to place a barrier at the clicked position
+            if self.game.place_barrier(col, row):
+                # Update the UI to reflect the barrier placement and the barrier count labels
+                self.update_game()
+                # Turn off barrier placement mode after placing a barrier
+                self.barrier_placement_mode = False
+                return True
+            else:
+                # Inform the user if the barrier placement is invalid
+                messagebox.showinfo("Invalid Move", "You can't place a barrier there.")
+                return False
+
+        # Check if the current player has pieces left to place
+        if self.game.current_player.has_pieces():
+            # Try to place a new piece at the clicked position
+            if self.game.place_piece(col, row):
+                # Finish the turn (barriers age) and check if the move results in a win
+                self.game.end_turn()
+                self.check_winner()
+                # Update the UI to reflect the piece placement
+                self.update_game()
+                # If the current player is not Morris BI, let AI make a move if it's player 2's turn
+                if player.name != "Morris BI":
+                    if self.game.player2.has_pieces():
+                        self.bi_place_piece()
+                    else:
+                        self.bi_piece_move()
+                return True
+            else:
+                # Inform the user if the piece placement is invalid
+                messagebox.showinfo("Invalid Move", "You can't place a piece there.")
+                return False
+        else:
+            # Check if there is a selected piece to move
+            if self.game.selected_piece:
+                start_row, start_col = self.game.selected_piece
+                # Try to move the selected piece to the new position
+                if self.move_piece(start_col, start_row, col, row):
+                    # Clear the selected piece
+                    self.game.selected_piece = None
+                    # Finish the turn (barriers age) and check for a win
+                    self.game.end_turn()
+                    self.check_winner()
+                    # Update the UI to reflect the piece movement
+                    self.update_game()
+                    # If the current player is not Morris BI, let AI make a move if it's player 2's turn
+                    if player.name != "Morris BI":
+                        if self.game.player2.has_pieces():
+                            self.bi_place_piece()
+                        else:
+                            self.bi_piece_move()
+                    return True
+                else:
+                    # Inform the user if the piece movement is invalid
+                    messagebox.showinfo("Invalid Move", "You can't move the piece there.")
+                    return False
+            else:
+                # No piece selected, check if the clicked cell contains the player's piece
+                cell_value = self.game.board.get_value(row, col)
+                if cell_value == player.color:
+                    # Select the piece to move
+                    self.game.selected_piece = (row, col)
+                    # Inform the user that the piece has been selected
+                    if player.name != "Morris BI":
+                        messagebox.showinfo("Piece Selected", f"Selected piece at ({row}, {col}).")
+                    return True
+                else:
+                    # Inform the user if the selection is invalid
+                    messagebox.showinfo("Invalid Selection", "Select one of your pieces to move.")
+                    return False
+
+
+    def move_piece(self, start_col, start_row, new_col, new_row):
+        # Attempt to move a piece, the game records the move and switches to the next player on success
+        return self.game.move_piece(start_col, start_row, new_col, new_row)
+
+
+    def new_game(self):
+        # The new game is played on the same board variant
+        variant = self.game.variant
+
+        # Create a new Player 1 with the same name as the current player1
+        player1 = Player(self.game.player1.name, variant.pieces, variant.barriers)  # Default name for Player 1
+        
+        # Ensure Player 2 has a different color from Player 1
+        while True:
+            player2 = Player("Morris BI", variant.pieces, variant.barriers)
+            if player1.color != player2.color:
+                break
+
+        # Initialize a new game with the new players
+        game = Game(player1, player2, variant)
+        game.start()
+        self.game.board.activate_board()  # Activate the game board for the new game
+
+        # Update the GameInterface with the new game instance
+        self.game = game
+
+        # Point the view model at the new board, only the cells that differ from the last game are redrawn
+        self.view_model.attach(self.game.board)
+
+        # Update the game state in the interface
+        self.update_game()
+        
+        # If the current player is Morris BI (AI), make the AI place a piece at the start of the game
+        if self.game.current_player.name == self.game.player2.name:
+            self.bi_place_piece()
+
+
+    def check_winner(self):
+        # Spectators see the last move before the game over dialog holds the session up
+        if self.feed is not None:
+            self.feed.publish(self.game)
+
+        # Call the game's check_winner method to determine if there is a winner
+        winner = self.game.check_winner()
+        
+        # If a winner is found, show an informational message box with the winner's name
+        if winner:
+            messagebox.showinfo("Game Over", f"{winner} wins!")
+            
+            # Deactivate the game board to prevent further moves
+            self.game.board.deactivate_board()
+
+            # Archive the game and print where it was lost
+            self.review_game()
+
+        # Otherwise the game may have ended in a draw by repetition or by the move limit
+        elif self.game.draw:
+            messagebox.showinfo("Game Over", f"Draw by {self.game.draw}.")
+            self.game.board.deactivate_board()
+            self.review_game()
+
+
+    def review_game(self):
+        record = self.game.to_record()
+        if ARCHIVE_PATH:
+            save_record(record, ARCHIVE_PATH)
+        # The reviewer replays compact positions, which only exist for the standard board
+        if self.game.variant != STANDARD:
+            return
+        # The reviewer is imported here as only finished games need it
+        from bi.review import review_many ,format_report
+        for review in review_many([record], {'processes': 1}):
+            print(format_report(review))
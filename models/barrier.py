@@ -1,7 +1,7 @@
 class Barrier:
-    # Initialize barrier object
-    def __init__(self ,vertical ,horizontal):
-        self.turns_left = 4
+    # Initialize barrier object that stays `lifetime` turns on the board
+    def __init__(self ,vertical ,horizontal ,lifetime=4):
+        self.turns_left = lifetime
         self.vertical = vertical
         self.horizontal = horizontal
 
@@ -1,16 +1,45 @@
+import random
 from models.barrier import Barrier
+from models.trace import tracer ,DEBUG
+from models.variant import STANDARD
+
+# Random 64-bit keys of the features of a position, e.g. (row, col, color) for a piece, XORed into Board.hash
+_KEYS = {}
+
+
+# Method to get the Zobrist key of a position feature
+# Every key is drawn from a generator seeded with the feature itself, so all processes hash a position the same way
+def zobrist_key(*feature):
+    key = _KEYS.get(feature)
+    if key is None:
+        key = _KEYS[feature] = random.Random(repr(feature)).getrandbits(64)
+    return key
+
 
 class Board:
-    # Initialize board to be an empty 4x4 grid and set the accessibility matrix
-    def __init__(self):
-        self.array = [[None for _ in range(4)] for _ in range(4)]
-        self.accessibility = [
-            [False, True, True, True],
-            [True, True, True, True],
-            [True, True, True, True],
-            [True, True, True, False]
-        ]
+    # Initialize board to be an empty grid of the variant (4x4 by default) and set the accessibility matrix
+    def __init__(self, variant=None):
+        self.variant = variant if variant is not None else STANDARD
+        self.size = self.variant.size
+        self.array = [[None] * self.size for _ in range(self.size)]
+        self.accessibility = self.variant.accessibility()
         self.active = True
+        # Cells (row, col) changed since the last call to pop_dirty, used by the view model to redraw only those
+        self.dirty = set()
+        # Zobrist hash of the pieces and barriers (with their turns left), updated by every change of the board
+        self.hash = 0
+
+    # Method to recompute the hash after the array was filled in directly
+    def rehash(self):
+        self.hash = 0
+        for row in range(self.size):
+            for col in range(self.size):
+                value = self.array[row][col]
+                if isinstance(value, Barrier):
+                    self.hash ^= zobrist_key(row, col, 'barrier', value.turns_left)
+                elif value is not None:
+                    self.hash ^= zobrist_key(row, col, value)
+        return self.hash
 
     # Method to get the value at a specific cell
     def get_value(self, row, col):
@@ -24,10 +53,22 @@ class Board:
     def add_piece(self, col, row, value):
         if self.is_accessible(col, row) and self.array[row][col] is None:
             self.array[row][col] = value
+            self.hash ^= zobrist_key(row, col, value)
+            self.dirty.add((row, col))
+            if tracer.enabled:
+                tracer.event(DEBUG, 'board.add_piece', cell=(col, row), value=value)
             return True
         else:
             return False
 
+    # Remove a piece from the board, used to undo a placement
+    def remove_piece(self, col, row):
+        value = self.array[row][col]
+        if value is not None:
+            self.hash ^= zobrist_key(row, col, value)
+        self.array[row][col] = None
+        self.dirty.add((row, col))
+
     # Method to move the piece on the board, if the destination cell is accessible
     def move_piece(self, col, row, new_col, new_row):
         # Check if the move is within one square distance (up, down, left, right, or diagonal)
@@ -35,30 +76,64 @@ class Board:
             # Check if the new position is accessible and empty
             if self.is_accessible(new_col, new_row) and self.array[new_row][new_col] is None:
                 # Move the piece
-                self.array[new_row][new_col] = self.array[row][col]
+                value = self.array[row][col]
+                self.array[new_row][new_col] = value
                 self.array[row][col] = None
+                self.hash ^= zobrist_key(row, col, value) ^ zobrist_key(new_row, new_col, value)
+                self.dirty.add((row, col))
+                self.dirty.add((new_row, new_col))
+                if tracer.enabled:
+                    tracer.event(DEBUG, 'board.move_piece', start=(col, row), end=(new_col, new_row))
                 return True
         return False
     
     # Method to place a barrier on the board
     def place_barrier(self, col, row):
         if self.is_accessible(col, row) and self.array[row][col] is None:
-            barrier = Barrier(col, row)
+            barrier = Barrier(col, row, self.variant.barrier_lifetime)
             self.array[row][col] = barrier
             self.accessibility[row][col] = False
+            self.hash ^= zobrist_key(row, col, 'barrier', barrier.turns_left)
+            self.dirty.add((row, col))
+            if tracer.enabled:
+                tracer.event(DEBUG, 'board.place_barrier', cell=(col, row))
             return True
         else:
             return False
 
+    # Remove a barrier from the board, used to undo a placement
+    def remove_barrier(self, col, row):
+        barrier = self.array[row][col]
+        self.hash ^= zobrist_key(row, col, 'barrier', barrier.turns_left)
+        self.array[row][col] = None
+        self.accessibility[row][col] = True
+        self.dirty.add((row, col))
+
     # Method to update the board, removing expired barriers
+    # Returns the cells (row, col) of the barriers that expired
     def update_board(self):
-        for row in range(4):
-            for col in range(4):
+        expired = []
+        for row in range(self.size):
+            for col in range(self.size):
                 piece = self.array[row][col]
                 if isinstance(piece, Barrier):
-                    if not piece.decrement_turn():
+                    self.hash ^= zobrist_key(row, col, 'barrier', piece.turns_left)
+                    if piece.decrement_turn():
+                        self.hash ^= zobrist_key(row, col, 'barrier', piece.turns_left)
+                    else:
                         self.array[row][col] = None
                         self.accessibility[row][col] = True
+                        self.dirty.add((row, col))
+                        expired.append((row, col))
+                        if tracer.enabled:
+                            tracer.event(DEBUG, 'board.barrier_expired', cell=(col, row))
+        return expired
+
+    # Method to get the cells changed since the last call, and forget them
+    def pop_dirty(self):
+        dirty = self.dirty
+        self.dirty = set()
+        return dirty
 
 
     # Method to deactivate the board
@@ -1,22 +1,54 @@
+import os
 import random
-from models.board import Board
+from models.board import Board ,zobrist_key
+from models.player import Player
 from models.barrier import Barrier
-from copy import deepcopy
+from models.variant import STANDARD
+from copy import copy
+from models.trace import tracer ,DEBUG ,INFO
+
+# Steps (d_row, d_col) a piece can move in, one cell in any direction
+DIRECTIONS = tuple((d_row, d_col) for d_row in (-1, 0, 1) for d_col in (-1, 0, 1) if d_row or d_col)
+
+# Draw rules, 0 switches a rule off:
+#   MORRIS_REPETITIONS - the game is drawn when the same position (board, hands and side to move) occurs this often
+#   MORRIS_MOVE_LIMIT  - the game is drawn after this many turns in a row without a piece or barrier placed
+REPETITIONS = int(os.environ.get('MORRIS_REPETITIONS', 3))
+MOVE_LIMIT = int(os.environ.get('MORRIS_MOVE_LIMIT', 100))
+
+# Reasons of a draw, see Game.draw
+REPETITION = 'repetition'
+MOVE_LIMIT_REACHED = 'move limit'
 
 class Game:
-    # Initialize Game with 2 new players
-    def __init__(self, player1, player2):
-        self.board = Board()
+    # Initialize Game with 2 new players on the board of a variant (the standard 4x4 board by default)
+    # repetitions and move_limit override the draw rules REPETITIONS and MOVE_LIMIT
+    def __init__(self, player1, player2, variant=None, repetitions=None, move_limit=None):
+        self.variant = variant if variant is not None else STANDARD
+        self.board = Board(self.variant)
         self.player1 = player1
         self.player2 = player2
         self.current_player = None
         self.selected_piece = None
         self.active_barriers = [] 
+        # Actions played so far, in the format of apply_action, and the side (0 or 1) that played the first one
+        self.history = []
+        self.first_side = None
+        self.repetitions = REPETITIONS if repetitions is None else repetitions
+        self.move_limit = MOVE_LIMIT if move_limit is None else move_limit
+        # Number of times every position hash (see position_hash) occurred at the end of a turn
+        self.positions = {}
+        # Turns played since the last piece or barrier placement
+        self.quiet_turns = 0
+        # Reason of the draw (REPETITION or MOVE_LIMIT_REACHED) once a draw rule ended the game, None before
+        self.draw = None
 
     # Method to start the game
     def start(self):
         players = [self.player1, self.player2]
         self.current_player = random.choice(players)
+        if tracer.enabled:
+            tracer.event(INFO, 'game.start', player1=self.player1.name, player2=self.player2.name, first=self.current_player.name)
 
 
     # Method to switch between players
@@ -25,19 +57,184 @@ class Game:
         return self.current_player
 
 
+    # Method to get the opponent of the given player
+    def get_opponent(self, player):
+        return self.player1 if player.name == self.player2.name and player.color == self.player2.color else self.player2
+
+
     # Method to create a deep copy of the game state
+    # The board is rebuilt from the position code, which is much faster than copying its object graph
     def copy(self):
-        new_game = Game(deepcopy(self.player1), deepcopy(self.player2))
-        new_game.board = deepcopy(self.board)
-        new_game.current_player = deepcopy(self.current_player)
-        new_game.selected_piece = deepcopy(self.selected_piece)
-        new_game.active_barriers = deepcopy(self.active_barriers)
+        new_game = Game(copy(self.player1), copy(self.player2), self.variant, self.repetitions, self.move_limit)
+        new_game.load_board(self.to_code())
+        new_game.board.active = self.board.active
+        if self.current_player is not None:
+            new_game.current_player = new_game.player1 if self.current_player is self.player1 else new_game.player2
+        new_game.selected_piece = self.selected_piece
+        new_game.active_barriers = [copy(barrier) for barrier in self.active_barriers]
+        new_game.history = list(self.history)
+        new_game.first_side = self.first_side
+        new_game.positions = dict(self.positions)
+        new_game.quiet_turns = self.quiet_turns
+        new_game.draw = self.draw
         return new_game
 
 
+    # Method to encode the position as a fixed-width integer of variant.code_bits bits, from the lowest bits up:
+    #   variant.cell_bits per cell in row order - 0 empty, 1 player1 piece, 2 player2 piece, 3 + turns left of a barrier
+    #   variant.hand_bits per player            - pieces in hand of player1, then player2
+    #   variant.wall_bits per player            - barriers in hand of player1, then player2
+    #   1 bit                                   - 1 when player2 is to move
+    # The code describes the position only: history, draw rule counters and names stay with the Game.
+    def to_code(self):
+        variant = self.variant
+        bits = variant.cell_bits
+        digits = {self.player1.color: 1, self.player2.color: 2}
+        code = 0
+        shift = 0
+        for row in self.board.array:
+            for value in row:
+                if value is not None:
+                    digit = digits.get(value)
+                    code |= (3 + value.turns_left if digit is None else digit) << shift
+                shift += bits
+        hand_bits = variant.hand_bits
+        wall_bits = variant.wall_bits
+        code |= self.player1.pieces << shift | self.player2.pieces << shift + hand_bits
+        shift += 2 * hand_bits
+        code |= self.player1.barriers << shift | self.player2.barriers << shift + wall_bits
+        shift += 2 * wall_bits
+        if self.current_player is self.player2:
+            code |= 1 << shift
+        return code
+
+
+    # Method to create a game from a code made by to_code
+    # Parameters:
+    #     code (int): The position code.
+    #     player1, player2 (Player): Optional players, by default "player1" (red) and "player2" (blue). Their
+    #                                pieces and barriers in hand are set from the code.
+    #     variant (Variant): The variant the code was made for, the standard board by default.
+    # Returns: Game: The game with the position of the code and its side to move as current player.
+    @classmethod
+    def from_code(cls, code, player1=None, player2=None, variant=None):
+        if player1 is None:
+            player1 = Player("player1")
+            player1.color = 'red'
+        if player2 is None:
+            player2 = Player("player2")
+            player2.color = 'blue'
+        game = cls(player1, player2, variant)
+        game.load_board(code)
+        return game
+
+
+    # Method to set the board, the hands and the side to move from a code made by to_code
+    def load_board(self, code):
+        variant = self.variant
+        board = Board(variant)
+        size = variant.size
+        bits = variant.cell_bits
+        mask = (1 << bits) - 1
+        colors = (None, self.player1.color, self.player2.color)
+        cells = code & (1 << size * size * bits) - 1
+        code >>= size * size * bits
+        # Only the cells up to the last occupied one are read, the hash is built along the way
+        index = 0
+        while cells:
+            digit = cells & mask
+            if digit:
+                row, col = divmod(index, size)
+                if digit >= 3:
+                    barrier = Barrier(col, row, variant.barrier_lifetime)
+                    barrier.turns_left = digit - 3
+                    board.array[row][col] = barrier
+                    board.accessibility[row][col] = False
+                    board.hash ^= zobrist_key(row, col, 'barrier', barrier.turns_left)
+                else:
+                    board.array[row][col] = colors[digit]
+                    board.hash ^= zobrist_key(row, col, colors[digit])
+            cells >>= bits
+            index += 1
+        self.board = board
+
+        hand_mask = (1 << variant.hand_bits) - 1
+        self.player1.pieces = code & hand_mask
+        self.player2.pieces = code >> variant.hand_bits & hand_mask
+        code >>= 2 * variant.hand_bits
+        wall_mask = (1 << variant.wall_bits) - 1
+        self.player1.barriers = code & wall_mask
+        self.player2.barriers = code >> variant.wall_bits & wall_mask
+        code >>= 2 * variant.wall_bits
+        self.current_player = self.player2 if code & 1 else self.player1
+
+
+    # Pickled games, e.g. sent to worker processes, carry the board as its code instead of its object graph
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['board'] = (self.to_code(), self.board.active)
+        return state
+
+    def __setstate__(self, state):
+        code, active = state.pop('board')
+        self.__dict__.update(state)
+        current_player = self.current_player
+        self.load_board(code)
+        self.board.active = active
+        self.current_player = current_player
+
+
+    # Method to remember an action of the current player in the game history
+    def record_action(self, action):
+        if not self.history:
+            self.first_side = 0 if self.current_player is self.player1 else 1
+        self.history.append(action)
+
+
+    # Method to pass the turn when the current player has no legal action
+    def pass_turn(self):
+        self.record_action(('pass',))
+        self.quiet_turns += 1
+        self.switch_player()
+
+
+    # Method to play one recorded action the way GameInterface drives a turn
+    # Actions are ('place_barrier', col, row), ('place_piece', col, row), ('move_piece', col, row, new_col, new_row)
+    # and ('pass',). Placing a barrier does not end the turn, every other action ages the barriers.
+    def apply_action(self, action):
+        kind = action[0]
+        if kind == 'place_barrier':
+            return self.place_barrier(action[1], action[2])
+        if kind == 'place_piece':
+            done = self.place_piece(action[1], action[2])
+        elif kind == 'move_piece':
+            done = self.move_piece(*action[1:])
+        else:
+            self.pass_turn()
+            done = True
+        if done:
+            self.end_turn()
+        return done
+
+
+    # Method to get the record of the game for archives and post-game analysis
+    def to_record(self):
+        return {
+            'variant': self.variant.name,
+            'players': [self.player1.name, self.player2.name],
+            'first': self.first_side,
+            'actions': [list(action) for action in self.history],
+            'winner': self.check_winner(),
+            'draw': self.draw,
+            'final': self.to_code(),
+        }
+
+
     # Method to place a new piece on the board
     def place_piece(self, col, row):
         if self.current_player.has_pieces() and self.board.add_piece(col, row, self.current_player.color):
+            self.record_action(('place_piece', col, row))
+            self.quiet_turns = 0
             self.current_player.remove_piece()
             self.switch_player()
             return True
@@ -48,8 +245,10 @@ class Game:
     def place_barrier(self, col, row):
         if self.current_player.has_barriers() and self.board.is_accessible(col, row):
             if self.board.place_barrier(col, row):
-                barrier = Barrier(vertical=col, horizontal=row)  # Assuming col and row represent barrier position
+                barrier = Barrier(vertical=col, horizontal=row, lifetime=self.variant.barrier_lifetime)
                 self.active_barriers.append(barrier)
+                self.record_action(('place_barrier', col, row))
+                self.quiet_turns = 0
                 self.current_player.remove_barrier()
                 return True
         return False
@@ -57,29 +256,52 @@ class Game:
 
     # Method to move a piece on the board
     def move_piece(self, col, row, new_col, new_row):
-        # Print the attempt details
-        print(f"Attempting to move piece from ({col}, {row}) to ({new_col}, {new_row})")
-
-        # Check if the current player has pieces and if the move is valid
-        if self.current_player.has_pieces():
-            print("Current player has pieces.")
+        # Pieces can only be moved once the current player has placed all of them, and the move must be valid
+        if not self.current_player.has_pieces():
             if self.board.move_piece(col, row, new_col, new_row):
-                print("Piece successfully moved.")
+                self.record_action(('move_piece', col, row, new_col, new_row))
+                self.quiet_turns += 1
+                if tracer.enabled:
+                    tracer.event(DEBUG, 'game.move_piece', player=self.current_player.name, start=(col, row), end=(new_col, new_row))
                 # Switch player after a successful move
                 self.switch_player()
-                print(f"Player switched. Current player: {self.current_player}")
-                # Print the updated board state
-                print("Updated board state:")
-                self.print_board()
                 return True
-            else:
-                print("Failed to move piece.")
-        else:
-            print("Current player has no pieces.")
+            elif tracer.enabled:
+                tracer.event(DEBUG, 'game.move_rejected', player=self.current_player.name, start=(col, row), end=(new_col, new_row))
+        elif tracer.enabled:
+            tracer.event(DEBUG, 'game.move_rejected', player=self.current_player.name, reason='pieces in hand')
 
         return False
 
 
+    # Method to finish a turn after a piece placement or move: barriers age and expired ones leave the board,
+    # then the position is counted for the draw rules
+    # Returns the cells (row, col) of the barriers that expired
+    def end_turn(self):
+        expired = self.board.update_board()
+        position = self.position_hash()
+        count = self.positions.get(position, 0) + 1
+        self.positions[position] = count
+        if self.draw is None:
+            if self.repetitions and count >= self.repetitions:
+                self.draw = REPETITION
+            elif self.move_limit and self.quiet_turns >= self.move_limit:
+                self.draw = MOVE_LIMIT_REACHED
+            if self.draw is not None and tracer.enabled:
+                tracer.event(INFO, 'game.draw', reason=self.draw, turns=len(self.history))
+        return expired
+
+
+    # Method to get the hash of the position with `mover` (the current player by default) to move
+    # The board hash is combined with the side to move and the pieces and barriers left in every hand
+    def position_hash(self, mover=None):
+        if mover is None:
+            mover = self.current_player
+        player1, player2 = self.player1, self.player2
+        return (self.board.hash ^ zobrist_key('side', mover is player1)
+                ^ zobrist_key('hands', player1.pieces, player2.pieces, player1.barriers, player2.barriers))
+
+
     # Method to unselect the currently selected piece
     def unselect_piece(self):
         self.selected_piece = None
@@ -99,104 +321,106 @@ class Game:
     # Method to check if there is a winner in the game
     def check_winner(self):
         winning_color = None
-
-        # Check rows for a win
-        for row in range(4):
-            for col in range(2):
-                # Check for three consecutive cells in the row with the same color
-                if (self.board.array[row][col] == self.board.array[row][col+1] == self.board.array[row][col+2] 
-                    and self.board.array[row][col] is not None):
-                    winning_color = self.board.array[row][col]
+        array = self.board.array
+
+        # Check every line of the variant (rows, columns, diagonals, anti-diagonals) for cells of one color
+        for line in self.variant.lines:
+            row, col = line[0]
+            color = array[row][col]
+            if color is None:
+                continue
+            for row, col in line[1:]:
+                if array[row][col] != color:
                     break
-            if winning_color:  # Exit outer loop if a winner is found
+            else:
+                winning_color = color
                 break
 
-        # Check columns for a win
-        if winning_color is None:
-            for col in range(4):
-                for row in range(2):
-                    # Check for three consecutive cells in the column with the same color
-                    if (self.board.array[row][col] == self.board.array[row+1][col] == self.board.array[row+2][col] 
-                        and self.board.array[row][col] is not None):
-                        winning_color = self.board.array[row][col]
-                        break
-                if winning_color:  # Exit outer loop if a winner is found
-                    break
-
-        # Check diagonals for a win
-        if winning_color is None:
-            for row in range(2):
-                for col in range(2):
-                    # Check for three consecutive cells in the main diagonal (top-left to bottom-right)
-                    if (self.board.array[row][col] == self.board.array[row+1][col+1] == self.board.array[row+2][col+2] 
-                        and self.board.array[row][col] is not None):
-                        winning_color = self.board.array[row][col]
-                        break
-                if winning_color:  # Exit outer loop if a winner is found
-                    break
-
-            if winning_color is None:
-                for row in range(2):
-                    for col in range(2, 4):
-                        # Check for three consecutive cells in the anti-diagonal (top-right to bottom-left)
-                        if (self.board.array[row][col] == self.board.array[row+1][col-1] == self.board.array[row+2][col-2] 
-                            and self.board.array[row][col] is not None):
-                            winning_color = self.board.array[row][col]
-                            break
-                    if winning_color:  # Exit outer loop if a winner is found
-                        break
-
         # Determine the winner's name based on the winning color
         if winning_color:
             if self.player1.color == winning_color:
                 winner_name = self.player1.name
             elif self.player2.color == winning_color:
                 winner_name = self.player2.name
+            if tracer.enabled:
+                tracer.event(DEBUG, 'game.winner', winner=winner_name, color=winning_color)
             return winner_name
 
         return None
 
 
+    # Method to check if the piece on (col, row) is part of a winning line (three in a row on the standard board)
+    # Only the lines through the last moved piece can be new, so this replaces a full check_winner scan
+    def is_winning_move(self, col, row):
+        color = self.board.array[row][col]
+        if color is None:
+            return False
+        size = self.board.size
+        for d_col, d_row in ((1, 0), (0, 1), (1, 1), (1, -1)):
+            count = 1
+            # Count the same colored pieces on both sides of the cell
+            for sign in (1, -1):
+                next_col, next_row = col + sign * d_col, row + sign * d_row
+                while 0 <= next_col < size and 0 <= next_row < size and self.board.array[next_row][next_col] == color:
+                    count += 1
+                    next_col += sign * d_col
+                    next_row += sign * d_row
+            if count >= self.variant.line_length:
+                return True
+        return False
+
+
     # Method to get the legal moves by player
-    def get_legal_moves(self, player):
+    # Barrier placements can be left out, the search does not play them as they do not end the turn
+    def get_legal_moves(self, player, include_barriers=True):
         legal_moves = []
 
-        # Get all legal piece placement moves for the player
-        if player.has_pieces():
-            for row in range(4):
-                for col in range(4):
-                    # Check if the cell is accessible and empty
-                    if self.board.is_accessible(col, row) and self.board.array[row][col] is None:
-                        # Add move to place a piece to the list of legal moves
-                        legal_moves.append(('place_piece', col, row))
-
         # Get all legal barrier placement moves for the player
-        if player.has_barriers():
-            for row in range(4):
-                for col in range(4):
+        if include_barriers and player.has_barriers():
+            for row in range(self.board.size):
+                for col in range(self.board.size):
                     # Check if the cell is accessible and empty
                     if self.board.is_accessible(col, row) and self.board.array[row][col] is None:
                         # Add move to place a barrier to the list of legal moves
                         legal_moves.append(('place_barrier', col, row))
 
-        # Get all legal piece movement moves for the player
-        for start_row in range(4):
-            for start_col in range(4):
+        # Piece placements come before the barriers, piece movements after them
+        if player.has_pieces():
+            return list(self.iter_piece_actions(player)) + legal_moves
+        legal_moves.extend(self.iter_piece_actions(player))
+        return legal_moves
+
+
+    # Method to generate the piece actions of a player one by one without building a list
+    # Pieces are placed while the player has some in hand and only move once all of them are placed.
+    # The board is read lazily, so it must be unchanged whenever the next action is asked for.
+    def iter_piece_actions(self, player):
+        array = self.board.array
+        accessibility = self.board.accessibility
+        size = self.board.size
+
+        # Get all legal piece placement moves for the player
+        if player.has_pieces():
+            for row in range(size):
+                for col in range(size):
+                    # Check if the cell is accessible and empty
+                    if accessibility[row][col] and array[row][col] is None:
+                        yield ('place_piece', col, row)
+            return
+
+        color = player.color
+        for start_row in range(size):
+            for start_col in range(size):
                 # Check if the current cell contains the player's piece
-                if self.board.array[start_row][start_col] == player.color:
+                if array[start_row][start_col] == color:
                     # Explore all possible directions for moving the piece
-                    for d_row in [-1, 0, 1]:
-                        for d_col in [-1, 0, 1]:
-                            # Calculate the new position of the piece
-                            if 0 <= start_row + d_row < 4 and 0 <= start_col + d_col < 4:
-                                end_row = start_row + d_row
-                                end_col = start_col + d_col
-                                # Check if the new position is accessible and empty
-                                if self.board.is_accessible(end_col, end_row) and self.board.array[end_row][end_col] is None:
-                                    # Add move to move a piece to the list of legal moves
-                                    legal_moves.append(('move_piece', start_col, start_row, end_col, end_row))
-
-        return legal_moves
+                    for d_row, d_col in DIRECTIONS:
+                        end_row = start_row + d_row
+                        end_col = start_col + d_col
+                        # Check if the new position is on the board, accessible and empty
+                        if 0 <= end_row < size and 0 <= end_col < size and accessibility[end_row][end_col] \
+                                and array[end_row][end_col] is None:
+                            yield ('move_piece', start_col, start_row, end_col, end_row)
 
 
     # Method to get all possible places to place piece
@@ -204,9 +428,9 @@ class Game:
         board = self.board
         possible_moves = []
 
-        # Iterate over each cell in the 4x4 board
-        for row in range(4):
-            for col in range(4):
+        # Iterate over each cell of the board (size x size for the variant)
+        for row in range(self.board.size):
+            for col in range(self.board.size):
                 # Check if the cell is accessible and currently empty
                 if board.is_accessible(col, row) and board.array[row][col] is None:
                     # Add the cell as a possible move for placing a piece
@@ -219,9 +443,9 @@ class Game:
     def get_possible_pieces_moves(self, player):
         possible_piece_moves = []
 
-        # Iterate over each cell in the 4x4 board
-        for old_row in range(4):
-            for old_col in range(4):
+        # Iterate over each cell of the board (size x size for the variant)
+        for old_row in range(self.board.size):
+            for old_col in range(self.board.size):
                 # Check if the cell contains the player's piece
                 if self.board.get_value(old_row, old_col) == player.color:
                     # Explore all possible directions for movement
@@ -235,7 +459,7 @@ class Game:
                             new_col = old_col + d_col
 
                             # Check if the new position is within the board boundaries
-                            if 0 <= new_row < 4 and 0 <= new_col < 4:
+                            if 0 <= new_row < self.board.size and 0 <= new_col < self.board.size:
                                 # Check if the new position is accessible and empty
                                 if self.board.is_accessible(new_col, new_row) and self.board.get_value(new_row, new_col) is None:
                                     # Add the move (from old position to new position) to the list
@@ -249,9 +473,9 @@ class Game:
         board = self.board
         possible_moves = []
 
-        # Iterate over each cell in the 4x4 board
-        for row in range(4):
-            for col in range(4):
+        # Iterate over each cell of the board (size x size for the variant)
+        for row in range(self.board.size):
+            for col in range(self.board.size):
                 # Check if the cell is accessible and currently empty
                 if board.is_accessible(col, row) and board.array[row][col] is None:
                     # Add the cell to possible barrier placements if it meets the criteria
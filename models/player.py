@@ -1,12 +1,12 @@
 import random
 
 class Player:
-    # Initialize player with a name, color, 3 pieces and 2 barriers
-    def __init__(self, name="BI"):
+    # Initialize player with a name, color, 3 pieces and 2 barriers (or the counts of a board variant)
+    def __init__(self, name="BI", pieces=3, barriers=2):
         self.name = name
         self.color = random.choice(self.available_colors)
-        self.pieces = 3
-        self.barriers = 2
+        self.pieces = pieces
+        self.barriers = barriers
 
     # Method to remove piece from user stack
     def remove_piece(self):
@@ -16,6 +16,10 @@ class Player:
         else:
             return False
 
+    # Method to return a piece to the user stack, used to undo a placement
+    def add_piece(self):
+        self.pieces += 1
+
     # Method to check if the player still has pieces 
     def has_pieces(self):
         return self.pieces > 0
@@ -29,6 +33,10 @@ class Player:
         else:
             return False
 
+    # Method to return a barrier to the user stack, used to undo a placement
+    def add_barrier(self):
+        self.barriers += 1
+
     # Method to check if the player still has pieces 
     def has_barriers(self):
         return self.barriers > 0
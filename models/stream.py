@@ -0,0 +1,365 @@
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from collections import deque
+from models.game import Game
+from models.player import Player
+from models.variant import get_variant
+
+# Spectator feed: a running session publishes its position after every change (a move, a barrier placed or expired)
+# and spectators follow it live over TCP or replay a recording of it. Frames are JSON lines:
+#   key frame  - {"seq": n, "t": seconds, "key": Game.to_code, "variant": name, "players": [[name, color], ...]}
+#                the whole position, sent first to every spectator and whenever a new game starts
+#   diff frame - {"seq": n, "t": seconds, "cells": [[row, col, digit], ...], "turn": 0 or 1}
+#                the cells that changed, with "hands" [pieces 1, pieces 2, barriers 1, barriers 2] when those changed
+# A frame that ends the game also has "winner" (a name) or "draw" (the reason). Cell digits are those of
+# Game.to_code: 0 empty, 1 player1 piece, 2 player2 piece, 3 + turns left of a barrier. "t" counts from the
+# start of the feed and paces replays.
+# A frame is encoded once and kept in a ring shared by every spectator, each reads it at its own pace, so the cost
+# of a publish does not depend on the number of spectators. A spectator that falls further behind than the ring
+# starts over from a key frame of the current position.
+
+# Number of frames kept for spectators that lag behind
+FEED_FRAMES = int(os.environ.get('MORRIS_FEED_FRAMES', 256))
+
+# Seconds the server waits for a frame before it looks for new spectators and writes to the slow ones again
+POLL_SECONDS = 0.1
+
+# Bytes a spectator may lag behind before it skips to a key frame of the current position
+LAG_BYTES = 64 * 1024
+
+
+# Method to encode a frame as one JSON line
+def encode_frame(frame):
+    return (json.dumps(frame, separators=(',', ':')) + '\n').encode()
+
+
+# Method to split a position code in its cell digits and the rest (hands and side to move)
+def _split_code(code, variant):
+    bits = variant.cell_bits
+    mask = (1 << bits) - 1
+    digits = [code >> index * bits & mask for index in range(variant.size * variant.size)]
+    return digits, code >> variant.size * variant.size * bits
+
+
+# Method to get the hands [pieces 1, pieces 2, barriers 1, barriers 2] and the side to move from the rest of a code
+def _split_rest(rest, variant):
+    hand_mask = (1 << variant.hand_bits) - 1
+    wall_mask = (1 << variant.wall_bits) - 1
+    walls = rest >> 2 * variant.hand_bits
+    hands = [rest & hand_mask, rest >> variant.hand_bits & hand_mask,
+             walls & wall_mask, walls >> variant.wall_bits & wall_mask]
+    return hands, walls >> 2 * variant.wall_bits & 1
+
+
+# Method to build a position code from its cell digits, hands and side to move
+def _join_code(digits, hands, turn, variant):
+    bits = variant.cell_bits
+    code = 0
+    for index, digit in enumerate(digits):
+        code |= digit << index * bits
+    shift = len(digits) * bits
+    code |= hands[0] << shift | hands[1] << shift + variant.hand_bits
+    shift += 2 * variant.hand_bits
+    code |= hands[2] << shift | hands[3] << shift + variant.wall_bits
+    shift += 2 * variant.wall_bits
+    return code | turn << shift
+
+
+class SnapshotFeed:
+    # Initialize a feed without a game, `path` is an optional file every frame is appended to (a recording)
+    def __init__(self, path=None, frames=None):
+        # Ring of the last frames: (seq, encoded line, game, position code)
+        self.frames = deque(maxlen=frames or FEED_FRAMES)
+        self.condition = threading.Condition()
+        self.recording = open(path, 'ab') if path is not None else None
+        self.started = time.perf_counter()
+        self.game = None
+        self.code = None
+        self.seq = 0
+        self.closed = False
+
+    # Method to publish the position of a game after a change, a different game than the last one starts with a
+    # key frame. Nothing is sent when the position did not change.
+    def publish(self, game):
+        code = game.to_code()
+        if game is self.game and code == self.code:
+            return
+        frame = {'seq': self.seq + 1, 't': round(time.perf_counter() - self.started, 3)}
+        if game is not self.game:
+            frame.update(self._key(game, code))
+        else:
+            variant = game.variant
+            digits, rest = _split_code(code, variant)
+            old_digits, old_rest = _split_code(self.code, variant)
+            size = variant.size
+            frame['cells'] = [[index // size, index % size, digit]
+                              for index, (digit, old) in enumerate(zip(digits, old_digits)) if digit != old]
+            hands, frame['turn'] = _split_rest(rest, variant)
+            if hands != _split_rest(old_rest, variant)[0]:
+                frame['hands'] = hands
+        winner = game.check_winner()
+        if winner is not None:
+            frame['winner'] = winner
+        elif game.draw is not None:
+            frame['draw'] = game.draw
+        line = encode_frame(frame)
+
+        with self.condition:
+            self.game = game
+            self.code = code
+            self.seq = frame['seq']
+            self.frames.append((self.seq, line, game, code))
+            self.condition.notify_all()
+        if self.recording is not None:
+            self.recording.write(line)
+            self.recording.flush()
+
+    # Method to get the fields of the key frame of a position
+    def _key(self, game, code):
+        return {
+            'key': code,
+            'variant': game.variant.name,
+            'players': [[game.player1.name, game.player1.color], [game.player2.name, game.player2.color]],
+        }
+
+    # Method to get the encoded key frame of the position after frame `seq` (the last one by default)
+    # Returns None before the first frame or when the ring no longer holds that frame
+    def key_frame(self, seq=None):
+        with self.condition:
+            for number, _, game, code in reversed(self.frames):
+                if seq is None or number == seq:
+                    frame = {'seq': number, 't': round(time.perf_counter() - self.started, 3)}
+                    frame.update(self._key(game, code))
+                    return encode_frame(frame)
+            return None
+
+    # Method to wait for the frames after `seq`
+    # Returns: tuple: The encoded frames and the sequence number of the last one. A reader the ring no longer covers
+    #                 gets a key frame instead. No frames after `timeout` seconds or once the feed is closed.
+    def frames_after(self, seq, timeout=POLL_SECONDS):
+        with self.condition:
+            if self.seq == seq and not self.closed:
+                self.condition.wait(timeout)
+            if self.seq == seq or self.closed:
+                return [], seq
+            if self.frames[0][0] > seq + 1:
+                return [self.key_frame()], self.seq
+            return [line for number, line, _, _ in self.frames if number > seq], self.seq
+
+    # Method to close the feed, spectators are disconnected and the recording is closed
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.recording is not None:
+            self.recording.close()
+            self.recording = None
+
+
+class FeedServer:
+    # Initialize a server streaming `feed` to the spectators connecting to (host, port), port 0 picks a free one
+    # One thread serves every spectator: it takes the new frames from the feed once and writes the same bytes to
+    # each socket without blocking, so a publish wakes a single thread whatever the number of spectators.
+    def __init__(self, feed, host='127.0.0.1', port=0):
+        self.feed = feed
+        self.listener = socket.create_server((host, port))
+        self.listener.setblocking(False)
+        self.server_address = self.listener.getsockname()[:2]
+        # Bytes every spectator socket still has to be sent
+        self.pending = {}
+        self.thread = None
+
+    # Method to serve spectators on a background thread, returns the (host, port) they connect to
+    def start(self):
+        self.thread = threading.Thread(target=self._serve, name='feed-server', daemon=True)
+        self.thread.start()
+        return self.server_address
+
+    # Method to serve until the feed is closed
+    def _serve(self):
+        feed = self.feed
+        seq = feed.seq
+        while not feed.closed:
+            lines, seq = feed.frames_after(seq)
+            data = b''.join(lines)
+            for spectator in list(self.pending):
+                self.pending[spectator] += data
+                self._write(spectator, seq)
+            # Spectators joining now start from the position all the others have been sent
+            self._accept(seq)
+        for spectator in self.pending:
+            spectator.close()
+        self.listener.close()
+
+    # Method to take the new spectators, each gets a key frame of the position after frame `seq`
+    def _accept(self, seq):
+        while True:
+            try:
+                spectator, _ = self.listener.accept()
+            except BlockingIOError:
+                return
+            spectator.setblocking(False)
+            self.pending[spectator] = bytearray(self.feed.key_frame(seq) or b'') if seq else bytearray()
+            self._write(spectator, seq)
+
+    # Method to write what a spectator socket takes without blocking
+    # A spectator that lags more than LAG_BYTES behind skips to a key frame once its current line is written
+    def _write(self, spectator, seq):
+        pending = self.pending[spectator]
+        if len(pending) > LAG_BYTES:
+            del pending[pending.find(b'\n') + 1:]
+            pending += self.feed.key_frame(seq) or b''
+        if not pending:
+            return
+        try:
+            sent = spectator.send(pending)
+        except BlockingIOError:
+            return
+        except OSError:
+            # The spectator went away
+            del self.pending[spectator]
+            spectator.close()
+            return
+        del pending[:sent]
+
+    # Method to stop serving and close the feed
+    def stop(self):
+        self.feed.close()
+        if self.thread is not None:
+            self.thread.join()
+
+
+# Method to parse an address "host:port" or "port"
+def parse_address(address):
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+# Method to read the frames of a live feed served by FeedServer, until the session closes it
+def subscribe(host, port):
+    with socket.create_connection((host, port)) as connection:
+        for line in connection.makefile('rb'):
+            yield json.loads(line)
+
+
+# Method to turn a game record (Game.to_record) into the frames a session would have streamed, one per action
+# Actions are spaced one second apart so a replay has a pace to follow.
+def record_frames(record):
+    variant = get_variant(record.get('variant', '4x4'))
+    players = []
+    for name, color in zip(record['players'], ('red', 'blue')):
+        player = Player(name, variant.pieces, variant.barriers)
+        player.color = color
+        players.append(player)
+    game = Game(players[0], players[1], variant)
+    game.current_player = players[record.get('first') or 0]
+    feed = SnapshotFeed(frames=len(record['actions']) + 1)
+    feed.publish(game)
+    for action in record['actions']:
+        if not game.apply_action(tuple(action)):
+            raise ValueError(f"illegal action {action}")
+        feed.publish(game)
+    frames = [json.loads(line) for _, line, _, _ in feed.frames]
+    for index, frame in enumerate(frames):
+        frame['t'] = float(index)
+    return frames
+
+
+# Method to read a recorded file: a feed recording (SnapshotFeed path) or a game archive (bi.records)
+def read_frames(path):
+    with open(path) as recording:
+        offset = 0.0
+        for line in recording:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if 'seq' in item:
+                yield item
+                continue
+            # Every archived game is replayed after the previous one
+            frames = record_frames(item)
+            for frame in frames:
+                frame['t'] += offset
+                yield frame
+            offset = frames[-1]['t'] + 1
+
+
+# Method to pace frames for a replay: each frame is held back for the time since the previous one divided by `speed`
+# A speed of None (or 0) passes the frames on as they come, e.g. for a live feed
+def paced(frames, speed=None):
+    previous = None
+    for frame in frames:
+        if speed and previous is not None and frame['t'] > previous:
+            time.sleep((frame['t'] - previous) / speed)
+        previous = frame['t']
+        yield frame
+
+
+class Spectator:
+    # Initialize a spectator view that rebuilds the position of a feed from its frames, it ignores diffs until it
+    # got its first key frame
+    def __init__(self):
+        self.game = None
+        self.code = None
+        self.seq = 0
+        self.winner = None
+
+    # Method to apply one frame to the game of the spectator
+    # Returns True when the frame started a new game (a key frame), the board of the game is rebuilt on every frame
+    def apply(self, frame):
+        started = 'key' in frame
+        if started:
+            players = [Player(name) for name, _ in frame['players']]
+            for player, (_, color) in zip(players, frame['players']):
+                player.color = color
+            self.game = Game(players[0], players[1], get_variant(frame['variant']))
+            self.code = frame['key']
+        elif self.game is None:
+            return False
+        else:
+            variant = self.game.variant
+            digits, rest = _split_code(self.code, variant)
+            hands, turn = _split_rest(rest, variant)
+            for row, col, digit in frame['cells']:
+                digits[row * variant.size + col] = digit
+            self.code = _join_code(digits, frame.get('hands', hands), frame['turn'], variant)
+        self.game.load_board(self.code)
+        self.game.draw = frame.get('draw')
+        self.winner = frame.get('winner')
+        if self.winner is not None or self.game.draw is not None:
+            self.game.board.deactivate_board()
+        self.seq = frame['seq']
+        return started
+
+
+class FramePump:
+    # Initialize a pump reading frames on a background thread, so that a blocking source (a live feed, a paced
+    # replay) never stalls the caller, which collects them with poll()
+    def __init__(self, frames):
+        self.queue = queue.Queue()
+        self.done = False
+        threading.Thread(target=self._run, args=(frames,), name='frame-pump', daemon=True).start()
+
+    # Method to move the frames of the source to the queue
+    def _run(self, frames):
+        try:
+            for frame in frames:
+                self.queue.put(frame)
+        except OSError:
+            # The live feed was closed
+            pass
+        finally:
+            self.done = True
+
+    # Method to get the frames that arrived since the last call
+    def poll(self):
+        frames = []
+        while True:
+            try:
+                frames.append(self.queue.get_nowait())
+            except queue.Empty:
+                return frames
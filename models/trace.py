@@ -0,0 +1,87 @@
+import json
+import os
+import random
+import sys
+import time
+
+# Trace levels, a higher number means a more important event
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+
+LEVEL_NAMES = {DEBUG: 'debug', INFO: 'info', WARNING: 'warning', OFF: 'off'}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+
+class Tracer:
+    # Initialize the tracer, disabled unless a level below OFF is given
+    def __init__(self, level=OFF, sample_rate=1.0, stream=None):
+        self.level = OFF
+        self.sample_rate = 1.0
+        self.stream = stream if stream is not None else sys.stderr
+        self.enabled = False
+        self.configure(level, sample_rate)
+
+    # Method to change the level, sampling rate or output stream of the tracer
+    # The `enabled` flag is the fast path checked by hot code before building any event
+    def configure(self, level=None, sample_rate=None, stream=None):
+        if level is not None:
+            self.level = LEVELS[level] if isinstance(level, str) else level
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if stream is not None:
+            self.stream = stream
+        self.enabled = self.level < OFF and self.sample_rate > 0.0
+
+    # Method to check if events of the given level would be emitted
+    def is_enabled(self, level):
+        return self.enabled and level >= self.level
+
+    # Method to emit one structured event as a single JSON line
+    # Callers on hot paths should check `tracer.enabled` first so the keyword arguments are never built
+    def event(self, level, name, **fields):
+        if not self.enabled or level < self.level:
+            return
+        # Drop a share of the events when sampling is configured (warnings are always kept)
+        if level < WARNING and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        record = {'ts': round(time.time(), 6), 'level': LEVEL_NAMES.get(level, level), 'event': name}
+        record.update(fields)
+        self.stream.write(json.dumps(record, default=str) + '\n')
+
+    # Method to trace a block of code (for example one game) and restore the previous settings afterwards
+    def capture(self, level=DEBUG, sample_rate=1.0, stream=None):
+        return _Capture(self, level, sample_rate, stream)
+
+
+class _Capture:
+    # Initialize the capture with the settings to use inside the block
+    def __init__(self, tracer, level, sample_rate, stream):
+        self.tracer = tracer
+        self.settings = (level, sample_rate, stream)
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = (self.tracer.level, self.tracer.sample_rate, self.tracer.stream)
+        self.tracer.configure(*self.settings)
+        return self.tracer
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.configure(*self.previous)
+        return False
+
+
+# Method to build the shared tracer from the environment
+# MORRIS_TRACE sets the level (debug, info, warning, off), MORRIS_TRACE_SAMPLE the sampling rate
+# and MORRIS_TRACE_FILE an optional file to append the events to
+def _tracer_from_env():
+    level = os.environ.get('MORRIS_TRACE', 'off').lower()
+    sample_rate = os.environ.get('MORRIS_TRACE_SAMPLE', '1.0')
+    path = os.environ.get('MORRIS_TRACE_FILE')
+    stream = open(path, 'a', buffering=1) if path and level != 'off' else None
+    return Tracer(LEVELS.get(level, OFF), sample_rate, stream)
+
+
+# Shared tracer used by the models and the bi package
+tracer = _tracer_from_env()
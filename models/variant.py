@@ -0,0 +1,92 @@
+class Variant:
+    # Initialize a board variant
+    #   size             - the board has size x size cells
+    #   line_length      - pieces in a row (row, column or diagonal) needed to win
+    #   blocked          - cells (col, row) that are never accessible, None for the two opposite corners
+    #   pieces           - pieces of every player
+    #   barriers         - barriers of every player
+    #   barrier_lifetime - turns a freshly placed barrier stays on the board
+    def __init__(self, name, size=4, line_length=3, blocked=None, pieces=3, barriers=2, barrier_lifetime=4):
+        self.name = name
+        self.size = size
+        self.line_length = line_length
+        if blocked is None:
+            blocked = ((0, 0), (size - 1, size - 1))
+        self.blocked = tuple(sorted(blocked))
+        self.pieces = pieces
+        self.barriers = barriers
+        self.barrier_lifetime = barrier_lifetime
+
+        # Every winning line as a tuple of (row, col) cells: rows, columns, diagonals and anti-diagonals in that order
+        self.lines = tuple(self._build_lines())
+        # Cells (row, col) that count as the center of the board: every cell off the border
+        self.center = tuple((row, col) for row in range(1, size - 1) for col in range(1, size - 1))
+
+        # Rows of the accessibility matrix of an empty board, copied for every new board
+        self._accessibility = tuple(tuple((col, row) not in self.blocked for col in range(size)) for row in range(size))
+
+        # Bit widths of the fields of Game.to_code, cells hold 0 (empty), 1 or 2 (a piece of player1 or player2)
+        # or 3 + the turns left of a barrier
+        self.cell_bits = (3 + barrier_lifetime).bit_length()
+        self.hand_bits = pieces.bit_length()
+        self.wall_bits = barriers.bit_length()
+        self.code_bits = size * size * self.cell_bits + 2 * self.hand_bits + 2 * self.wall_bits + 1
+
+    # Method to build the winning lines of the variant
+    def _build_lines(self):
+        length = self.line_length
+        for d_row, d_col in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            for row in range(self.size):
+                for col in range(self.size):
+                    end_row = row + d_row * (length - 1)
+                    end_col = col + d_col * (length - 1)
+                    if 0 <= end_row < self.size and 0 <= end_col < self.size:
+                        yield tuple((row + d_row * i, col + d_col * i) for i in range(length))
+
+    # Method to build the accessibility matrix of an empty board
+    def accessibility(self):
+        return [list(row) for row in self._accessibility]
+
+    # Identity of the rules, two variants with the same rules are equal whatever their name
+    @property
+    def key(self):
+        return self.size, self.line_length, self.blocked, self.pieces, self.barriers, self.barrier_lifetime
+
+    def __eq__(self, other):
+        return isinstance(other, Variant) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    # Variants are pickled as their rules, the derived tables are rebuilt on the other side
+    def __reduce__(self):
+        return Variant, (self.name, self.size, self.line_length, self.blocked, self.pieces, self.barriers,
+                         self.barrier_lifetime)
+
+    # Variants never change, so copies of a game share them
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return f"Variant({self.name!r})"
+
+
+# The original game: a 4x4 board with two blocked corners, three in a row wins
+STANDARD = Variant('4x4')
+
+# Larger boards need longer lines and more pieces to stay playable
+VARIANTS = {
+    '4x4': STANDARD,
+    '5x5': Variant('5x5', size=5, line_length=4, pieces=4, barriers=2),
+    '6x6': Variant('6x6', size=6, line_length=4, pieces=5, barriers=3),
+}
+
+
+# Method to get a variant by name, raises ValueError for unknown names
+def get_variant(name):
+    if name not in VARIANTS:
+        raise ValueError(f"unknown variant '{name}', choose one of: {', '.join(VARIANTS)}")
+    return VARIANTS[name]
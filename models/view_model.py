@@ -0,0 +1,50 @@
+from models.barrier import Barrier
+
+# Colors of the cells that do not hold a piece
+EMPTY_COLOR = 'light gray'
+BARRIER_COLOR = 'gray'
+
+
+class BoardViewModel:
+    # Initialize the view model of a board, every accessible cell starts out drawn empty
+    def __init__(self, board):
+        self.board = board
+        self.rendered = {}
+        for row in range(board.size):
+            for col in range(board.size):
+                if board.is_accessible(col, row):
+                    self.rendered[(row, col)] = EMPTY_COLOR
+        # Redraw counters, to check how many widgets each frame really touches
+        self.frames = 0
+        self.redraws = 0
+        self.last_frame_redraws = 0
+
+    # Method to switch to the board of a new game, every cell is compared once against what is drawn
+    def attach(self, board):
+        self.board = board
+        board.dirty.update(self.rendered)
+
+    # Method to get the color a cell should be drawn with
+    def cell_color(self, row, col):
+        value = self.board.get_value(row, col)
+        if value is None:
+            return EMPTY_COLOR
+        if isinstance(value, Barrier):
+            return BARRIER_COLOR
+        return value
+
+    # Method to collect one frame: the (row, col, color) of the cells whose color changed since the last frame
+    # Only the cells the engine reported as changed are looked at
+    def frame(self):
+        changes = []
+        for row, col in self.board.pop_dirty():
+            if (row, col) not in self.rendered:
+                continue
+            color = self.cell_color(row, col)
+            if self.rendered[(row, col)] != color:
+                self.rendered[(row, col)] = color
+                changes.append((row, col, color))
+        self.frames += 1
+        self.last_frame_redraws = len(changes)
+        self.redraws += len(changes)
+        return changes